@@ -3,122 +3,644 @@ import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 import dash
-from dash import dcc, html, Input, Output, State
+from dash import dcc, html, Input, Output, State, Patch, ClientsideFunction
+from dash.development.base_component import Component
+from flask import request, abort, jsonify, g, has_request_context, Response
 import dash_bootstrap_components as dbc
 from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+import bisect
+import copy
+import functools
+import hashlib
+import hmac
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
 import numpy as np
 
+# Registro del dashboard; LOG_LEVEL=DEBUG muestra el detalle de carga y los tiempos de cada etapa
+log = logging.getLogger('dashboard')
+if not log.handlers:
+    manejador = logging.StreamHandler()
+    manejador.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(process)d] %(message)s'))
+    log.addHandler(manejador)
+    log.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    log.propagate = False
+
+# Límites (en segundos) de los buckets de los histogramas de latencia
+LIMITES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def escapar_etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Histogramas:
+    """Histogramas de latencia por nombre y etiquetas, en formato de texto de Prometheus"""
+    
+    def __init__(self, limites=LIMITES_LATENCIA):
+        self.limites = limites
+        self._series = {}
+        self._ayudas = {}
+        self._lock = threading.Lock()
+    
+    def describir(self, nombre, ayuda):
+        self._ayudas[nombre] = ayuda
+    
+    def observar(self, nombre, etiquetas, segundos):
+        """Sumar una medición a la serie (nombre, etiquetas), con etiquetas como tupla de pares"""
+        bucket = bisect.bisect_left(self.limites, segundos)
+        with self._lock:
+            serie = self._series.get((nombre, etiquetas))
+            if serie is None:
+                serie = self._series[(nombre, etiquetas)] = [[0] * (len(self.limites) + 1), 0.0]
+            serie[0][bucket] += 1
+            serie[1] += segundos
+    
+    def texto(self, etiquetas_comunes=()):
+        """Todas las series con buckets acumulados, _sum y _count"""
+        with self._lock:
+            series = sorted((clave, (list(conteos), suma)) for clave, (conteos, suma) in self._series.items())
+        lineas = []
+        nombre_actual = None
+        for (nombre, etiquetas), (conteos, suma) in series:
+            if nombre != nombre_actual:
+                nombre_actual = nombre
+                if nombre in self._ayudas:
+                    lineas.append(f"# HELP {nombre} {self._ayudas[nombre]}")
+                lineas.append(f"# TYPE {nombre} histogram")
+            pares = tuple(etiquetas_comunes) + etiquetas
+            base = ','.join(f'{clave}="{escapar_etiqueta(valor)}"' for clave, valor in pares)
+            separador = ',' if base else ''
+            acumulado = 0
+            for limite, conteo in zip(self.limites + ('+Inf',), conteos):
+                acumulado += conteo
+                lineas.append(f'{nombre}_bucket{{{base}{separador}le="{limite}"}} {acumulado}')
+            lineas.append(f'{nombre}_sum{{{base}}} {suma:.6f}')
+            lineas.append(f'{nombre}_count{{{base}}} {acumulado}')
+        return lineas
+
+latencias = Histogramas()
+latencias.describir('dashboard_callback_segundos', 'Tiempo de ejecución de cada callback')
+latencias.describir('dashboard_etapa_segundos', 'Tiempo de cada etapa (filtro, gráfico 3D, pivots, métricas, serialización)')
+latencias.describir('dashboard_request_segundos', 'Tiempo total de las llamadas a _dash-update-component')
+
+# Callback en curso en este hilo, para etiquetar las etapas que corren dentro de él
+contexto_medicion = threading.local()
+
+def callback_actual():
+    return getattr(contexto_medicion, 'callback', 'ninguno')
+
+@contextmanager
+def tramo(etapa):
+    """Medir un bloque como etapa del callback en curso"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        callback = callback_actual()
+        latencias.observar('dashboard_etapa_segundos', (('callback', callback), ('etapa', etapa)), segundos)
+        log.debug("⏱️ %s / %s: %.2f ms", callback, etapa, segundos * 1000)
+
+def medir_etapa(etapa):
+    """Decorador: cada llamada a la función se mide como la etapa indicada"""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def medida(*args, **kwargs):
+            with tramo(etapa):
+                return funcion(*args, **kwargs)
+        return medida
+    return decorador
+
+def medir_callback(funcion):
+    """Decorador para callbacks: histograma por callback y nombre para las etapas internas"""
+    @functools.wraps(funcion)
+    def medido(*args, **kwargs):
+        anterior = callback_actual()
+        contexto_medicion.callback = funcion.__name__
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            segundos = time.perf_counter() - inicio
+            contexto_medicion.callback = anterior
+            latencias.observar('dashboard_callback_segundos', (('callback', funcion.__name__),), segundos)
+            if has_request_context():
+                g.callback = funcion.__name__
+                g.segundos_callback = segundos
+            log.debug("⏱️ callback %s: %.2f ms", funcion.__name__, segundos * 1000)
+    return medido
+
+# Clases de formato de FECHA en texto: expresión regular -> formato (día primero, como en Chile)
+FORMATOS_FECHA = [
+    (r'\d{4}-\d{1,2}-\d{1,2}', '%Y-%m-%d'),
+    (r'\d{1,2}\.\d{1,2}\.\d{4}', '%d.%m.%Y'),
+    (r'\d{1,2}/\d{1,2}/\d{4}', '%d/%m/%Y'),
+    (r'\d{1,2}-\d{1,2}-\d{4}', '%d-%m-%Y'),
+]
+# Hora opcional después de la fecha ("28.12.2023 00:00:00"), se descarta
+HORA_OPCIONAL = r'(?:[ T]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?'
+# Número de serie de Excel: días desde 1899-12-30, hasta 9999-12-31
+SERIAL_EXCEL = r'\d+(?:\.\d+)?'
+ORIGEN_EXCEL = '1899-12-30'
+SERIAL_EXCEL_MAXIMO = 2958465
+# 01.01.1900 (o cualquier fecha de 1900) significa "sin fecha real"
+AÑO_CENTINELA = 1900
+
+def fechas_serial_excel(valores):
+    """Fechas desde números de serie de Excel (NaT si están fuera de rango)"""
+    valores = pd.to_numeric(pd.Series(valores, dtype=object), errors='coerce').astype(float)
+    valores = valores.where((valores >= 1) & (valores <= SERIAL_EXCEL_MAXIMO))
+    fechas = pd.to_datetime(valores, unit='D', origin=ORIGEN_EXCEL)
+    # Excel cuenta un 29-02-1900 que no existió: antes de él va un día atrasado
+    return fechas.where(valores >= 61, fechas + pd.Timedelta(days=1))
+
+def parsear_fechas(valores):
+    """Parsear una columna de fechas con formatos mezclados en una sola pasada
+    
+    Solo se clasifica cada valor distinto una vez: fechas ya parseadas, seriales de Excel
+    y una clase por formato de texto, cada una convertida en bloque. Lo que no calza en
+    ninguna clase se intenta con dayfirst. Las fechas de 1900 quedan como NaT.
+    Devuelve la serie datetime64 y la cantidad de filas por clase.
+    """
+    serie = pd.Series(valores)
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        fechas = serie.astype('datetime64[ns]')
+        clases = {'fecha': int(fechas.notna().sum())}
+    else:
+        # Valores distintos: cada texto repetido se parsea una sola vez
+        codigos, unicos = pd.factorize(serie)
+        unicos = pd.Series(unicos, dtype=object)
+        resultado = pd.Series(pd.NaT, index=unicos.index, dtype='datetime64[ns]')
+        clase = np.full(len(unicos), 'inválida', dtype=object)
+        
+        es_fecha = unicos.map(lambda v: isinstance(v, (datetime, np.datetime64))).to_numpy(dtype=bool)
+        resultado[es_fecha] = pd.to_datetime(unicos[es_fecha], errors='coerce')
+        clase[es_fecha] = 'fecha'
+        
+        # Seriales de Excel: números, o textos que son solo un número
+        es_numero = unicos.map(lambda v: isinstance(v, (int, float, np.number)) and not isinstance(v, bool)).to_numpy(dtype=bool)
+        textos = unicos.where(~(es_fecha | es_numero), '').astype(str).str.strip()
+        es_serial_texto = textos.str.fullmatch(SERIAL_EXCEL).to_numpy(dtype=bool)
+        es_serial = es_numero | es_serial_texto
+        resultado[es_serial] = fechas_serial_excel(unicos.where(~es_serial_texto, textos)[es_serial])
+        clase[es_serial] = 'serial excel'
+        
+        pendientes = ~(es_fecha | es_serial) & (textos != '').to_numpy()
+        for patron, formato in FORMATOS_FECHA:
+            coincide = pendientes & textos.str.fullmatch(patron + HORA_OPCIONAL).to_numpy(dtype=bool)
+            if coincide.any():
+                solo_fecha = textos[coincide].str.split(r'[ T]', n=1, regex=True).str[0]
+                resultado[coincide] = pd.to_datetime(solo_fecha, format=formato, errors='coerce')
+                clase[coincide] = formato
+                pendientes &= ~coincide
+        
+        # Lo que queda (formatos raros) se interpreta valor por valor
+        if pendientes.any():
+            resultado[pendientes] = [pd.to_datetime(texto, errors='coerce', dayfirst=True)
+                                     for texto in textos[pendientes]]
+            clase[pendientes] = 'otro formato'
+        clase[resultado.isna().to_numpy()] = 'inválida'
+        
+        # Volver a las filas; el código -1 (vacío) apunta al NaT agregado al final
+        fechas = pd.Series(np.append(resultado.to_numpy(), np.datetime64('NaT', 'ns'))[codigos],
+                           index=serie.index)
+        clases = pd.Series(clase[codigos[codigos >= 0]]).value_counts().to_dict()
+    
+    centinela = (fechas.dt.year == AÑO_CENTINELA).to_numpy()
+    if centinela.any():
+        clases[f'sin fecha ({AÑO_CENTINELA})'] = int(centinela.sum())
+        fechas = fechas.mask(centinela)
+    return fechas, clases
+
+# Esquema del Excel: solo se leen estas columnas. tipo: entero, decimal, texto o fecha.
+# En los decimales la coma es el separador decimal y 'miles' son caracteres que se eliminan.
+ESQUEMA_COLUMNAS = {
+    'TIPO': {'tipo': 'entero', 'obligatoria': True},
+    'PISO': {'tipo': 'entero', 'obligatoria': True},
+    'NUMERO': {'tipo': 'entero', 'obligatoria': False},
+    'TIPOLOGIA': {'tipo': 'texto', 'obligatoria': False},
+    'ESTADO': {'tipo': 'texto', 'obligatoria': True},
+    'PRECIO': {'tipo': 'decimal', 'obligatoria': False, 'miles': ' '},
+    'M2': {'tipo': 'decimal', 'obligatoria': False, 'miles': ''},
+    'UF/M2': {'tipo': 'decimal', 'obligatoria': False, 'miles': ' '},
+    'FECHA': {'tipo': 'fecha', 'obligatoria': False},
+}
+
+def convertir_entero(serie, regla):
+    """Enteros (como float si hay vacíos); se rechazan textos y números con decimales"""
+    valores = pd.to_numeric(serie, errors='coerce')
+    valores = valores.where(valores % 1 == 0)
+    return valores, serie.notna() & valores.isna()
+
+def convertir_decimal(serie, regla):
+    """Decimales con coma decimal y separador de miles, limpiando solo las celdas de texto"""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float), pd.Series(False, index=serie.index)
+    valores = pd.to_numeric(serie, errors='coerce')
+    # Una sola pasada de translate por celda de texto: miles fuera y coma -> punto
+    pendientes = valores.isna() & serie.notna()
+    if pendientes.any():
+        tabla = str.maketrans({**dict.fromkeys(regla['miles'], None), ',': '.'})
+        limpios = serie[pendientes].astype(str).str.translate(tabla)
+        valores[pendientes] = pd.to_numeric(limpios, errors='coerce')
+    return valores.astype(float), serie.notna() & valores.isna()
+
+def convertir_texto(serie, regla):
+    """Textos sin espacios al borde; las celdas vacías quedan como NaN"""
+    return serie.where(serie.isna(), serie.astype(str).str.strip()), pd.Series(False, index=serie.index)
+
+CONVERSORES = {'entero': convertir_entero, 'decimal': convertir_decimal, 'texto': convertir_texto}
+
+def leer_excel_esquema(archivo_excel):
+    """Leer solo las columnas del esquema y convertir cada una en una pasada
+    
+    Devuelve el DataFrame y las celdas rechazadas por columna (cantidad y ejemplos),
+    o (None, faltantes) si falta alguna columna obligatoria.
+    """
+    df = pd.read_excel(archivo_excel, usecols=lambda columna: str(columna).strip() in ESQUEMA_COLUMNAS)
+    df.columns = [str(columna).strip() for columna in df.columns]
+    
+    faltantes = [columna for columna, regla in ESQUEMA_COLUMNAS.items()
+                 if regla['obligatoria'] and columna not in df.columns]
+    if faltantes:
+        return None, faltantes
+    
+    rechazos = {}
+    for columna, regla in ESQUEMA_COLUMNAS.items():
+        if columna not in df.columns or regla['tipo'] not in CONVERSORES:
+            continue
+        valores, rechazados = CONVERSORES[regla['tipo']](df[columna], regla)
+        if rechazados.any():
+            rechazos[columna] = {'cantidad': int(rechazados.sum()),
+                                 'ejemplos': df.loc[rechazados, columna].astype(str).unique()[:3].tolist()}
+        df[columna] = valores
+    return df, rechazos
+
 def cargar_datos(archivo_excel):
     try:
-        df = pd.read_excel(archivo_excel)
-        print(f"Datos cargados: {len(df)} departamentos")
-        print(f"Columnas encontradas: {list(df.columns)}")
-        
-        # Limpiar columnas numéricas que pueden tener espacios o comas
-        if 'PRECIO' in df.columns:
-            df['PRECIO'] = pd.to_numeric(df['PRECIO'].astype(str).str.replace(' ', '').str.replace(',', '.'), errors='coerce')
-        if 'M2' in df.columns:
-            df['M2'] = pd.to_numeric(df['M2'].astype(str).str.replace(',', '.'), errors='coerce')
-        if 'UF/M2' in df.columns:
-            df['UF/M2'] = pd.to_numeric(df['UF/M2'].astype(str).str.replace(' ', '').str.replace(',', '.'), errors='coerce')
-        
-        # Debug: mostrar estados únicos encontrados
-        if 'ESTADO' in df.columns:
-            estados_unicos = df['ESTADO'].unique()
-            print(f"Estados encontrados: {list(estados_unicos)}")
+        # Solo las columnas del esquema, ya convertidas a su tipo
+        df, rechazos = leer_excel_esquema(archivo_excel)
+        if df is None:
+            log.error("❌ Faltan columnas obligatorias: %s", rechazos)
+            return None
+        log.info("Datos cargados: %d departamentos", len(df))
+        detalle = log.isEnabledFor(logging.DEBUG)
+        log.debug("Columnas encontradas: %s", list(df.columns))
+        
+        if detalle and 'ESTADO' in df.columns:
+            log.debug("Estados encontrados: %s", list(df['ESTADO'].unique()))
         
         # Procesar fechas si existe la columna
         if 'FECHA' in df.columns:
-            print(f"Procesando columna FECHA...")
-            print(f"Primeras 10 fechas raw: {df['FECHA'].head(10).tolist()}")
-            print(f"Tipos de datos en FECHA: {df['FECHA'].dtype}")
-            
-            # Crear una copia para trabajar
-            df['FECHA_ORIGINAL'] = df['FECHA'].copy()
-            
-            # Si ya son datetime, mantenerlas
-            if df['FECHA'].dtype == 'datetime64[ns]':
-                print("Las fechas ya están en formato datetime")
-            else:
-                # Intentar múltiples formatos de fecha
-                df['FECHA'] = pd.to_datetime(df['FECHA'], errors='coerce')
-                
-                # Si falló, intentar formato específico dd.mm.yyyy
-                if df['FECHA'].isna().all():
-                    print("Intentando formato dd.mm.yyyy...")
-                    df['FECHA'] = pd.to_datetime(df['FECHA_ORIGINAL'], format='%d.%m.%Y', errors='coerce')
-                
-                # Si aún falló, intentar otros formatos comunes
-                if df['FECHA'].isna().all():
-                    print("Intentando otros formatos...")
-                    for formato in ['%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y']:
-                        try:
-                            df['FECHA'] = pd.to_datetime(df['FECHA_ORIGINAL'], format=formato, errors='coerce')
-                            if not df['FECHA'].isna().all():
-                                print(f"Formato exitoso: {formato}")
-                                break
-                        except:
-                            continue
-                
-                # Si todavía falló, intentar conversión automática más agresiva
-                if df['FECHA'].isna().all():
-                    print("Intentando conversión automática...")
-                    # Limpiar y convertir strings
-                    df['FECHA_CLEAN'] = df['FECHA_ORIGINAL'].astype(str).str.strip()
-                    df['FECHA'] = pd.to_datetime(df['FECHA_CLEAN'], errors='coerce', dayfirst=True)
+            if detalle:
+                log.debug("Primeras 10 fechas raw: %s", df['FECHA'].head(10).tolist())
+                log.debug("Tipos de datos en FECHA: %s", df['FECHA'].dtype)
             
-            print(f"Fechas después del procesamiento - primeras 10: {df['FECHA'].head(10).tolist()}")
-            print(f"Fechas no nulas: {df['FECHA'].notna().sum()}")
-            print(f"Fechas nulas: {df['FECHA'].isna().sum()}")
+            # Todas las clases de formato en una sola pasada; 1900 queda como NaT
+            df['FECHA'], clases = parsear_fechas(df['FECHA'])
+            log.debug("Formatos de fecha detectados: %s", clases)
+            if detalle:
+                log.debug("Fechas después del procesamiento - primeras 10: %s", df['FECHA'].head(10).tolist())
             
-            # Filtrar fechas falsas (01.01.1900 significa "sin fecha real")
-            fechas_antes = df['FECHA'].notna().sum()
-            df.loc[df['FECHA'].dt.year == 1900, 'FECHA'] = pd.NaT
             fechas_despues = df['FECHA'].notna().sum()
-            
-            print(f"Fechas 1900 filtradas: {fechas_antes - fechas_despues}")
-            print(f"Fechas válidas finales: {fechas_despues}")
+            log.debug("Fechas válidas finales: %d", fechas_despues)
+            if clases.get('inválida'):
+                rechazos['FECHA'] = {'cantidad': clases['inválida'], 'ejemplos': []}
             
             if fechas_despues > 0:
-                fecha_min = df['FECHA'].min()
-                fecha_max = df['FECHA'].max()
-                print(f"Rango de fechas válidas: {fecha_min} - {fecha_max}")
+                log.debug("Rango de fechas válidas: %s - %s", df['FECHA'].min(), df['FECHA'].max())
                 
                 # Agregar columnas auxiliares para análisis temporal
                 df['AÑO'] = df['FECHA'].dt.year
                 df['MES'] = df['FECHA'].dt.month
-                df['AÑO_MES'] = df['FECHA'].dt.to_period('M')
             else:
-                print("⚠️ No se encontraron fechas válidas para análisis temporal")
+                log.warning("⚠️ No se encontraron fechas válidas para análisis temporal")
                 
         else:
-            print("⚠️ No se encontró columna FECHA")
+            log.warning("⚠️ No se encontró columna FECHA")
+        
+        # Reporte de celdas que no se pudieron convertir (quedan vacías)
+        for columna, rechazo in rechazos.items():
+            ejemplos = f" (ej.: {', '.join(rechazo['ejemplos'])})" if rechazo['ejemplos'] else ""
+            log.warning(f"⚠️ {columna}: {rechazo['cantidad']} celdas rechazadas{ejemplos}")
             
-        return df
+        return compactar_datos(df)
     except Exception as e:
-        print(f"Error cargando datos: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"Error cargando datos: {e}")
+        return None
+
+# Vocabulario fijo de ESTADO (los estados nuevos se agregan al final)
+VOCABULARIO_ESTADOS = ['Disponible', 'Reserva', 'Promesa', 'Stock Ausente']
+# Enteros angostos; en AÑO y MES el 0 significa "sin fecha de venta"
+ENTEROS_COMPACTOS = {'PISO': np.int8, 'TIPO': np.int8, 'NUMERO': np.int16, 'AÑO': np.int16, 'MES': np.int8}
+def compactar_datos(df):
+    """Tipos compactos: ESTADO/TIPOLOGIA categóricas, enteros angostos y FECHA como único datetime"""
+    for columna in ('AÑO', 'MES'):
+        if columna in df.columns:
+            df[columna] = df[columna].fillna(0)
+    
+    for columna, tipo in ENTEROS_COMPACTOS.items():
+        if columna not in df.columns:
+            continue
+        valores = pd.to_numeric(df[columna], errors='coerce')
+        limites = np.iinfo(tipo)
+        if (valores.isna().any() or (valores % 1 != 0).any()
+                or valores.min() < limites.min or valores.max() > limites.max):
+            log.warning(f"⚠️ Columna {columna} no cabe en {np.dtype(tipo).name}, se mantiene como {df[columna].dtype}")
+            continue
+        df[columna] = valores.astype(tipo)
+    
+    # Los filtros por estado y tipología comparan códigos enteros en vez de textos
+    if 'ESTADO' in df.columns:
+        estados = df['ESTADO']
+        nuevos = sorted(set(estados.dropna()) - set(VOCABULARIO_ESTADOS))
+        df['ESTADO'] = pd.Categorical(estados, categories=VOCABULARIO_ESTADOS + nuevos)
+    if 'TIPOLOGIA' in df.columns:
+        df['TIPOLOGIA'] = pd.Categorical(df['TIPOLOGIA'])
+    
+    return df
+
+def memoria_datos(df):
+    """Bytes que ocupa el DataFrame, incluyendo textos y categorías"""
+    return int(df.memory_usage(deep=True).sum())
+
+# Caché columnar en disco del DataFrame ya procesado por cargar_datos, una carpeta por
+# huella del Excel. Subir VERSION_CACHE_COLUMNAR cuando cambie lo que produce cargar_datos.
+VERSION_CACHE_COLUMNAR = 4
+
+def carpeta_cache_columnar(directorio, huella):
+    return os.path.join(directorio, f"{huella}-v{VERSION_CACHE_COLUMNAR}")
+
+def codificar_columna(serie):
+    """Descripción JSON y arreglo numpy de una columna, o None si no se puede representar
+    
+    Categóricas -> sus códigos + categorías, texto -> códigos int32 + vocabulario,
+    períodos -> ordinales int64, el resto tal cual.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        categorias = serie.cat.categories
+        if not all(isinstance(v, str) for v in categorias):
+            return None
+        return ({'nombre': serie.name, 'tipo': 'categorica', 'valores': list(categorias),
+                 'ordenada': bool(serie.cat.ordered)}, serie.cat.codes.to_numpy())
+    if isinstance(serie.dtype, pd.PeriodDtype):
+        return {'nombre': serie.name, 'tipo': 'periodo', 'frecuencia': serie.dtype.freq.freqstr}, serie.array.asi8
+    if serie.dtype == object:
+        codigos, valores = pd.factorize(serie)
+        if not all(isinstance(v, str) for v in valores):
+            return None
+        return {'nombre': serie.name, 'tipo': 'categorias', 'valores': list(valores)}, codigos.astype(np.int32)
+    if serie.dtype.kind in 'biufM':
+        return {'nombre': serie.name, 'tipo': 'numpy'}, serie.to_numpy()
+    return None
+
+def decodificar_columna(columna, arreglo):
+    """Valores de una columna a partir de su descripción y su arreglo (inverso de codificar_columna)"""
+    if columna['tipo'] == 'categorica':
+        return pd.Categorical.from_codes(np.asarray(arreglo), categories=pd.Index(columna['valores'], dtype=object),
+                                         ordered=columna['ordenada'])
+    if columna['tipo'] == 'categorias':
+        return pd.Categorical.from_codes(arreglo, categories=pd.Index(columna['valores'], dtype=object)).astype(object)
+    if columna['tipo'] == 'periodo':
+        return pd.arrays.PeriodArray(np.asarray(arreglo), freq=columna['frecuencia'])
+    return arreglo
+
+def guardar_cache_columnar(df, directorio, huella):
+    """Guardar df como una columna .npy por archivo (ver codificar_columna) más un manifiesto JSON
+    
+    Devuelve False (sin guardar nada) si alguna columna no se puede representar.
+    """
+    columnas = []
+    arreglos = []
+    for nombre in df.columns:
+        codificada = codificar_columna(df[nombre])
+        if codificada is None:
+            log.warning(f"⚠️ Columna {nombre} ({df[nombre].dtype}) no se puede guardar en caché columnar")
+            return False
+        columnas.append(codificada[0])
+        arreglos.append(codificada[1])
+    
+    # Escribir en una carpeta temporal y renombrar: otro worker nunca ve una caché a medias
+    destino = carpeta_cache_columnar(directorio, huella)
+    os.makedirs(directorio, exist_ok=True)
+    temporal = tempfile.mkdtemp(dir=directorio, prefix='.tmp-')
+    try:
+        for posicion, arreglo in enumerate(arreglos):
+            np.save(os.path.join(temporal, f"{posicion}.npy"), arreglo, allow_pickle=False)
+        with open(os.path.join(temporal, 'columnas.json'), 'w', encoding='utf-8') as f:
+            json.dump({'filas': len(df), 'columnas': columnas}, f, ensure_ascii=False)
+        os.replace(temporal, destino)
+    except OSError as e:
+        # Otro worker ya la escribió, o el disco no lo permite: seguir sin caché
+        shutil.rmtree(temporal, ignore_errors=True)
+        if not os.path.isdir(destino):
+            log.warning(f"⚠️ No se pudo guardar la caché columnar: {e}")
+            return False
+    return True
+
+def cargar_cache_columnar(directorio, huella):
+    """DataFrame desde la caché columnar (columnas mapeadas en memoria), o None si no existe"""
+    carpeta = carpeta_cache_columnar(directorio, huella)
+    try:
+        with open(os.path.join(carpeta, 'columnas.json'), encoding='utf-8') as f:
+            manifiesto = json.load(f)
+        
+        datos = {}
+        for posicion, columna in enumerate(manifiesto['columnas']):
+            arreglo = np.load(os.path.join(carpeta, f"{posicion}.npy"), mmap_mode='r', allow_pickle=False)
+            datos[columna['nombre']] = decodificar_columna(columna, arreglo)
+    except (OSError, ValueError, KeyError) as e:
+        if os.path.isdir(carpeta):
+            log.warning(f"⚠️ Caché columnar inválida, se vuelve a leer el Excel: {e}")
         return None
+    
+    # copy=False: las columnas numéricas y de fecha siguen apuntando al archivo mapeado (solo lectura)
+    df = pd.DataFrame(datos, copy=False)
+    log.info(f"Datos cargados desde caché columnar: {len(df)} departamentos")
+    return df
+
+# Tipos que tiene cada orientación
+ORIENTACIONES_TIPOS = {
+    'norte': [2, 3, 4],      # ARRIBA: Tipos 2, 3, 4
+    'oriente': [3, 4, 5],    # DERECHA: Tipos 3, 4, 5  
+    'sur': [6, 7, 8],        # ABAJO: Tipos 6, 7, 8
+    'poniente': [8, 1, 2]    # IZQUIERDA: Tipos 8, 1, 2
+}
+
+# Cómo se muestra cada orientación en el filtro y en el mapa: (ícono, sigla, color)
+ESTILOS_ORIENTACIONES = {
+    'norte': ('⬆️', 'N', '#007BFF'),
+    'oriente': ('➡️', 'E', '#28A745'),
+    'sur': ('⬇️', 'S', '#FFC107'),
+    'poniente': ('⬅️', 'W', '#DC3545')
+}
+
+# Presets de pisos de los botones de vista rápida: nombre -> pisos que incluye
+PRESETS_PISOS = {
+    'todos': lambda piso: True,
+    'altos': lambda piso: piso >= 9,
+    'bajos': lambda piso: piso <= 8
+}
+BOTONES_PRESETS = {'btn-todos': 'todos', 'btn-altos': 'altos', 'btn-bajos': 'bajos'}
+
+# Valor del filtro de estados -> ESTADO en los datos
+ESTADOS_FILTRO = {
+    'disponible': 'Disponible',
+    'reserva': 'Reserva',
+    'promesa': 'Promesa'
+}
+
+def construir_indice(df, orientaciones_tipos=ORIENTACIONES_TIPOS):
+    """Precalcular una máscara booleana por cada valor de PISO, TIPO, ESTADO y TIPOLOGIA"""
+    n = len(df)
+    indice = {'todos': np.ones(n, dtype=bool), 'ninguno': np.zeros(n, dtype=bool)}
+    
+    for columna in ['PISO', 'TIPO', 'ESTADO', 'TIPOLOGIA']:
+        indice[columna] = {}
+        if columna not in df.columns:
+            continue
+        serie = df[columna]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            # Las categóricas ya traen sus códigos enteros
+            codigos, valores = serie.cat.codes.to_numpy(), serie.cat.categories
+        else:
+            codigos, valores = pd.factorize(serie)
+        for codigo, valor in enumerate(valores):
+            indice[columna][valor] = codigos == codigo
+    
+    # Orientaciones como unión de las máscaras de sus tipos
+    indice['ORIENTACION'] = {
+        orientacion: np.logical_or.reduce([indice['TIPO'].get(tipo, indice['ninguno']) for tipo in tipos])
+        for orientacion, tipos in orientaciones_tipos.items()
+    }
+    
+    # Vendidos: los que tienen fecha real
+    indice['vendidos'] = df['FECHA'].notna().to_numpy() if 'FECHA' in df.columns else indice['ninguno']
+    return indice
+
+def union_mascaras(mascaras_columna, valores, ninguno):
+    """OR de las máscaras de los valores seleccionados"""
+    return np.logical_or.reduce([mascaras_columna.get(valor, ninguno) for valor in valores])
+
+def mascara_filtros(indice, pisos, orientacion, tipologias):
+    """Máscara de los filtros de pisos, orientación y tipología"""
+    mascara = indice['todos']
+    
+    if pisos and len(pisos) > 0:
+        mascara = mascara & union_mascaras(indice['PISO'], pisos, indice['ninguno'])
+    
+    if orientacion in indice['ORIENTACION']:
+        mascara = mascara & indice['ORIENTACION'][orientacion]
+    
+    if tipologias and len(tipologias) > 0 and indice['TIPOLOGIA']:
+        mascara = mascara & union_mascaras(indice['TIPOLOGIA'], tipologias, indice['ninguno'])
+    
+    return mascara
+
+def mascara_estado(indice, estado):
+    """Máscara del filtro de estados ('todos' no filtra)"""
+    if estado in ESTADOS_FILTRO:
+        return indice['ESTADO'].get(ESTADOS_FILTRO[estado], indice['ninguno'])
+    return indice['todos']
+
+# Columnas agregadas por el motor de métricas: clave del resultado -> columna
+COLUMNAS_METRICAS = {'precio': 'PRECIO', 'm2': 'M2', 'uf_m2': 'UF/M2'}
+# Métricas que se suman; el resto se promedia
+METRICAS_SUMA = ('precio', 'm2')
+
+# Dimensiones del cubo de agregados (además de AÑO/MES de venta)
+DIMENSIONES_CUBO = ['PISO', 'TIPO', 'ESTADO', 'TIPOLOGIA']
+
+def claves_cubo(df):
+    """Series que definen la celda del cubo de cada fila: dimensiones y AÑO/MES de venta (vacíos si no se vendió)"""
+    claves = [df[columna] for columna in DIMENSIONES_CUBO if columna in df.columns]
+    if 'FECHA' in df.columns and 'AÑO' in df.columns:
+        vendidos = df['FECHA'].notna()
+        claves += [df['AÑO'].where(vendidos), df['MES'].where(vendidos)]
+    return claves
 
-def crear_tabla_ventas_mensuales(df_vendidos):
-    """Crear tabla de ventas por mes y año"""
-    if df_vendidos.empty:
+def tuplas_clave(claves):
+    """Claves de celda como tuplas (None en lugar de NaN), una por fila"""
+    return list(zip(*[serie.astype(object).where(serie.notna(), None) for serie in claves]))
+
+def construir_cubo(df):
+    """Cubo de agregados por PISO × TIPO × ESTADO × TIPOLOGIA × AÑO/MES (solo celdas con departamentos)
+    
+    Cada celda guarda la cantidad de departamentos y, por cada columna de métricas,
+    la suma y el conteo de valores no nulos. Los no vendidos quedan con AÑO/MES vacíos.
+    """
+    claves = claves_cubo(df)
+    medidas = pd.DataFrame({'cantidad': np.ones(len(df), dtype=np.int64)}, index=df.index)
+    for columna in COLUMNAS_METRICAS.values():
+        if columna in df.columns:
+            medidas[f'suma {columna}'] = df[columna]
+            medidas[f'conteo {columna}'] = df[columna].notna().astype(np.int64)
+    
+    return medidas.groupby(claves, sort=False, dropna=False, observed=True).sum().reset_index()
+
+def construir_indice_cubo(cubo, orientaciones_tipos=ORIENTACIONES_TIPOS):
+    """Índice de máscaras sobre las celdas del cubo (vendidos = celdas con AÑO de venta)"""
+    indice = construir_indice(cubo, orientaciones_tipos)
+    indice['vendidos'] = cubo['AÑO'].notna().to_numpy() if 'AÑO' in cubo.columns else indice['ninguno']
+    return indice
+
+MESES_NOMBRES = {
+    1: 'Ene', 2: 'Feb', 3: 'Mar', 4: 'Abr', 5: 'May', 6: 'Jun',
+    7: 'Jul', 8: 'Ago', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dic'
+}
+
+def tabla_mensual(tabla_pivot, celdas, totales, columna_total, clase):
+    """Tabla año x mes como un solo bloque HTML, con los estilos en assets/tablas_mensuales.css
+    
+    celdas y totales son los textos ya formateados de la matriz de meses y de columna_total;
+    la última fila de tabla_pivot es la de totales. Se envía un componente en vez de uno por celda.
+    """
+    meses = tabla_pivot.columns[:-1]
+    etiquetas = [str(int(año)) for año in tabla_pivot.index[:-1]] + [str(tabla_pivot.index[-1])]
+    encabezado = ''.join(f"<th>{MESES_NOMBRES.get(mes, f'M{mes}')}</th>" for mes in meses)
+    filas = np.char.add(np.char.add('<td>', celdas), '</td>')
+    cuerpo = ''.join(
+        f"<tr class='{'fila-total' if posicion == len(etiquetas) - 1 else 'fila-año'}'>"
+        f"<td class='celda-año'>{etiqueta}</td>{''.join(fila)}<td class='celda-total'>{total}</td></tr>"
+        for posicion, (etiqueta, fila, total) in enumerate(zip(etiquetas, filas, totales))
+    )
+    return dcc.Markdown(
+        f"<table class='table table-striped table-sm table-bordered tabla-mensual {clase}'>"
+        f"<thead><tr><th>AÑO</th>{encabezado}<th>{columna_total}</th></tr></thead><tbody>{cuerpo}</tbody></table>",
+        # Solo números y etiquetas generadas aquí, nada que venga del usuario
+        dangerously_allow_html=True
+    )
+
+@medir_etapa('pivot')
+def crear_tabla_ventas_mensuales(cubo_vendidos):
+    """Crear tabla de ventas por mes y año desde las celdas vendidas del cubo"""
+    if cubo_vendidos.empty:
         return html.Div([
             html.H6("📊 Sin datos de ventas", className="text-center text-muted"),
             html.P("No hay propiedades vendidas para mostrar", className="text-center text-muted")
         ])
     
-    if 'FECHA' not in df_vendidos.columns:
+    if 'AÑO' not in cubo_vendidos.columns:
         return html.Div([
             html.H6("📊 Sin columna de fechas", className="text-center text-muted"),
             html.P("Los datos no contienen información de fechas", className="text-center text-muted")
         ])
     
-    # Filtrar solo las propiedades vendidas (con fecha)
-    df_con_fecha = df_vendidos.dropna(subset=['FECHA'])
+    # Filtrar solo las celdas vendidas (con fecha)
+    cubo_con_fecha = cubo_vendidos.dropna(subset=['AÑO'])
     
-    if df_con_fecha.empty:
+    if cubo_con_fecha.empty:
         return html.Div([
             html.H6("📊 Sin fechas válidas", className="text-center text-muted"),
             html.P("No hay ventas con fechas válidas para analizar", className="text-center text-muted")
@@ -126,84 +648,66 @@ def crear_tabla_ventas_mensuales(df_vendidos):
     
     try:
         # Crear tabla pivote
-        tabla_pivot = df_con_fecha.groupby(['AÑO', 'MES']).size().unstack(fill_value=0)
+        tabla_pivot = cubo_con_fecha.groupby(['AÑO', 'MES'])['cantidad'].sum().unstack(fill_value=0)
         
         # Agregar totales
         tabla_pivot['TOTAL'] = tabla_pivot.sum(axis=1)
         tabla_pivot.loc['TOTAL'] = tabla_pivot.sum(axis=0)
         
-        # Crear nombres de meses
-        meses_nombres = {
-            1: 'Ene', 2: 'Feb', 3: 'Mar', 4: 'Abr', 5: 'May', 6: 'Jun',
-            7: 'Jul', 8: 'Ago', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dic'
-        }
-        
-        # Crear la tabla HTML
-        tabla_html = html.Table([
-            # Header
-            html.Thead([
-                html.Tr([html.Th("AÑO", className="text-center", style={'background-color': '#2d2c55', 'color': 'white', 'font-weight': 'bold'})] + 
-                    [html.Th(meses_nombres.get(mes, f"M{mes}"), className="text-center",
-                            style={'background-color': '#2d2c55', 'color': 'white', 'font-weight': 'bold'}) 
-                        for mes in sorted(tabla_pivot.columns[:-1])] +
-                    [html.Th("TOTAL", className="text-center", 
-                            style={'background-color': '#2d2c55', 'color': 'white', 'font-weight': 'bold'})])
-            ]),
-            # Body
-            html.Tbody([
-                html.Tr([
-                    html.Td(html.B(str(int(año))) if año != 'TOTAL' else html.B("TOTAL"), 
-                        className="text-center",
-                        style={'font-weight': 'bold', 'background-color': '#2d2c55', 'color': 'white'} if año == 'TOTAL' else {'font-weight': 'bold'}),
-                    *[html.Td(str(int(tabla_pivot.loc[año, mes])) if tabla_pivot.loc[año, mes] > 0 else "-",
-                            className="text-center",
-                            style={'background-color': '#2d2c55', 'color': 'white'} if año == 'TOTAL' else {}) 
-                    for mes in sorted(tabla_pivot.columns[:-1])],
-                    html.Td(html.B(str(int(tabla_pivot.loc[año, 'TOTAL']))), 
-                        className="text-center",
-                        style={'background-color': '#2d2c55', 'color': 'white', 'font-weight': 'bold'} if año == 'TOTAL' else {'background-color': '#f8f9fa', 'font-weight': 'bold'})
-                ], style={'background-color': '#2d2c55'} if año == 'TOTAL' else {})
-                for año in tabla_pivot.index
-            ])  
-        ], className="table table-striped table-sm table-bordered")
+        # Meses en orden y textos de toda la matriz de una vez
+        tabla_pivot = tabla_pivot[sorted(tabla_pivot.columns[:-1]) + ['TOTAL']]
+        valores = tabla_pivot.to_numpy()
+        tabla_html = tabla_mensual(
+            tabla_pivot,
+            celdas=np.where(valores[:, :-1] > 0, valores[:, :-1].astype(np.int64).astype(str), '-'),
+            totales=valores[:, -1].astype(np.int64).astype(str),
+            columna_total='TOTAL',
+            clase='tabla-ventas'
+        )
         
         return html.Div([
-            html.P(f"📊 Total ventas analizadas: {len(df_con_fecha)}", 
+            html.P(f"📊 Total ventas analizadas: {cubo_con_fecha['cantidad'].sum()}", 
                    className="text-center text-muted mb-2"),
             tabla_html
         ])
         
     except Exception as e:
-        print(f"Error creando tabla: {e}")
+        log.exception(f"Error creando tabla: {e}")
         return html.Div([
             html.H6("❌ Error procesando datos", className="text-center text-danger"),
             html.P(f"Error: {str(e)}", className="text-center text-muted")
         ])
 
-def crear_tabla_precios_mensuales(df_vendidos):
-    """Crear tabla de precios promedio UF/m² por mes y año"""
-    if df_vendidos.empty:
+def promedio_celdas(cubo, claves, columna='UF/M2'):
+    """Promedio de una columna por grupo de celdas del cubo (suma de sumas / suma de conteos)"""
+    grupos = cubo.groupby(claves)[[f'suma {columna}', f'conteo {columna}']].sum()
+    return grupos[f'suma {columna}'] / grupos[f'conteo {columna}']
+
+@medir_etapa('pivot')
+def crear_tabla_precios_mensuales(cubo_vendidos):
+    """Crear tabla de precios promedio UF/m² por mes y año desde las celdas vendidas del cubo"""
+    if cubo_vendidos.empty:
         return html.Div([
             html.H6("📊 Sin datos de precios", className="text-center text-muted"),
             html.P("No hay propiedades vendidas para mostrar", className="text-center text-muted")
         ])
     
-    if 'FECHA' not in df_vendidos.columns:
+    if 'AÑO' not in cubo_vendidos.columns:
         return html.Div([
             html.H6("📊 Sin columna de fechas", className="text-center text-muted"),
             html.P("Los datos no contienen información de fechas", className="text-center text-muted")
         ])
     
-    # Filtrar solo las propiedades vendidas (con fecha)
-    df_con_fecha = df_vendidos.dropna(subset=['FECHA'])
+    # Filtrar solo las celdas vendidas (con fecha)
+    cubo_con_fecha = cubo_vendidos.dropna(subset=['AÑO'])
     
-    if df_con_fecha.empty:
+    if cubo_con_fecha.empty:
         return html.Div([
             html.H6("📊 Sin fechas válidas", className="text-center text-muted"),
             html.P("No hay ventas con fechas válidas para analizar", className="text-center text-muted")
         ])
     
-    if 'UF/M2' not in df_con_fecha.columns:
+    if 'suma UF/M2' not in cubo_con_fecha.columns:
         return html.Div([
             html.H6("📊 Sin datos UF/m²", className="text-center text-muted"),
             html.P("No hay información de precios UF/m²", className="text-center text-muted")
@@ -211,14 +715,14 @@ def crear_tabla_precios_mensuales(df_vendidos):
     
     try:
         # Crear tabla pivote con promedio de UF/M2
-        tabla_pivot = df_con_fecha.groupby(['AÑO', 'MES'])['UF/M2'].mean().unstack(fill_value=0)
+        tabla_pivot = promedio_celdas(cubo_con_fecha, ['AÑO', 'MES']).unstack(fill_value=0)
         
         # Agregar promedio total por año
-        tabla_pivot['PROMEDIO'] = df_con_fecha.groupby('AÑO')['UF/M2'].mean()
+        tabla_pivot['PROMEDIO'] = promedio_celdas(cubo_con_fecha, 'AÑO')
         
         # Agregar promedio total por mes
-        promedios_mes = df_con_fecha.groupby('MES')['UF/M2'].mean()
-        promedio_general = df_con_fecha['UF/M2'].mean()
+        promedios_mes = promedio_celdas(cubo_con_fecha, 'MES')
+        promedio_general = cubo_con_fecha['suma UF/M2'].sum() / cubo_con_fecha['conteo UF/M2'].sum()
         
         # Crear fila de totales
         fila_totales = {}
@@ -232,40 +736,16 @@ def crear_tabla_precios_mensuales(df_vendidos):
         # Agregar fila de totales
         tabla_pivot.loc['PROMEDIO'] = pd.Series(fila_totales)
         
-        # Crear nombres de meses
-        meses_nombres = {
-            1: 'Ene', 2: 'Feb', 3: 'Mar', 4: 'Abr', 5: 'May', 6: 'Jun',
-            7: 'Jul', 8: 'Ago', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dic'
-        }
-        
-        # Crear la tabla HTML
-        tabla_html = html.Table([
-            # Header
-            html.Thead([
-                html.Tr([html.Th("AÑO", className="text-center", style={'background-color': '#2d2c55', 'color': 'white', 'font-weight': 'bold'})] + 
-                    [html.Th(meses_nombres.get(mes, f"M{mes}"), className="text-center",
-                            style={'background-color': '#2d2c55', 'color': 'white', 'font-weight': 'bold'}) 
-                        for mes in sorted(tabla_pivot.columns[:-1])] +
-                    [html.Th("PROMEDIO", className="text-center", 
-                            style={'background-color': '#2d2c55', 'color': 'white', 'font-weight': 'bold'})])
-            ]),
-            # Body
-            html.Tbody([
-                html.Tr([
-                    html.Td(html.B(str(int(año))) if año != 'PROMEDIO' else html.B("PROMEDIO"), 
-                        className="text-center",
-                        style={'font-weight': 'bold', 'background-color': '#2d2c55', 'color': 'white'} if año == 'PROMEDIO' else {'font-weight': 'bold'}),
-                    *[html.Td(f"{tabla_pivot.loc[año, mes]:.1f}" if tabla_pivot.loc[año, mes] > 0 else "-",
-                            className="text-center",
-                            style={'background-color': '#2d2c55', 'color': 'white'} if año == 'PROMEDIO' else {}) 
-                    for mes in sorted(tabla_pivot.columns[:-1])],
-                    html.Td(html.B(f"{tabla_pivot.loc[año, 'PROMEDIO']:.1f}"), 
-                        className="text-center",
-                        style={'background-color': '#2d2c55', 'color': 'white', 'font-weight': 'bold'} if año == 'PROMEDIO' else {'background-color': '#e8f4f8', 'font-weight': 'bold'})
-                ], style={'background-color': '#2d2c55'} if año == 'PROMEDIO' else {})
-                for año in tabla_pivot.index
-            ])
-        ], className="table table-striped table-sm table-bordered")
+        # Meses en orden y textos de toda la matriz de una vez
+        tabla_pivot = tabla_pivot[sorted(tabla_pivot.columns[:-1]) + ['PROMEDIO']]
+        valores = tabla_pivot.to_numpy(dtype=float)
+        tabla_html = tabla_mensual(
+            tabla_pivot,
+            celdas=np.where(valores[:, :-1] > 0, np.char.mod('%.1f', valores[:, :-1]), '-'),
+            totales=np.char.mod('%.1f', valores[:, -1]),
+            columna_total='PROMEDIO',
+            clase='tabla-precios'
+        )
         
         return html.Div([
             html.P(f"💰 Precios promedio UF/m² por período", 
@@ -274,179 +754,2018 @@ def crear_tabla_precios_mensuales(df_vendidos):
         ])
         
     except Exception as e:
-        print(f"Error creando tabla precios: {e}")
+        log.exception(f"Error creando tabla precios: {e}")
         return html.Div([
             html.H6("❌ Error procesando precios", className="text-center text-danger"),
             html.P(f"Error: {str(e)}", className="text-center text-muted")
         ])
 
-def crear_grafico_3d(df_filtrado):
-    """Crear gráfico 3D del edificio con layout 3x3"""
+# Colores por estado de venta
+COLORES_ESTADOS = {
+    'Disponible': '#28A745',    # Verde
+    'Reserva': '#FFC107',       # Amarillo  
+    'Promesa': '#DC3545',       # Rojo
+    'Stock Ausente': '#6C757D'  # Gris
+}
+
+# Layout 3x3 con escaleras en el centro (posición 1,1)
+# Tipos y sus orientaciones:
+POSICIONES = {
+    2: (0, 2),  # Poniente-Norte (izquierda arriba)
+    3: (1, 2),  # Norte (centro arriba)  
+    4: (2, 2),  # Norte-Oriente (derecha arriba)
+    5: (2, 1),  # Oriente (derecha centro)
+    6: (2, 0),  # Oriente-Sur (derecha abajo)
+    7: (1, 0),  # Sur (centro abajo)
+    8: (0, 0),  # Sur-Poniente (izquierda abajo)
+    1: (0, 1)   # Poniente (izquierda centro)
+    # Escaleras en (1, 1) - centro
+}
+
+ESCALERA_POS = (1, 1)
+
+# Mapeo de orientaciones
+ORIENTACIONES = {
+    1: 'Poniente',
+    2: 'Poniente-Norte', 
+    3: 'Norte',
+    4: 'Norte-Oriente',
+    5: 'Oriente',
+    6: 'Oriente-Sur',
+    7: 'Sur',
+    8: 'Sur-Poniente'
+}
+
+# Layout del edificio por defecto; cada proyecto puede reemplazar cualquiera de estas claves
+LAYOUT_PREDETERMINADO = {
+    'posiciones': POSICIONES,
+    'escalera': ESCALERA_POS,
+    'orientaciones': ORIENTACIONES,
+    'orientaciones_tipos': ORIENTACIONES_TIPOS
+}
+
+def layout_proyecto(config):
+    """Layout de un proyecto: el predeterminado con las claves que trae su configuración (JSON)"""
+    config = config or {}
+    layout = dict(LAYOUT_PREDETERMINADO)
+    if 'posiciones' in config:
+        layout['posiciones'] = {int(tipo): tuple(posicion) for tipo, posicion in config['posiciones'].items()}
+    if 'escalera' in config:
+        layout['escalera'] = tuple(config['escalera'])
+    if 'orientaciones' in config:
+        layout['orientaciones'] = {int(tipo): nombre for tipo, nombre in config['orientaciones'].items()}
+    if 'orientaciones_tipos' in config:
+        layout['orientaciones_tipos'] = {orientacion: [int(tipo) for tipo in tipos]
+                                         for orientacion, tipos in config['orientaciones_tipos'].items()}
+    return layout
+
+def estilo_orientacion(orientacion):
+    """(ícono, sigla, color) de una orientación; las que no son puntos cardinales usan la brújula"""
+    return ESTILOS_ORIENTACIONES.get(orientacion, ('🧭', None, '#2d2c55'))
+
+def opciones_orientacion(orientaciones_tipos):
+    """Opciones del filtro de orientación para las orientaciones de un proyecto"""
+    opciones = [{'label': '🧭 Todas las orientaciones', 'value': 'todas'}]
+    for orientacion in orientaciones_tipos:
+        icono, sigla, _ = estilo_orientacion(orientacion)
+        opciones.append({'label': f"{icono} {orientacion.capitalize()}{f' ({sigla})' if sigla else ''}",
+                         'value': orientacion})
+    return opciones
+
+def mapa_orientaciones(layout):
+    """Columnas del Mapa de Orientaciones: los tipos de cada orientación del proyecto"""
+    columnas = []
+    ancho = max(12 // max(len(layout['orientaciones_tipos']), 1), 2)
+    for orientacion, tipos in layout['orientaciones_tipos'].items():
+        icono, _, color = estilo_orientacion(orientacion)
+        lineas = [html.P(f"• Tipo {tipo}: {layout['orientaciones'].get(tipo, 'N/A')}",
+                         className="mb-0" if posicion == len(tipos) - 1 else "mb-1")
+                  for posicion, tipo in enumerate(tipos)]
+        columnas.append(dbc.Col([
+            html.Div([
+                html.H6(f"{icono} {orientacion.upper()}", className="text-center mb-2", style={'color': color})
+            ] + lineas, className="border rounded p-3", style={'border-color': '#4a4a7a !important'})
+        ], width=ancho))
+    return columnas
+
+# Geometría de un cubo unitario: 8 vértices y 12 triángulos
+CUBO_X = np.array([0, 1, 1, 0, 0, 1, 1, 0])
+CUBO_Y = np.array([0, 0, 1, 1, 0, 0, 1, 1])
+CUBO_Z = np.array([0, 0, 0, 0, 1, 1, 1, 1])
+CUBO_I = np.array([7, 0, 0, 0, 4, 4, 6, 1, 4, 0, 3, 6])
+CUBO_J = np.array([3, 4, 1, 2, 5, 6, 5, 2, 0, 1, 6, 3])
+CUBO_K = np.array([0, 7, 2, 3, 6, 7, 1, 6, 5, 5, 7, 7])
+
+# Recorrido de las aristas del cubo (16 puntos) seguido de un NaN que corta la línea
+ARISTAS_X = np.array([0, 1, 1, 0, 0, 0, 1, 1, 1, 1, 0, 0, 0, 1, 1, 0, np.nan])
+ARISTAS_Y = np.array([0, 0, 1, 1, 0, 0, 0, 0, 1, 1, 1, 1, 0, 0, 1, 1, np.nan])
+ARISTAS_Z = np.array([0, 0, 0, 0, 0, 1, 1, 1, 1, 0, 0, 1, 1, 1, 1, 0, np.nan])
+
+def construir_cubos(x, y, z):
+    """Vértices (N x 8) y aristas (N x 17) de N cubos con esquina en x, y, z"""
+    x = np.asarray(x, dtype=float)[:, None]
+    y = np.asarray(y, dtype=float)[:, None]
+    z = np.asarray(z, dtype=float)[:, None]
+    vertices = (x + CUBO_X, y + CUBO_Y, z + CUBO_Z)
+    aristas = (x + ARISTAS_X, y + ARISTAS_Y, z + ARISTAS_Z)
+    return vertices, aristas
+
+def repetir_por_cubo(valores, veces):
+    """Cada elemento de valores repetido veces seguidas (uno por vértice o por cara de su cubo)
+    
+    Por índice y no con np.repeat sobre los valores: numpy 1.24 suelta el GIL al repetir
+    arreglos de objetos, y dos hilos armando gráficos a la vez (precalentamiento y un request)
+    hacían caer el proceso.
+    """
+    return valores[np.repeat(np.arange(len(valores)), veces)]
+
+def caras_cubos(cubos):
+    """Índices i, j, k de los triángulos de los cubos indicados (índices de cubo)"""
+    desplazamiento = (np.asarray(cubos, dtype=int) * len(CUBO_X))[:, None]
+    return ((desplazamiento + CUBO_I).ravel(),
+            (desplazamiento + CUBO_J).ravel(),
+            (desplazamiento + CUBO_K).ravel())
+
+# Hover de los departamentos: una sola plantilla para toda la malla y los valores de cada
+# departamento en customdata (ver datos_hover)
+HOVER_DEPARTAMENTO = (
+    "<b style='color:#0C0404; font-size:14px;'>🏢 Tipo %{customdata[0]} - Piso %{customdata[1]}</b><br>"
+    "<span style='color:#0C0404;'><b>Estado:</b></span> <b>%{customdata[2]}</b><br>"
+    "<span style='color:#0C0404;'><b>Precio:</b></span> <b>UF %{customdata[3]}</b><br>"
+    "<span style='color:#0C0404;'><b>Superficie:</b></span> <b>%{customdata[4]} m²</b><br>"
+    "<span style='color:#0C0404;'><b>UF/m²:</b></span> <b>%{customdata[5]}</b><br>"
+    "<span style='color:#0C0404;'><b>Tipología:</b></span> <b>%{customdata[6]}</b><br>"
+    "<span style='color:#0C0404;'><b>Orientación:</b></span> <b>%{customdata[7]}</b><br>"
+    "%{customdata[8]}<extra></extra>"
+)
+HOVER_ESCALERA = "<b style='color:#2C3E50;'>🚶‍♂️ ESCALERAS</b><br>Piso %{customdata}<extra></extra>"
+
+def por_tipo(tipos, valores):
+    """Arreglo (len(tipos) x k) con valores[tipo] para cada tipo, NaN donde el tipo no está en valores"""
+    resultado = np.full((len(tipos), len(next(iter(valores.values()), ()))), np.nan)
+    if not valores:
+        return resultado
+    claves = np.array(list(valores), dtype=int)
+    orden = np.argsort(claves)
+    claves, tabla = claves[orden], np.array(list(valores.values()), dtype=float)[orden]
+    posicion = np.searchsorted(claves, tipos).clip(max=len(claves) - 1)
+    encontrados = claves[posicion] == tipos
+    resultado[encontrados] = tabla[posicion[encontrados]]
+    return resultado
+
+def rango_ejes(*valores):
+    """Rango [mínimo, máximo] de todos los valores (sin NaN); [0, 3] si no hay ninguno"""
+    todos = np.concatenate([np.ravel(v) for v in valores])
+    todos = todos[~np.isnan(todos)]
+    if len(todos) == 0:
+        return [0, 3]
+    return [float(todos.min()), float(todos.max())]
+
+def datos_hover(df, orientaciones=ORIENTACIONES):
+    """Valores de HOVER_DEPARTAMENTO de cada fila de df, ya como texto, calculados por columna"""
+    def columna(nombre, faltante):
+        return df[nombre] if nombre in df.columns else pd.Series(faltante, index=df.index)
+    
+    tipos = df['TIPO'].astype(int)
+    # La línea de fecha solo aparece en los departamentos vendidos
+    fechas = columna('FECHA', pd.NaT)
+    linea_fecha = ("<span style='color:#0C0404;'><b>Fecha:</b></span> <b>"
+                   + fechas.dt.strftime('%d/%m/%Y') + "</b><br>").where(fechas.notna(), '')
+    # Una operación por columna, sin recorrer filas: los números con format por columna completa
+    # (más rápido que np.char.mod o un separador de miles con expresión regular)
+    return np.column_stack([
+        tipos.astype(str),
+        df['PISO'].astype(str),
+        df['ESTADO'].astype(str).str.strip(),
+        columna('PRECIO', 0).map('{:,.0f}'.format),
+        columna('M2', 0).astype(str),
+        columna('UF/M2', 0).map('{:.2f}'.format),
+        columna('TIPOLOGIA', 'N/A').astype(str),
+        tipos.map(orientaciones).fillna('N/A'),
+        linea_fecha
+    ]).astype(object)
+
+def compilar_geometria(df, layout=LAYOUT_PREDETERMINADO):
+    """Precalcular la geometría del edificio, una fila por departamento de df"""
+    posiciones = layout['posiciones']
+    tipos = df['TIPO'].astype(int).to_numpy()
+    pisos = df['PISO'].to_numpy()
+    
+    # Departamentos con un tipo ubicable en el layout
+    ubicables = np.isin(tipos, list(posiciones))
+    x, y = por_tipo(tipos, posiciones).T
+    vertices, aristas = construir_cubos(x, y, pisos)
+    
+    # Normalizar el estado para asegurar coincidencia exacta
+    estados = df['ESTADO'].astype(str).str.strip()
+    desconocidos = set(estados[ubicables]) - set(COLORES_ESTADOS)
+    for estado in desconocidos:
+        log.warning(f"⚠️ Estado desconocido: '{estado}' - usando color gris por defecto")
+    colores = estados.map(COLORES_ESTADOS).fillna('#CCCCCC').to_numpy()
+    hover = datos_hover(df, layout['orientaciones'])
+    
+    # Escaleras (centro del edificio), una por piso del edificio
+    pisos_escalera = np.unique(pisos)
+    vertices_escalera, _ = construir_cubos(
+        np.full(len(pisos_escalera), layout['escalera'][0]),
+        np.full(len(pisos_escalera), layout['escalera'][1]),
+        pisos_escalera
+    )
+    # Mallas estables: los departamentos ubicables en una y las escaleras (una por piso) en otra.
+    # Los filtros solo cambian qué caras se dibujan y su color, nunca los vértices.
+    n_departamentos = int(ubicables.sum())
+    cubo_de_fila = np.full(len(df), -1)
+    cubo_de_fila[ubicables] = np.arange(n_departamentos)
+    
+    return {
+        'pisos': pisos,
+        'ubicables': ubicables,
+        'cubo_de_fila': cubo_de_fila,
+        'n_departamentos': n_departamentos,
+        'pisos_escalera': pisos_escalera,
+        'vertices': tuple(v[ubicables].ravel() for v in vertices),
+        'vertices_escalera': tuple(v.ravel() for v in vertices_escalera),
+        'aristas': aristas,
+        # Una entrada por cubo de departamento
+        'colores': colores[ubicables],
+        'hover': hover[ubicables],
+        # Ejes x/y a la medida del layout del proyecto ([0, 3] en el predeterminado)
+        'rangos_xy': [rango_ejes(vertices[eje][ubicables], vertices_escalera[eje]) for eje in range(2)]
+    }
+
+@medir_etapa('actualizacion 3d')
+def actualizacion_grafico_3d(geometria, visibles):
+    """Lo que cambia del gráfico al filtrar: caras y colores, caras de escaleras, aristas y rango de pisos
+    
+    visibles es una máscara booleana alineada con las filas usadas en compilar_geometria.
+    """
+    visibles = np.asarray(visibles, dtype=bool)
+    departamentos = visibles & geometria['ubicables']
+    
+    # Escaleras solo en los pisos con algún departamento visible
+    pisos_visibles = np.unique(geometria['pisos'][visibles])
+    escaleras = np.isin(geometria['pisos_escalera'], pisos_visibles)
+    
+    cubos = geometria['cubo_de_fila'][departamentos]
+    i, j, k = caras_cubos(cubos)
+    
+    # Bordes de los departamentos (sin escaleras)
+    aristas_x, aristas_y, aristas_z = (a[departamentos].ravel() for a in geometria['aristas'])
+    
+    return {
+        'i': i, 'j': j, 'k': k,
+        'facecolor': repetir_por_cubo(geometria['colores'][cubos], len(CUBO_I)),
+        'escaleras': caras_cubos(np.flatnonzero(escaleras)),
+        'aristas': (aristas_x, aristas_y, aristas_z),
+        'rango_z': [1.5, pisos_visibles.max() + 1] if len(pisos_visibles) > 0 else [1.5, 16]
+    }
+
+def parche_grafico_3d(actualizacion):
+    """Patch de Dash que aplica una actualización sobre el gráfico ya enviado al navegador"""
+    parche = Patch()
+    for eje in ['i', 'j', 'k', 'facecolor']:
+        parche['data'][0][eje] = actualizacion[eje]
+    for eje, valores in zip(['x', 'y', 'z'], actualizacion['aristas']):
+        parche['data'][1][eje] = valores
+    for eje, valores in zip(['i', 'j', 'k'], actualizacion['escaleras']):
+        parche['data'][2][eje] = valores
+    parche['layout']['scene']['zaxis']['range'] = actualizacion['rango_z']
+    return parche
+
+# Subir cuando cambien las trazas del gráfico: los navegadores con una figura de otro
+# formato reciben la figura completa en vez de un Patch
+FORMATO_GRAFICO = 4
+
+@medir_etapa('grafico 3d')
+def crear_grafico_3d(geometria, visibles):
+    """Crear gráfico 3D del edificio con layout 3x3
+    
+    visibles es una máscara booleana alineada con las filas usadas en compilar_geometria.
+    """
+    actualizacion = actualizacion_grafico_3d(geometria, visibles)
+    x, y, z = geometria['vertices']
+    
+    fig = go.Figure()
+    
+    # Todos los departamentos en una sola malla. El hover de cada vértice muestra la
+    # información de su cubo: solo los valores van por vértice, la plantilla es una sola.
+    fig.add_trace(go.Mesh3d(
+        x=x, y=y, z=z,
+        i=actualizacion['i'], j=actualizacion['j'], k=actualizacion['k'],
+        facecolor=actualizacion['facecolor'],
+        customdata=repetir_por_cubo(geometria['hover'], len(CUBO_X)),
+        opacity=1.0,
+        hovertemplate=HOVER_DEPARTAMENTO,
+        showscale=False
+    ))
+    
+    # Bordes de los departamentos en una sola traza de líneas
+    aristas_x, aristas_y, aristas_z = actualizacion['aristas']
+    fig.add_trace(go.Scatter3d(
+        x=aristas_x, y=aristas_y, z=aristas_z,
+        mode='lines',
+        line=dict(color='black', width=1),
+        showlegend=False,
+        hoverinfo='skip'
+    ))
+    
+    # Escaleras en su propia malla, con su propio hover (solo el piso va por vértice)
+    escalera_x, escalera_y, escalera_z = geometria['vertices_escalera']
+    escalera_i, escalera_j, escalera_k = actualizacion['escaleras']
+    fig.add_trace(go.Mesh3d(
+        x=escalera_x, y=escalera_y, z=escalera_z,
+        i=escalera_i, j=escalera_j, k=escalera_k,
+        color='#E9ECEF',
+        customdata=repetir_por_cubo(geometria['pisos_escalera'], len(CUBO_X)),
+        opacity=1.0,
+        hovertemplate=HOVER_ESCALERA,
+        showscale=False
+    ))
+    
+    fig.update_layout(
+        scene=dict(
+            xaxis=dict(showticklabels=False, title='', showgrid=False, range=geometria['rangos_xy'][0]),
+            yaxis=dict(showticklabels=False, title='', showgrid=False, range=geometria['rangos_xy'][1]),
+            zaxis=dict(showticklabels=False, title='', showgrid=False, 
+                      range=actualizacion['rango_z']),
+            camera=dict(eye=dict(x=1.5, y=1.5, z=1.2)),
+            aspectmode='manual',
+            aspectratio=dict(x=1, y=1, z=3),
+            bgcolor='#F8F9FA'
+        ),
+        showlegend=False,
+        height=600,
+        # Mantener la cámara del usuario cuando llegan actualizaciones parciales
+        uirevision='edificio',
+        margin=dict(l=0, r=0, t=0, b=0),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)'
+    )
+    
+    return fig
+
+def resumen_metricas(cantidad, sumas, conteos):
+    """Resumen de un grupo a partir de su cantidad, sumas y conteos no nulos por métrica"""
+    resumen = {'cantidad': int(cantidad)}
+    for clave in COLUMNAS_METRICAS:
+        if clave in METRICAS_SUMA:
+            resumen[clave] = sumas.get(clave, 0)
+        elif cantidad == 0 or clave not in sumas:
+            resumen[clave] = 0
+        else:
+            resumen[clave] = sumas[clave] / conteos[clave] if conteos[clave] else np.nan
+    return resumen
+
+@medir_etapa('metricas')
+def calcular_metricas(cubo_filtrado):
+    """Cantidad, sumas y promedios por ESTADO y totales sumando las celdas del cubo en una sola pasada"""
+    columnas = {clave: columna for clave, columna in COLUMNAS_METRICAS.items()
+                if f'suma {columna}' in cubo_filtrado.columns}
+    medidas = ['cantidad'] + [f'{medida} {columna}' for columna in columnas.values()
+                              for medida in ('suma', 'conteo')]
+    # Una sola pasada: cantidad, sumas y conteos no nulos por estado
+    agregado = cubo_filtrado.groupby('ESTADO', sort=False, dropna=False, observed=True)[medidas].sum()
+    
+    por_estado = {}
+    total_sumas = {clave: [] for clave in columnas}
+    total_conteos = {clave: 0 for clave in columnas}
+    for estado in agregado.index:
+        sumas = {clave: agregado.at[estado, f'suma {columna}'] for clave, columna in columnas.items()}
+        conteos = {clave: agregado.at[estado, f'conteo {columna}'] for clave, columna in columnas.items()}
+        for clave in columnas:
+            total_sumas[clave].append(sumas[clave])
+            total_conteos[clave] += conteos[clave]
+        # Con eventos de venta pueden quedar celdas vacías (cantidad 0)
+        if not pd.isna(estado) and agregado.at[estado, 'cantidad'] > 0:
+            por_estado[estado] = resumen_metricas(agregado.at[estado, 'cantidad'], sumas, conteos)
+    
+    # Los totales salen de los grupos, sin volver a recorrer las celdas
+    total = resumen_metricas(agregado['cantidad'].sum(),
+                             {clave: math.fsum(valores) for clave, valores in total_sumas.items()},
+                             total_conteos)
+    return {'total': total, 'por_estado': por_estado}
+
+def metricas_estado(metricas, estado):
+    """Métricas de un estado, en cero si no hay departamentos en ese estado"""
+    return metricas['por_estado'].get(estado) or resumen_metricas(0, {}, {})
+
+def crear_componente_metricas(metricas):
+    """Tarjetas de métricas totales y por estado"""
+    total_departamentos = metricas['total']['cantidad']
+    total_precio = metricas['total']['precio']
+    total_m2 = metricas['total']['m2']
+    promedio_uf_m2 = metricas['total']['uf_m2']
+    metricas_por_estado = {estado: metricas_estado(metricas, estado)
+                           for estado in ('Disponible', 'Reserva', 'Promesa')}
+    
+    # Crear componente de métricas
+    metricas_componente = html.Div([
+        # Métricas Totales
+        html.H5("📊 MÉTRICAS TOTALES", className="text-center mb-3", style={'color': '#2C3E50', 'fontWeight': 'bold'}),
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    html.H4(f"{total_departamentos}", className="mb-0", style={'color': '#6C757D', 'fontWeight': 'bold'}),
+                    html.Small("Total Departamentos", className="text-muted")
+                ], className="text-center p-2 border rounded")
+            ], width=3),
+            dbc.Col([
+                html.Div([
+                    html.H4(f"UF {total_precio:,.0f}", className="mb-0", style={'color': '#007BFF', 'fontWeight': 'bold'}),
+                    html.Small("Total Precio", className="text-muted")
+                ], className="text-center p-2 border rounded")
+            ], width=3),
+            dbc.Col([
+                html.Div([
+                    html.H4(f"{total_m2:,.1f} m²", className="mb-0", style={'color': '#FF6B6B', 'fontWeight': 'bold'}),
+                    html.Small("Total Superficie", className="text-muted")
+                ], className="text-center p-2 border rounded")
+            ], width=3),
+            dbc.Col([
+                html.Div([
+                    html.H4(f"{promedio_uf_m2:.2f}", className="mb-0", style={'color': '#9C27B0', 'fontWeight': 'bold'}),
+                    html.Small("Promedio UF/m²", className="text-muted")
+                ], className="text-center p-2 border rounded")
+            ], width=3)
+        ], className="mb-4"),
+        
+        # Separador
+        html.Hr(),
+        
+        # Métricas por Estado
+        html.H5("📈 MÉTRICAS POR ESTADO", className="text-center mb-3", style={'color': '#2C3E50', 'fontWeight': 'bold'}),
+        
+        # DISPONIBLES
+        html.H6("🟢 DISPONIBLES", className="mb-2", style={'color': '#28A745', 'fontWeight': 'bold'}),
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    html.H6(f"{metricas_por_estado['Disponible']['cantidad']}", className="mb-0", style={'color': '#28A745'}),
+                    html.Small("Cantidad", className="text-muted")
+                ], className="text-center p-1")
+            ], width=3),
+            dbc.Col([
+                html.Div([
+                    html.H6(f"UF {metricas_por_estado['Disponible']['precio']:,.0f}", className="mb-0", style={'color': '#28A745'}),
+                    html.Small("Precio Total", className="text-muted")
+                ], className="text-center p-1")
+            ], width=3),
+            dbc.Col([
+                html.Div([
+                    html.H6(f"{metricas_por_estado['Disponible']['m2']:,.1f} m²", className="mb-0", style={'color': '#28A745'}),
+                    html.Small("Superficie", className="text-muted")
+                ], className="text-center p-1")
+            ], width=3),
+            dbc.Col([
+                html.Div([
+                    html.H6(f"{metricas_por_estado['Disponible']['uf_m2']:.2f}", className="mb-0", style={'color': '#28A745'}),
+                    html.Small("Prom. UF/m²", className="text-muted")
+                ], className="text-center p-1")
+            ], width=3)
+        ], className="mb-2"),
+        
+        # RESERVAS
+        html.H6("🟡 RESERVAS", className="mb-2", style={'color': '#FFC107', 'fontWeight': 'bold'}),
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    html.H6(f"{metricas_por_estado['Reserva']['cantidad']}", className="mb-0", style={'color': '#FFC107'}),
+                    html.Small("Cantidad", className="text-muted")
+                ], className="text-center p-1")
+            ], width=3),
+            dbc.Col([
+                html.Div([
+                    html.H6(f"UF {metricas_por_estado['Reserva']['precio']:,.0f}", className="mb-0", style={'color': '#FFC107'}),
+                    html.Small("Precio Total", className="text-muted")
+                ], className="text-center p-1")
+            ], width=3),
+            dbc.Col([
+                html.Div([
+                    html.H6(f"{metricas_por_estado['Reserva']['m2']:,.1f} m²", className="mb-0", style={'color': '#FFC107'}),
+                    html.Small("Superficie", className="text-muted")
+                ], className="text-center p-1")
+            ], width=3),
+            dbc.Col([
+                html.Div([
+                    html.H6(f"{metricas_por_estado['Reserva']['uf_m2']:.2f}", className="mb-0", style={'color': '#FFC107'}),
+                    html.Small("Prom. UF/m²", className="text-muted")
+                ], className="text-center p-1")
+            ], width=3)
+        ], className="mb-2"),
+        
+        # PROMESAS
+        html.H6("🔴 PROMESAS", className="mb-2", style={'color': '#DC3545', 'fontWeight': 'bold'}),
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    html.H6(f"{metricas_por_estado['Promesa']['cantidad']}", className="mb-0", style={'color': '#DC3545'}),
+                    html.Small("Cantidad", className="text-muted")
+                ], className="text-center p-1")
+            ], width=3),
+            dbc.Col([
+                html.Div([
+                    html.H6(f"UF {metricas_por_estado['Promesa']['precio']:,.0f}", className="mb-0", style={'color': '#DC3545'}),
+                    html.Small("Precio Total", className="text-muted")
+                ], className="text-center p-1")
+            ], width=3),
+            dbc.Col([
+                html.Div([
+                    html.H6(f"{metricas_por_estado['Promesa']['m2']:,.1f} m²", className="mb-0", style={'color': '#DC3545'}),
+                    html.Small("Superficie", className="text-muted")
+                ], className="text-center p-1")
+            ], width=3),
+            dbc.Col([
+                html.Div([
+                    html.H6(f"{metricas_por_estado['Promesa']['uf_m2']:.2f}", className="mb-0", style={'color': '#DC3545'}),
+                    html.Small("Prom. UF/m²", className="text-muted")
+                ], className="text-center p-1")
+            ], width=3)
+        ])
+    ])
+    
+    return metricas_componente
+
+def crear_info_filtros(filtros, metricas):
+    """Texto descriptivo de los filtros aplicados y totales por estado"""
+    pisos_seleccionados, orientacion_seleccionada, estados_seleccionados, tipologias_seleccionadas = filtros
+    total_departamentos = metricas['total']['cantidad']
+    
+    # Información de filtros mejorada
+    total_disponibles = metricas_estado(metricas, 'Disponible')['cantidad']
+    total_reservas = metricas_estado(metricas, 'Reserva')['cantidad']
+    total_promesas = metricas_estado(metricas, 'Promesa')['cantidad']
+    
+    # Crear texto descriptivo de filtros
+    filtros_texto = []
+    
+    if pisos_seleccionados and len(pisos_seleccionados) > 0:
+        pisos_texto = ", ".join([f"Piso {p}" for p in sorted(pisos_seleccionados)])
+        filtros_texto.append(f"Pisos: {pisos_texto}")
+    else:
+        filtros_texto.append("Pisos: Todos")
+    
+    orientacion_texto = {
+        'todas': 'Todas las orientaciones',
+        'norte': '⬆️ Norte únicamente',
+        'oriente': '➡️ Oriente únicamente',
+        'sur': '⬇️ Sur únicamente',
+        'poniente': '⬅️ Poniente únicamente'
+    }
+    if orientacion_seleccionada not in orientacion_texto:
+        # Orientación propia del layout del proyecto
+        orientacion_texto[orientacion_seleccionada] = \
+            f"{estilo_orientacion(orientacion_seleccionada)[0]} {orientacion_seleccionada.capitalize()} únicamente"
+    filtros_texto.append(f"Orientación: {orientacion_texto[orientacion_seleccionada]}")
+    
+    estado_texto = {
+        'todos': 'Todos los estados',
+        'disponible': '🟢 Solo Disponibles',
+        'reserva': '🟡 Solo Reservas',
+        'promesa': '🔴 Solo Promesas'
+    }
+    filtros_texto.append(f"Estados: {estado_texto.get(estados_seleccionados, 'Todos')}")
+    
+    if tipologias_seleccionadas and len(tipologias_seleccionadas) > 0:
+        tip_texto = ", ".join(tipologias_seleccionadas)
+        filtros_texto.append(f"Tipologías: {tip_texto}")
+    
+    info_text = html.Div([
+        html.P([
+            "📊 ", html.Strong("Filtros aplicados: "), " | ".join(filtros_texto)
+        ], className="mb-1"),
+        html.P([
+            html.Strong(f"Total: {total_departamentos} departamentos | "),
+            html.Span(f"🟢 {total_disponibles} Disponibles", className="me-3"),
+            html.Span(f"🟡 {total_reservas} Reservas", className="me-3"),
+            html.Span(f"🔴 {total_promesas} Promesas")
+        ], className="mb-0")
+    ])
+    
+    return info_text
+
+@medir_etapa('tabla unidades')
+def tabla_unidades(df, geometria, orientaciones_tipos=ORIENTACIONES_TIPOS):
+    """Tabla de departamentos compacta y columnar para el modo cliente (assets/filtros_cliente.js)"""
+    def columna(nombre):
+        if nombre not in df.columns:
+            return None
+        return df[nombre].astype(object).where(df[nombre].notna(), None).tolist()
+    
+    def categorias(nombre):
+        if nombre not in df.columns:
+            return None, []
+        codigos, valores = pd.factorize(df[nombre])
+        return codigos.tolist(), valores.tolist()
+    
+    estados, vocabulario_estados = categorias('ESTADO')
+    tipologias, vocabulario_tipologias = categorias('TIPOLOGIA')
+    aristas_x, aristas_y, _ = geometria['aristas']
+    
+    def sin_nan(valores):
+        return [None if np.isnan(v) else v for v in np.asarray(valores, dtype=float).tolist()]
     
-    colores_estados = {
-        'Disponible': '#28A745',    # Verde
-        'Reserva': '#FFC107',       # Amarillo  
-        'Promesa': '#DC3545',       # Rojo
-        'Stock Ausente': '#6C757D'  # Gris
+    return {
+        # Una entrada por departamento
+        'piso': df['PISO'].tolist(),
+        'tipo': df['TIPO'].astype(int).tolist(),
+        'estado': estados,
+        'estados': vocabulario_estados,
+        'tipologia': tipologias,
+        'tipologias': vocabulario_tipologias,
+        'precio': columna('PRECIO'),
+        'm2': columna('M2'),
+        'uf_m2': columna('UF/M2'),
+        'cubo': geometria['cubo_de_fila'].tolist(),
+        'x0': sin_nan(aristas_x[:, 0]),
+        'y0': sin_nan(aristas_y[:, 0]),
+        # Una entrada por cubo de departamento, y los pisos con escalera
+        'colores': geometria['colores'].tolist(),
+        'n_departamentos': geometria['n_departamentos'],
+        'pisos_escalera': geometria['pisos_escalera'].tolist(),
+        # Constantes de geometría y filtros
+        'cubo_i': CUBO_I.tolist(),
+        'cubo_j': CUBO_J.tolist(),
+        'cubo_k': CUBO_K.tolist(),
+        'aristas_x': sin_nan(ARISTAS_X),
+        'aristas_y': sin_nan(ARISTAS_Y),
+        'aristas_z': sin_nan(ARISTAS_Z),
+        'orientaciones_tipos': orientaciones_tipos,
+        'estados_filtro': ESTADOS_FILTRO
     }
+
+def normalizar_filtros(pisos, orientacion, estado, tipologias, orientaciones_tipos=ORIENTACIONES_TIPOS):
+    """Forma canónica de los filtros, usada como clave de caché
+    
+    La orientación se valida contra las del proyecto (orientaciones_tipos de su layout).
+    """
+    pisos = tuple(sorted({int(p) for p in pisos})) if pisos else ()
+    orientacion = orientacion if orientacion in orientaciones_tipos else 'todas'
+    estado = estado if estado in ESTADOS_FILTRO else 'todos'
+    tipologias = tuple(sorted(set(tipologias))) if tipologias else ()
+    return pisos, orientacion, estado, tipologias
+
+class CacheResultados:
+    """Caché LRU con expiración (TTL) para los resultados del dashboard
+    
+    Limitada por cantidad de entradas y, si memoria_maxima no es 0, por los bytes estimados
+    de sus valores (ver memoria_resultado): una figura de un proyecto grande pesa decenas de MB.
+    """
     
-    # Layout 3x3 con escaleras en el centro (posición 1,1)
-    # Tipos y sus orientaciones:
-    posiciones = {
-        2: (0, 2),  # Poniente-Norte (izquierda arriba)
-        3: (1, 2),  # Norte (centro arriba)  
-        4: (2, 2),  # Norte-Oriente (derecha arriba)
-        5: (2, 1),  # Oriente (derecha centro)
-        6: (2, 0),  # Oriente-Sur (derecha abajo)
-        7: (1, 0),  # Sur (centro abajo)
-        8: (0, 0),  # Sur-Poniente (izquierda abajo)
-        1: (0, 1)   # Poniente (izquierda centro)
-        # Escaleras en (1, 1) - centro
+    def __init__(self, tamano_maximo=128, ttl_segundos=600, memoria_maxima=0):
+        self.tamano_maximo = tamano_maximo
+        self.ttl_segundos = ttl_segundos
+        self.memoria_maxima = memoria_maxima
+        # clave -> (guardado en, valor, bytes estimados)
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.memoria = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+    
+    def obtener(self, clave):
+        """Valor guardado para clave, o None si no está o ya expiró"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                guardado_en, valor, _ = entrada
+                if time.monotonic() - guardado_en <= self.ttl_segundos:
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    return valor
+                self._quitar(clave)
+                self.expulsiones += 1
+            self.fallos += 1
+            return None
+    
+    def guardar(self, clave, valor):
+        # La estimación recorre el valor: fuera del lock
+        tamano = memoria_resultado(valor) if self.memoria_maxima else 0
+        with self._lock:
+            if clave in self._entradas:
+                self._quitar(clave)
+            if self.memoria_maxima and tamano > self.memoria_maxima:
+                log.debug("Resultado de %.1f MB no cabe en la caché", tamano / 2**20)
+                return
+            self._entradas[clave] = (time.monotonic(), valor, tamano)
+            self.memoria += tamano
+            while (len(self._entradas) > self.tamano_maximo
+                   or (self.memoria_maxima and self.memoria > self.memoria_maxima)):
+                self._quitar(next(iter(self._entradas)))
+                self.expulsiones += 1
+    
+    def _quitar(self, clave):
+        self.memoria -= self._entradas.pop(clave)[2]
+    
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.memoria = 0
+    
+    def descartar_version(self, version):
+        """Quitar las entradas de una versión de datos que ya no se va a usar"""
+        with self._lock:
+            for clave in [clave for clave in self._entradas if clave[0] == version]:
+                self._quitar(clave)
+                self.expulsiones += 1
+    
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'entradas': len(self._entradas),
+                'memoria_bytes': self.memoria,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'expulsiones': self.expulsiones
+            }
+
+class ConjuntoDatos:
+    """Datos de un proyecto y todo lo derivado de ellos (geometría, índice, versión)
+    
+    Nunca se modifica: al recargar se construye uno nuevo y se reemplaza completo.
+    """
+    
+    def __init__(self, df, proyecto, huella, modificacion=None):
+        self.df = df
+        self.proyecto = proyecto['id']
+        self.nombre = proyecto['nombre']
+        self.archivo = proyecto['archivo']
+        self.layout = proyecto['layout']
+        self.huella = huella
+        self.modificacion = modificacion
+        # Misma versión en todos los workers para los mismos datos (la usa la caché y el Patch del gráfico).
+        # Incluye el proyecto: dos proyectos con el mismo archivo pueden tener distinto layout.
+        self.version_base = f"{self.proyecto}-{huella[:16]}"
+        self.version = self.version_base
+        # Bytes del registro de eventos ya aplicados
+        self.eventos_leidos = 0
+        self._filas = None
+        self._celdas = None
+        self.geometria = compilar_geometria(df, self.layout)
+        self.indice = construir_indice(df, self.layout['orientaciones_tipos'])
+        # Métricas y tablas mensuales se calculan sobre las celdas del cubo, no sobre las filas
+        self.cubo = construir_cubo(df)
+        self.indice_cubo = construir_indice_cubo(self.cubo, self.layout['orientaciones_tipos'])
+        self.memoria = (memoria_datos(df) + memoria_datos(self.cubo)
+                        + memoria_arreglos(self.geometria) + memoria_arreglos(self.indice)
+                        + memoria_arreglos(self.indice_cubo))
+    
+    def filas_por_unidad(self):
+        """(PISO, TIPO) -> fila de df, armado al primer uso"""
+        if self._filas is None:
+            self._filas = dict(zip(zip(self.df['PISO'].tolist(), self.df['TIPO'].tolist()), range(len(self.df))))
+        return self._filas
+    
+    def celdas_por_clave(self):
+        """Clave de celda -> fila del cubo, armado al primer uso"""
+        if self._celdas is None:
+            columnas = [serie.name for serie in claves_cubo(self.df.iloc[:0])]
+            self._celdas = {clave: celda for celda, clave in enumerate(tuplas_clave([self.cubo[c] for c in columnas]))}
+        return self._celdas
+
+def memoria_arreglos(objeto):
+    """Bytes de los arreglos numpy dentro de dicts, tuplas y listas (los textos por su largo)"""
+    if isinstance(objeto, np.ndarray):
+        if objeto.dtype == object:
+            return objeto.nbytes + sum(len(valor) for valor in objeto.ravel() if isinstance(valor, str))
+        return objeto.nbytes
+    if isinstance(objeto, dict):
+        return sum(memoria_arreglos(valor) for valor in objeto.values())
+    if isinstance(objeto, (tuple, list)):
+        return sum(memoria_arreglos(valor) for valor in objeto)
+    return 0
+
+def memoria_resultado(valor):
+    """Bytes aproximados de un resultado de la caché: arreglos y textos dentro de figuras, componentes y dicts
+    
+    En los arreglos de objetos cuentan solo las referencias: los textos de hover y los colores
+    se comparten con la geometría, que ya cuenta en la memoria del proyecto.
+    """
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, str):
+        return len(valor)
+    if isinstance(valor, go.Figure):
+        # _data: los dicts de las trazas tal como los guarda la figura (to_dict copiaría todo)
+        return memoria_resultado(valor._data)
+    if isinstance(valor, Component):
+        return memoria_resultado(valor.to_plotly_json()['props'])
+    if isinstance(valor, dict):
+        return sum(memoria_resultado(v) for v in valor.values())
+    if isinstance(valor, (tuple, list)):
+        return sum(memoria_resultado(v) for v in valor)
+    return 0
+
+def leer_archivo(archivo):
+    """Contenido del archivo, su huella SHA-1 y su fecha de modificación; (None, None, None) si no se puede leer"""
+    try:
+        # La fecha antes que el contenido: un cambio durante la lectura se detecta en la siguiente vuelta
+        modificacion = os.path.getmtime(archivo)
+        with open(archivo, 'rb') as f:
+            contenido = f.read()
+    except OSError as e:
+        log.error(f"Error leyendo {archivo}: {e}")
+        return None, None, None
+    return contenido, hashlib.sha1(contenido).hexdigest(), modificacion
+
+def preparar_datos(proyecto, contenido=None, huella=None, modificacion=None):
+    """Cargar el archivo de un proyecto (leído una sola vez) y precalcular lo derivado; None si falla
+    
+    Corre en el request que usa el proyecto por primera vez (o en la vigilancia, al recargar)
+    y ese request paga también releer el registro de eventos: sin ellos se mostrarían como
+    disponibles departamentos ya vendidos. El costo crece con el registro (unos 0,7 s por cada
+    10.000 eventos); la instantánea del historial ya no se escribe aquí (ver registrar_en_segundo_plano).
+    """
+    if contenido is None:
+        contenido, huella, modificacion = leer_archivo(proyecto['archivo'])
+        if contenido is None:
+            return None
+    
+    # Primero la caché columnar de este mismo contenido; si no está, el Excel
+    df = cargar_cache_columnar(CACHE_DATOS_DIR, huella) if CACHE_DATOS_DIR else None
+    if df is None:
+        df = cargar_datos(io.BytesIO(contenido))
+        if df is None:
+            return None
+        # Volver a abrir desde la caché para usar sus columnas mapeadas en memoria:
+        # todos los workers comparten esas páginas en vez de tener su propia copia
+        if CACHE_DATOS_DIR and guardar_cache_columnar(df, CACHE_DATOS_DIR, huella):
+            df = cargar_cache_columnar(CACHE_DATOS_DIR, huella)
+    datos = ConjuntoDatos(df, proyecto, huella, modificacion)
+    # Los eventos de venta registrados después del archivo, antes de que alguien vea los datos
+    datos, _ = actualizar_con_eventos(datos)
+    log.info("💾 Memoria del proyecto %s: %.1f KB (%d filas, %d columnas)",
+             datos.nombre, datos.memoria / 1024, len(df), len(df.columns))
+    return datos
+
+def preprocesar_archivo(archivo, directorio):
+    """Procesar una planilla y dejarla en la caché columnar (corre en un proceso del pool)"""
+    inicio = time.perf_counter()
+    resultado = {'archivo': archivo, 'proceso': os.getpid()}
+    try:
+        contenido, huella, _ = leer_archivo(archivo)
+        if contenido is None:
+            resultado.update(estado='error', error='no se pudo leer el archivo')
+        elif os.path.isdir(carpeta_cache_columnar(directorio, huella)):
+            resultado.update(estado='en caché', huella=huella)
+        else:
+            df = cargar_datos(io.BytesIO(contenido))
+            if df is None:
+                resultado.update(estado='error', huella=huella, error='no se pudo procesar la planilla')
+            elif not guardar_cache_columnar(df, directorio, huella):
+                resultado.update(estado='error', huella=huella, error='no se pudo guardar la caché columnar')
+            else:
+                resultado.update(estado='procesado', huella=huella, filas=len(df))
+    except Exception as e:
+        resultado.update(estado='error', error=f"{type(e).__name__}: {e}")
+    resultado['segundos'] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+def preprocesar_archivos(archivos, procesos=None, directorio=None):
+    """Preprocesar varias planillas en paralelo con un pool de procesos
+    
+    Cada planilla queda en la caché columnar, así los workers web la abren sin leer el Excel.
+    Devuelve un reporte con el resultado y el tiempo de cada archivo.
+    """
+    directorio = directorio or CACHE_DATOS_DIR
+    archivos = list(dict.fromkeys(archivos))
+    inicio = time.perf_counter()
+    resultados = []
+    if not directorio:
+        resultados = [{'archivo': archivo, 'estado': 'error', 'error': 'caché columnar desactivada'}
+                      for archivo in archivos]
+    elif archivos:
+        procesos = procesos or min(len(archivos), os.cpu_count() or 1)
+        # spawn: los procesos no heredan los hilos ni los locks del proceso web
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futuros = {pool.submit(preprocesar_archivo, archivo, directorio): archivo for archivo in archivos}
+            for futuro in as_completed(futuros):
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    resultado = {'archivo': futuros[futuro], 'estado': 'error', 'error': f"{type(e).__name__}: {e}"}
+                error = resultado['estado'] == 'error'
+                log.log(logging.ERROR if error else logging.INFO,
+                        f"{'❌' if error else '✅'} {resultado['archivo']}: {resultado['estado']} ({resultado.get('segundos', 0):.2f} s)"
+                      + (f" - {resultado['error']}" if 'error' in resultado else ""))
+                resultados.append(resultado)
+    
+    reporte = {
+        'archivos': resultados,
+        'procesados': sum(resultado['estado'] == 'procesado' for resultado in resultados),
+        'en_cache': sum(resultado['estado'] == 'en caché' for resultado in resultados),
+        'errores': sum(resultado['estado'] == 'error' for resultado in resultados),
+        'segundos': round(time.perf_counter() - inicio, 3)
     }
+    log.info("📦 Preprocesamiento: %d procesados, %d ya en caché, %d con error en %.2f s",
+             reporte['procesados'], reporte['en_cache'], reporte['errores'], reporte['segundos'])
+    return reporte
+
+class RegistroProyectos:
+    """Proyectos disponibles y sus datos, que se cargan recién al primer uso
+    
+    Los datos cargados se expulsan en orden LRU cuando se pasa el presupuesto de memoria
+    o la cantidad máxima de proyectos cargados; el último usado nunca se expulsa.
+    """
+    
+    def __init__(self, proyectos, cache, memoria_maxima, maximo_cargados, registrar=None, precalentar=None):
+        self.proyectos = OrderedDict((proyecto['id'], proyecto) for proyecto in proyectos)
+        self.principal = next(iter(self.proyectos))
+        self.cache = cache
+        self.registrar = registrar
+        self.precalentar = precalentar
+        self.memoria_maxima = memoria_maxima
+        self.maximo_cargados = maximo_cargados
+        self._cargados = OrderedDict()
+        self._lock = threading.Lock()
+        # Un lock por proyecto: dos requests al mismo proyecto no lo procesan dos veces,
+        # y cargar un proyecto no bloquea a los que ya están en memoria
+        self._locks_carga = {identificador: threading.Lock() for identificador in self.proyectos}
+        self.cargas = 0
+        self.expulsiones = 0
+    
+    def cargado(self, identificador):
+        """Datos del proyecto si ya están en memoria, sin cargarlos"""
+        with self._lock:
+            return self._cargados.get(identificador)
+    
+    def cargados(self):
+        with self._lock:
+            return list(self._cargados.values())
+    
+    def obtener(self, identificador=None):
+        """Datos del proyecto (el principal si no se indica), cargándolos si hace falta; None si no existe o falla"""
+        identificador = identificador or self.principal
+        if identificador not in self.proyectos:
+            return None
+        with self._lock:
+            datos = self._cargados.get(identificador)
+            if datos is not None:
+                self._cargados.move_to_end(identificador)
+                return datos
+        
+        with self._locks_carga[identificador]:
+            datos = self.cargado(identificador)
+            if datos is None:
+                log.info(f"🔄 Cargando proyecto {self.proyectos[identificador]['nombre']}...")
+                datos = preparar_datos(self.proyectos[identificador])
+                if datos is not None:
+                    self.guardar(datos)
+        return datos
+    
+    def guardar(self, datos):
+        """Agregar o reemplazar los datos de un proyecto y expulsar los menos usados si no caben"""
+        with self._lock:
+            anterior = self._cargados.pop(datos.proyecto, None)
+            self._cargados[datos.proyecto] = datos
+            self.cargas += 1
+            expulsados = []
+            while len(self._cargados) > 1 and (
+                    len(self._cargados) > self.maximo_cargados
+                    or sum(cargado.memoria for cargado in self._cargados.values()) > self.memoria_maxima):
+                expulsados.append(self._cargados.popitem(last=False)[1])
+                self.expulsiones += 1
+        
+        # Los resultados memorizados de datos que ya no se usan solo ocupan espacio
+        if anterior is not None and anterior.version != datos.version:
+            self.cache.descartar_version(anterior.version)
+        # Cada versión nueva (carga, recarga o eventos) queda en el historial, sin esperar a escribirla
+        if anterior is None or anterior.version != datos.version:
+            if self.registrar is not None:
+                self.registrar(datos)
+            # Y sus resultados más pedidos se calculan antes de que los pida alguien
+            if self.precalentar is not None:
+                self.precalentar(datos)
+        for expulsado in expulsados:
+            self.cache.descartar_version(expulsado.version)
+            log.info(f"🗑️ Proyecto {expulsado.nombre} fuera de memoria ({expulsado.memoria / 1024:.1f} KB)")
+    
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'proyectos': len(self.proyectos),
+                'cargados': list(self._cargados),
+                'memoria': sum(datos.memoria for datos in self._cargados.values()),
+                'cargas': self.cargas,
+                'expulsiones': self.expulsiones
+            }
+
+# Columnas que se informan al comparar dos versiones
+COLUMNAS_DIFERENCIAS = ('ESTADO', 'FECHA', 'PRECIO', 'UF/M2')
+
+def tabla_historial(df):
+    """Departamentos ordenados por PISO y TIPO: el mismo orden en todas las versiones reconstruidas"""
+    return df.sort_values(['PISO', 'TIPO'], kind='stable').reset_index(drop=True)
+
+def claves_unidades(df):
+    return pd.MultiIndex.from_arrays([df['PISO'].astype(np.int64), df['TIPO'].astype(np.int64)])
+
+def comparable(df):
+    """Categóricas como texto, para comparar columnas con distintas categorías"""
+    return df.astype({columna: object for columna in df.columns if isinstance(df[columna].dtype, pd.CategoricalDtype)})
+
+def distintos(antes, despues):
+    """Máscara de valores distintos (dos vacíos cuentan como iguales)"""
+    return ~((antes == despues) | (antes.isna() & despues.isna())).to_numpy()
+
+def cambios_unidades(antes, despues):
+    """Máscara de los departamentos de despues nuevos o con algún valor distinto, y claves de los eliminados
+    
+    Compara todas las columnas de una vez: un merge por PISO y TIPO y una comparación por columna.
+    """
+    unidas = comparable(despues).merge(comparable(antes).drop_duplicates(['PISO', 'TIPO'], keep='last'),
+                                       on=['PISO', 'TIPO'], how='left', suffixes=('', ' antes'), indicator=True)
+    cambiadas = (unidas['_merge'] == 'left_only').to_numpy()
+    for columna in despues.columns.drop(['PISO', 'TIPO']):
+        if columna in antes.columns:
+            cambiadas |= distintos(unidas[f'{columna} antes'], unidas[columna])
+        else:
+            cambiadas |= unidas[columna].notna().to_numpy()
+    for columna in antes.columns.drop(['PISO', 'TIPO']).difference(despues.columns):
+        cambiadas |= unidas[columna].notna().to_numpy()
+    
+    # Si un departamento está repetido, van todas sus filas
+    claves = claves_unidades(despues)
+    cambiadas = claves.isin(claves[cambiadas])
+    eliminadas = antes.loc[~claves_unidades(antes).isin(claves), ['PISO', 'TIPO']]
+    return cambiadas, eliminadas
+
+def aplicar_delta(df, filas, eliminadas, columnas):
+    """Departamentos de df reemplazados por filas, sin los eliminados, con las columnas indicadas"""
+    claves = claves_unidades(df)
+    quitar = claves.isin(claves_unidades(filas)) | claves.isin(claves_unidades(eliminadas))
+    return tabla_historial(pd.concat([df[~quitar], filas], ignore_index=True).reindex(columns=columnas))
+
+def diferencias_unidades(antes, despues, columnas=COLUMNAS_DIFERENCIAS):
+    """Departamentos que cambiaron entre dos versiones, con el valor antes y después de cada columna"""
+    columnas = [columna for columna in columnas if columna in antes.columns or columna in despues.columns]
+    unidas = comparable(antes.reindex(columns=['PISO', 'TIPO'] + columnas)).merge(
+        comparable(despues.reindex(columns=['PISO', 'TIPO'] + columnas)),
+        on=['PISO', 'TIPO'], how='outer', suffixes=(' antes', ' después'), indicator=True)
+    
+    cambio = np.select([unidas['_merge'] == 'left_only', unidas['_merge'] == 'right_only'],
+                       ['eliminado', 'nuevo'], 'modificado')
+    cambiadas = cambio != 'modificado'
+    for columna in columnas:
+        cambiadas |= distintos(unidas[f'{columna} antes'], unidas[f'{columna} después'])
+    
+    resultado = unidas.drop(columns='_merge').assign(cambio=cambio)[cambiadas]
+    return resultado.sort_values(['PISO', 'TIPO']).reset_index(drop=True)
+
+def leer_instantanea(archivo):
+    """Manifiesto, filas y claves eliminadas de una instantánea del historial"""
+    with np.load(archivo, allow_pickle=False) as contenido:
+        manifiesto = json.loads(str(contenido['manifiesto']))
+        filas = pd.DataFrame({columna['nombre']: decodificar_columna(columna, contenido[f'c{posicion}'])
+                              for posicion, columna in enumerate(manifiesto['columnas'])})
+        eliminadas = pd.DataFrame({'PISO': contenido['eliminados_piso'], 'TIPO': contenido['eliminados_tipo']})
+    return manifiesto, filas, eliminadas
+
+def momento_de_fecha(fecha):
+    """Momento del historial (texto ordenable) al final del día indicado, o None si la fecha no es válida"""
+    try:
+        return pd.Timestamp(fecha).strftime('%Y%m%dT235959999999')
+    except (ValueError, TypeError):
+        return None
+
+class HistorialProyectos:
+    """Instantáneas de los datos de cada proyecto, una por versión, para verlos como estaban en una fecha
+    
+    Cada instantánea guarda solo los departamentos (por PISO y TIPO) que cambiaron respecto de la
+    anterior, codificados por columnas como la caché columnar. Cada `cada_completa` versiones se
+    guarda una completa, así reconstruir un estado nunca recorre toda la historia.
+    Se conservan las últimas `maximo_instantaneas` por proyecto (0: todas).
+    """
+    
+    def __init__(self, directorio, cache, cada_completa=20, maximo_cargados=4, maximo_instantaneas=0):
+        self.directorio = directorio
+        self.cache = cache
+        self.cada_completa = cada_completa
+        self.maximo_cargados = maximo_cargados
+        self.maximo_instantaneas = maximo_instantaneas
+        # Datos del pasado ya construidos, en orden LRU
+        self._cargados = OrderedDict()
+        # Última instantánea que registró este proceso por proyecto: (versión, df, profundidad)
+        self._ultimas = {}
+        self._lock = threading.Lock()
+    
+    def carpeta(self, proyecto_id):
+        return os.path.join(self.directorio, proyecto_id)
+    
+    def instantaneas(self, proyecto_id):
+        """(momento, versión, archivo) de las instantáneas del proyecto, de la más antigua a la más nueva"""
+        carpeta = self.carpeta(proyecto_id)
+        try:
+            nombres = sorted(os.listdir(carpeta))
+        except FileNotFoundError:
+            return []
+        resultado = []
+        vistas = set()
+        for nombre in nombres:
+            if nombre.startswith('.') or not nombre.endswith('.npz'):
+                continue
+            momento, _, version = nombre[:-len('.npz')].partition('_')
+            # Dos workers pueden registrar la misma versión: vale la primera
+            if version not in vistas:
+                vistas.add(version)
+                resultado.append((momento, version, os.path.join(carpeta, nombre)))
+        return resultado
+    
+    def version_en(self, proyecto_id, momento):
+        """Versión vigente en el momento dado (la última registrada hasta entonces), o None sin historial
+        
+        Antes de la primera instantánea no hay nada más antiguo que mostrar: se usa la primera.
+        """
+        lista = self.instantaneas(proyecto_id)
+        if not lista:
+            return None
+        anteriores = [version for registrada, version, _ in lista if registrada <= momento]
+        return anteriores[-1] if anteriores else lista[0][1]
+    
+    def primera_fecha(self, proyecto_id):
+        """Fecha (AAAA-MM-DD) de la instantánea más antigua del proyecto, o None sin historial"""
+        lista = self.instantaneas(proyecto_id)
+        return pd.Timestamp(lista[0][0][:8]).strftime('%Y-%m-%d') if lista else None
+    
+    def tabla(self, proyecto_id, version):
+        """Departamentos de una versión registrada y su distancia a la última completa; (None, None) si falta"""
+        archivos = {registrada: archivo for _, registrada, archivo in self.instantaneas(proyecto_id)}
+        cadena = []
+        while version is not None:
+            if version not in archivos:
+                log.warning(f"⚠️ Falta la instantánea {version} del historial de {proyecto_id}")
+                return None, None
+            manifiesto, filas, eliminadas = leer_instantanea(archivos[version])
+            cadena.append((manifiesto, filas, eliminadas))
+            version = manifiesto['base']
+        
+        df = None
+        for manifiesto, filas, eliminadas in reversed(cadena):
+            df = filas if df is None else aplicar_delta(df, filas, eliminadas, manifiesto['orden'])
+        return compactar_datos(df), len(cadena) - 1
+    
+    def registrar(self, datos):
+        """Guardar la instantánea de datos si su versión no está registrada"""
+        with self._lock:
+            lista = self.instantaneas(datos.proyecto)
+            if any(version == datos.version for _, version, _ in lista):
+                return False
+            
+            df = tabla_historial(datos.df)
+            anterior = self._ultimas.get(datos.proyecto)
+            if lista and (anterior is None or anterior[0] != lista[-1][1]):
+                anterior = (lista[-1][1],) + self.tabla(datos.proyecto, lista[-1][1])
+            if anterior is not None and anterior[1] is not None and anterior[2] + 1 < self.cada_completa:
+                cambiadas, eliminadas = cambios_unidades(anterior[1], df)
+                filas, base, profundidad = df[cambiadas], anterior[0], anterior[2] + 1
+            else:
+                filas, eliminadas, base, profundidad = df, df.loc[[], ['PISO', 'TIPO']], None, 0
+            
+            momento = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+            destino = self._escribir(datos.proyecto, momento, datos.version, list(df.columns),
+                                     filas, eliminadas, base, profundidad)
+            if destino is None:
+                return False
+            
+            self._ultimas[datos.proyecto] = (datos.version, df, profundidad)
+            log.info("🗂️ Instantánea %s guardada: %d departamentos %s, %.1f KB", datos.version, len(filas),
+                     '(completa)' if base is None else 'cambiados', os.path.getsize(destino) / 1024)
+            self._podar(datos.proyecto)
+            return True
+    
+    def _escribir(self, proyecto_id, momento, version, orden, filas, eliminadas, base, profundidad):
+        """Guardar una instantánea de una vez (archivo temporal y os.replace); su ruta, o None si falló"""
+        columnas = []
+        arreglos = {}
+        for nombre in filas.columns:
+            codificada = codificar_columna(filas[nombre])
+            if codificada is None:
+                log.warning(f"⚠️ Columna {nombre} ({filas[nombre].dtype}) no se puede guardar en el historial")
+                return None
+            columnas.append(codificada[0])
+            arreglos[f'c{len(arreglos)}'] = codificada[1]
+        
+        manifiesto = {'version': version, 'momento': momento, 'base': base, 'profundidad': profundidad,
+                      'orden': orden, 'columnas': columnas}
+        carpeta = self.carpeta(proyecto_id)
+        destino = os.path.join(carpeta, f"{momento}_{version}.npz")
+        try:
+            os.makedirs(carpeta, exist_ok=True)
+            descriptor, temporal = tempfile.mkstemp(dir=carpeta, prefix='.tmp-', suffix='.npz')
+            with os.fdopen(descriptor, 'wb') as f:
+                np.savez_compressed(f, manifiesto=np.array(json.dumps(manifiesto, ensure_ascii=False)),
+                                    eliminados_piso=eliminadas['PISO'].to_numpy(),
+                                    eliminados_tipo=eliminadas['TIPO'].to_numpy(), **arreglos)
+            os.replace(temporal, destino)
+        except OSError as e:
+            log.warning(f"⚠️ No se pudo guardar la instantánea {version}: {e}")
+            return None
+        return destino
+    
+    def _podar(self, proyecto_id):
+        """Borrar las instantáneas más antiguas que excedan maximo_instantaneas
+        
+        Si la más antigua que queda es un delta, antes se reescribe completa (con su mismo
+        nombre) para que las siguientes se puedan seguir reconstruyendo.
+        """
+        lista = self.instantaneas(proyecto_id)
+        if not self.maximo_instantaneas or len(lista) <= self.maximo_instantaneas:
+            return
+        momento, version, archivo = lista[-self.maximo_instantaneas]
+        manifiesto, _, _ = leer_instantanea(archivo)
+        if manifiesto['base'] is not None:
+            df, _ = self.tabla(proyecto_id, version)
+            if df is None or self._escribir(proyecto_id, momento, version, manifiesto['orden'], df,
+                                            df.loc[[], ['PISO', 'TIPO']], None, 0) is None:
+                return
+        
+        borradas = 0
+        for nombre in os.listdir(self.carpeta(proyecto_id)):
+            if nombre.endswith('.npz') and not nombre.startswith('.') and nombre.partition('_')[0] < momento:
+                try:
+                    os.remove(os.path.join(self.carpeta(proyecto_id), nombre))
+                    borradas += 1
+                except FileNotFoundError:
+                    pass
+        log.info(f"🧹 Historial de {proyecto_id}: {borradas} instantáneas antiguas borradas, "
+                 f"se conservan {self.maximo_instantaneas}")
+    
+    def obtener(self, proyecto, momento):
+        """Datos del proyecto como estaban en el momento dado, o None si no hay una versión registrada antes
+        
+        Se construyen igual que los actuales (geometría, índices y cubo), así que se dibujan
+        y filtran con el mismo costo.
+        """
+        version = self.version_en(proyecto['id'], momento)
+        if version is None:
+            return None
+        clave = (proyecto['id'], version)
+        with self._lock:
+            datos = self._cargados.get(clave)
+            if datos is not None:
+                self._cargados.move_to_end(clave)
+                return datos
+        
+        df, _ = self.tabla(proyecto['id'], version)
+        if df is None:
+            return None
+        datos = ConjuntoDatos(df, proyecto, hashlib.sha1(version.encode()).hexdigest())
+        # El orden de los departamentos no es el del archivo: versión propia para la caché y el Patch
+        datos.version = f"{version}-historial"
+        with self._lock:
+            self._cargados[clave] = datos
+            expulsados = []
+            while len(self._cargados) > self.maximo_cargados:
+                expulsados.append(self._cargados.popitem(last=False)[1])
+        for expulsado in expulsados:
+            self.cache.descartar_version(expulsado.version)
+        return datos
+
+def recargar_datos(proyecto_id=None, forzar=False):
+    """Recargar el archivo de un proyecto si cambió y reemplazar sus datos de una vez
+    
+    Solo recarga proyectos que están en memoria (o cualquiera si se fuerza): los demás se
+    leen actualizados cuando se vuelvan a usar. Mientras se procesa el archivo nuevo,
+    los callbacks siguen usando los datos anteriores.
+    """
+    proyecto_id = proyecto_id or registro.principal
+    with lock_recarga:
+        actual = registro.cargado(proyecto_id)
+        if actual is None and not forzar:
+            return False
+        proyecto = registro.proyectos[proyecto_id]
+        contenido, huella, modificacion = leer_archivo(proyecto['archivo'])
+        if contenido is None:
+            return False
+        if not forzar and huella == actual.huella:
+            return False
+        
+        nuevo = preparar_datos(proyecto, contenido, huella, modificacion)
+        if nuevo is None:
+            log.warning(f"⚠️ No se pudo recargar {proyecto['nombre']}, se mantienen los datos anteriores")
+            return False
+        
+        registro.guardar(nuevo)
+        log.info(f"🔄 Datos recargados: {proyecto['nombre']}, {len(nuevo.df)} departamentos (versión {nuevo.version})")
+        return True
+
+def archivo_eventos(proyecto_id):
+    """Registro de eventos (JSONL, solo se agregan líneas) de un proyecto"""
+    return os.path.join(EVENTOS_DIR, f"{proyecto_id}.jsonl")
+
+def leer_eventos(archivo, desde):
+    """Eventos del registro a partir de la posición desde (solo líneas completas), rechazados y posición final"""
+    try:
+        with open(archivo, 'rb') as f:
+            f.seek(desde)
+            contenido = f.read()
+    except FileNotFoundError:
+        return [], [], desde
+    
+    # Una línea a medio escribir queda para la próxima lectura
+    completo = contenido.rfind(b'\n') + 1
+    eventos, rechazados = [], []
+    for linea in contenido[:completo].splitlines():
+        if not linea.strip():
+            continue
+        try:
+            evento = json.loads(linea)
+            if not isinstance(evento, dict):
+                raise ValueError("el evento no es un objeto")
+            eventos.append(evento)
+        except ValueError:
+            rechazados.append({'evento': linea.decode('utf-8', 'replace'), 'motivo': 'JSON inválido'})
+    return eventos, rechazados, desde + completo
+
+def registrar_eventos(proyecto_id, eventos, huella):
+    """Agregar eventos al registro del proyecto, marcados con la huella del archivo de datos vigente
+    
+    Al llegar un archivo nuevo, los eventos marcados con otra huella dejan de aplicarse:
+    el archivo ya trae el estado actualizado y no debe pisarse con eventos viejos.
+    """
+    os.makedirs(EVENTOS_DIR, exist_ok=True)
+    lineas = ''.join(json.dumps(dict(evento, huella=huella[:16]), ensure_ascii=False, default=str) + '\n'
+                     for evento in eventos)
+    # Un solo write en modo append: las líneas de distintos workers no se mezclan
+    with lock_eventos, open(archivo_eventos(proyecto_id), 'a', encoding='utf-8') as f:
+        f.write(lineas)
+
+def medidas_filas(df, filas):
+    """Aporte de cada fila a las medidas del cubo: cantidad, y suma y conteo de cada columna de métricas"""
+    medidas = {'cantidad': np.ones(len(filas), dtype=np.int64)}
+    for columna in COLUMNAS_METRICAS.values():
+        if columna in df.columns:
+            valores = df[columna].to_numpy(dtype=float)[filas]
+            medidas[f'suma {columna}'] = np.nan_to_num(valores)
+            medidas[f'conteo {columna}'] = (~np.isnan(valores)).astype(np.int64)
+    return medidas
+
+def concatenar_indices(indice, indice_nuevas):
+    """Índice de máscaras con filas agregadas al final: cada máscara se extiende con la de las nuevas"""
+    n_viejas, n_nuevas = len(indice['todos']), len(indice_nuevas['todos'])
+    resultado = {}
+    for clave, viejas in indice.items():
+        nuevas = indice_nuevas[clave]
+        if isinstance(viejas, dict):
+            resultado[clave] = {
+                valor: np.concatenate([viejas.get(valor, np.zeros(n_viejas, dtype=bool)),
+                                       nuevas.get(valor, np.zeros(n_nuevas, dtype=bool))])
+                for valor in list(viejas) + [valor for valor in nuevas if valor not in viejas]
+            }
+        else:
+            resultado[clave] = np.concatenate([viejas, nuevas])
+    return resultado
+
+def cambios_por_fila(datos, eventos):
+    """Validar los eventos y juntarlos por departamento (el último valor de cada campo gana)
+    
+    Fechas y precios de todos los eventos se convierten en bloque.
+    """
+    tabla = pd.DataFrame(eventos, columns=['piso', 'tipo', 'estado', 'fecha', 'precio'])
+    fechas, _ = parsear_fechas(tabla['fecha'].astype(object))
+    precios, precio_invalido = convertir_decimal(tabla['precio'], ESQUEMA_COLUMNAS['PRECIO'])
+    filas_por_unidad = datos.filas_por_unidad()
+    
+    cambios = {}
+    rechazados = []
+    for posicion, evento in enumerate(eventos):
+        try:
+            fila = filas_por_unidad.get((int(evento['piso']), int(evento['tipo'])))
+        except (KeyError, TypeError, ValueError):
+            rechazados.append({'evento': evento, 'motivo': 'falta piso o tipo'})
+            continue
+        if fila is None:
+            motivo = 'departamento desconocido'
+        elif precio_invalido.iloc[posicion]:
+            motivo = 'precio inválido'
+        elif evento.get('fecha') is not None and pd.isna(fechas.iloc[posicion]):
+            motivo = 'fecha inválida'
+        else:
+            motivo = None
+        if motivo:
+            rechazados.append({'evento': evento, 'motivo': motivo})
+            continue
+        
+        cambio = cambios.setdefault(fila, {})
+        if evento.get('estado') is not None:
+            cambio['ESTADO'] = str(evento['estado']).strip()
+        if 'fecha' in evento:
+            # "fecha": null deja al departamento sin fecha de venta
+            cambio['FECHA'] = fechas.iloc[posicion]
+        if not pd.isna(precios.iloc[posicion]):
+            cambio['PRECIO'] = float(precios.iloc[posicion])
+    return cambios, rechazados
+
+def aplicar_eventos(datos, eventos):
+    """ConjuntoDatos nuevo con los eventos aplicados como deltas sobre datos
+    
+    Solo se copian y actualizan las columnas, máscaras, celdas del cubo, colores y textos
+    que tocan los departamentos afectados; todo lo demás se comparte con datos.
+    Devuelve el conjunto nuevo (el mismo datos si no hay cambios válidos) y los rechazados.
+    """
+    cambios, rechazados = cambios_por_fila(datos, eventos)
+    if not cambios:
+        return datos, rechazados
+    df = datos.df
+    n = len(df)
+    filas = np.array(sorted(cambios))
+    claves_viejas = tuplas_clave(claves_cubo(df.iloc[filas]))
+    
+    # Tabla de departamentos: copias solo de las columnas que cambian
+    columnas = {}
+    if any('ESTADO' in cambio for cambio in cambios.values()):
+        estados = df['ESTADO'].cat.categories
+        nuevos = sorted({cambio['ESTADO'] for cambio in cambios.values() if 'ESTADO' in cambio} - set(estados))
+        estados = estados.append(pd.Index(nuevos, dtype=object)) if nuevos else estados
+        codigos = df['ESTADO'].cat.codes.to_numpy().copy()
+        for fila, cambio in cambios.items():
+            if 'ESTADO' in cambio:
+                codigos[fila] = estados.get_loc(cambio['ESTADO'])
+        columnas['ESTADO'] = pd.Categorical.from_codes(codigos, categories=estados)
+    if any('FECHA' in cambio for cambio in cambios.values()):
+        fecha = df['FECHA'].to_numpy().copy() if 'FECHA' in df.columns else np.full(n, np.datetime64('NaT', 'ns'))
+        año = df['AÑO'].to_numpy().copy() if 'AÑO' in df.columns else np.zeros(n, dtype=np.int16)
+        mes = df['MES'].to_numpy().copy() if 'MES' in df.columns else np.zeros(n, dtype=np.int8)
+        for fila, cambio in cambios.items():
+            if 'FECHA' in cambio:
+                nueva = cambio['FECHA']
+                fecha[fila] = np.datetime64('NaT', 'ns') if pd.isna(nueva) else nueva.to_datetime64()
+                año[fila], mes[fila] = (0, 0) if pd.isna(nueva) else (nueva.year, nueva.month)
+        columnas.update({'FECHA': fecha, 'AÑO': año, 'MES': mes})
+    if any('PRECIO' in cambio for cambio in cambios.values()):
+        precio = df['PRECIO'].to_numpy(dtype=float).copy() if 'PRECIO' in df.columns else np.full(n, np.nan)
+        uf_m2 = df['UF/M2'].to_numpy(dtype=float).copy() if 'UF/M2' in df.columns else np.full(n, np.nan)
+        m2 = df['M2'].to_numpy(dtype=float) if 'M2' in df.columns else np.full(n, np.nan)
+        for fila, cambio in cambios.items():
+            if 'PRECIO' in cambio:
+                precio[fila] = cambio['PRECIO']
+                uf_m2[fila] = cambio['PRECIO'] / m2[fila] if m2[fila] > 0 else np.nan
+        columnas.update({'PRECIO': precio, 'UF/M2': uf_m2})
+    # copy=False: las columnas sin cambios siguen siendo las mismas (mapeadas en memoria)
+    df_nuevo = pd.DataFrame({columna: columnas[columna] if columna in columnas else df[columna].array
+                             for columna in list(df.columns) + [c for c in columnas if c not in df.columns]},
+                            copy=False)
+    
+    # Índice de departamentos: solo las máscaras de estado afectadas y la de vendidos
+    indice = dict(datos.indice)
+    if 'ESTADO' in columnas:
+        mascaras = dict(indice['ESTADO'])
+        copiadas = set()
+        estados_viejos = df['ESTADO'].to_numpy()
+        for fila, cambio in cambios.items():
+            if 'ESTADO' not in cambio:
+                continue
+            for estado, valor in ((estados_viejos[fila], False), (cambio['ESTADO'], True)):
+                if pd.isna(estado):
+                    continue
+                if estado not in copiadas:
+                    mascaras[estado] = mascaras.get(estado, indice['ninguno']).copy()
+                    copiadas.add(estado)
+                mascaras[estado][fila] = valor
+        indice['ESTADO'] = mascaras
+    if 'FECHA' in columnas:
+        indice['vendidos'] = indice['vendidos'].copy()
+        indice['vendidos'][filas] = ~np.isnat(columnas['FECHA'][filas])
+    
+    # Geometría: colores y hover de los cubos de los departamentos afectados
+    geometria = dict(datos.geometria)
+    cubos = geometria['cubo_de_fila'][filas]
+    ubicadas = cubos >= 0
+    if ubicadas.any():
+        afectados = df_nuevo.iloc[filas[ubicadas]]
+        geometria['colores'] = geometria['colores'].copy()
+        geometria['colores'][cubos[ubicadas]] = (afectados['ESTADO'].astype(str).str.strip()
+                                                 .map(COLORES_ESTADOS).fillna('#CCCCCC').to_numpy())
+        geometria['hover'] = geometria['hover'].copy()
+        geometria['hover'][cubos[ubicadas]] = datos_hover(afectados, datos.layout['orientaciones'])
+    
+    # Cubo: restar cada departamento de su celda anterior y sumarlo en la nueva
+    cubo = datos.cubo
+    claves_nuevas_filas = claves_cubo(df_nuevo.iloc[filas])
+    nombres_clave = [serie.name for serie in claves_nuevas_filas]
+    celdas = dict(datos.celdas_por_clave())
+    origen = [celdas[clave] for clave in claves_viejas]
+    agregadas = []
+    destino = []
+    for clave in tuplas_clave(claves_nuevas_filas):
+        if clave not in celdas:
+            celdas[clave] = len(cubo) + len(agregadas)
+            agregadas.append(clave)
+        destino.append(celdas[clave])
+    
+    columnas_cubo = {}
+    for posicion, nombre in enumerate(nombres_clave):
+        valores = [clave[posicion] for clave in agregadas]
+        if isinstance(cubo[nombre].dtype, pd.CategoricalDtype):
+            categorias = df_nuevo[nombre].cat.categories
+            columnas_cubo[nombre] = pd.concat([cubo[nombre].cat.set_categories(categorias),
+                                               pd.Series(pd.Categorical(valores, categories=categorias))],
+                                              ignore_index=True)
+        else:
+            columnas_cubo[nombre] = pd.concat([cubo[nombre], pd.Series(valores, dtype=cubo[nombre].dtype)],
+                                              ignore_index=True)
+    medidas_viejas = medidas_filas(df, filas)
+    medidas_nuevas = medidas_filas(df_nuevo, filas)
+    for nombre, aporte in medidas_nuevas.items():
+        valores = np.concatenate([cubo[nombre].to_numpy(), np.zeros(len(agregadas), dtype=cubo[nombre].dtype)])
+        np.subtract.at(valores, origen, medidas_viejas[nombre])
+        np.add.at(valores, destino, aporte)
+        columnas_cubo[nombre] = valores
+    cubo_nuevo = pd.DataFrame(columnas_cubo)[list(cubo.columns)]
+    
+    indice_cubo = datos.indice_cubo
+    if agregadas:
+        indice_cubo = concatenar_indices(indice_cubo, construir_indice_cubo(
+            cubo_nuevo.iloc[len(cubo):].reset_index(drop=True), datos.layout['orientaciones_tipos']))
+    
+    nuevo = copy.copy(datos)
+    nuevo.df = df_nuevo
+    nuevo.indice = indice
+    nuevo.geometria = geometria
+    nuevo.cubo = cubo_nuevo
+    nuevo.indice_cubo = indice_cubo
+    nuevo._celdas = celdas
+    return nuevo, rechazados
+
+def actualizar_con_eventos(datos):
+    """datos con los eventos de su registro que todavía no tiene (el mismo si no hay nuevos) y los rechazados
+    
+    Se lee desde datos.eventos_leidos: al cargar un proyecto es el registro completo, también
+    los eventos de archivos anteriores que se descartan por su huella.
+    """
+    if not EVENTOS_DIR:
+        return datos, []
+    inicio = time.perf_counter()
+    eventos, rechazados, hasta = leer_eventos(archivo_eventos(datos.proyecto), datos.eventos_leidos)
+    if hasta == datos.eventos_leidos:
+        return datos, rechazados
+    
+    # Solo los registrados contra este mismo archivo (los de versiones anteriores sin marca se aplican)
+    huella = datos.huella[:16]
+    vigentes = [evento for evento in eventos if evento.get('huella', huella) == huella]
+    omitidos = len(eventos) - len(vigentes)
+    nuevo, rechazados_aplicar = aplicar_eventos(datos, vigentes) if vigentes else (datos, [])
+    rechazados += rechazados_aplicar
+    nuevo = copy.copy(nuevo) if nuevo is datos else nuevo
+    # La versión depende solo de cuánto del registro se aplicó: igual en todos los workers
+    nuevo.eventos_leidos = hasta
+    nuevo.version = f"{datos.version_base}-e{hasta}"
+    if log.isEnabledFor(logging.INFO):
+        detalle = ((f", {len(rechazados)} rechazados" if rechazados else "")
+                   + (f", {omitidos} de un archivo de datos anterior omitidos" if omitidos else ""))
+        log.info("📝 Eventos aplicados a %s: %d%s en %.0f ms", datos.nombre, len(vigentes) - len(rechazados_aplicar),
+                 detalle, (time.perf_counter() - inicio) * 1000)
+    for rechazado in rechazados:
+        log.warning(f"⚠️ Evento rechazado ({rechazado['motivo']}): {rechazado['evento']}")
+    return nuevo, rechazados
+
+def aplicar_eventos_pendientes(proyecto_id):
+    """Aplicar al proyecto en memoria los eventos nuevos de su registro
+    
+    Devuelve (versión, rechazados), o None si el proyecto no está en memoria (al cargarlo
+    se aplica el registro completo).
+    """
+    with lock_recarga:
+        datos = registro.cargado(proyecto_id)
+        if datos is None:
+            return None
+        try:
+            tamano = os.path.getsize(archivo_eventos(proyecto_id))
+        except OSError:
+            tamano = 0
+        truncado = tamano < datos.eventos_leidos
+        if not truncado:
+            nuevo, rechazados = actualizar_con_eventos(datos)
+            if nuevo is not datos:
+                registro.guardar(nuevo)
+            return nuevo.version, rechazados
+    
+    # El registro se truncó o se reemplazó: volver a partir del archivo de datos
+    recargar_datos(proyecto_id, forzar=True)
+    datos = registro.cargado(proyecto_id)
+    return (datos.version if datos else None), []
+
+def vigilar_archivos(intervalo):
+    """Recargar en segundo plano los proyectos en memoria cuyo archivo cambió de fecha de modificación
+    
+    También aplica los eventos que otros workers agregaron al registro de cada proyecto.
+    """
+    vistas = {}
+    while True:
+        time.sleep(intervalo)
+        for datos in registro.cargados():
+            # Un archivo a medio escribir o roto no puede matar el hilo: se registra y se
+            # vuelve a intentar en la próxima vuelta (la fecha vista ya quedó anotada)
+            try:
+                vigilar_proyecto(datos, vistas)
+            except Exception:
+                log.exception(f"❌ Error vigilando {datos.nombre}, se reintenta en {intervalo:g} s")
+
+def vigilar_proyecto(datos, vistas):
+    """Recargar el proyecto si cambió su archivo, o aplicar sus eventos nuevos"""
+    try:
+        modificacion = os.path.getmtime(datos.archivo)
+    except OSError:
+        modificacion = None
+    if modificacion is not None and modificacion != vistas.get(datos.proyecto, datos.modificacion):
+        vistas[datos.proyecto] = modificacion
+        recargar_datos(datos.proyecto)
+    elif EVENTOS_DIR:
+        try:
+            tamano = os.path.getsize(archivo_eventos(datos.proyecto))
+        except OSError:
+            tamano = 0
+        if tamano != datos.eventos_leidos:
+            aplicar_eventos_pendientes(datos.proyecto)
+
+# Crear la aplicación Dash
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+
+# IMPORTANTE: Para deploy
+server = app.server
+
+# Modo cliente: los filtros del gráfico y las métricas se resuelven en el navegador
+MODO_CLIENTE = os.environ.get('MODO_CLIENTE', '0') == '1'
+
+ARCHIVO_DATOS = os.environ.get('ARCHIVO_DATOS', 'Datos.xlsx')
+
+# Proyectos: lista JSON de {"id", "nombre", "archivo", "layout"}, donde layout es opcional y
+# reemplaza posiciones, escalera, orientaciones u orientaciones_tipos del layout predeterminado.
+# Sin el archivo hay un solo proyecto, con ARCHIVO_DATOS.
+PROYECTOS_ARCHIVO = os.environ.get('PROYECTOS_ARCHIVO', 'proyectos.json')
+
+def leer_proyectos(ruta):
+    """Proyectos definidos en el archivo JSON, o solo el proyecto principal si no existe"""
+    if not os.path.exists(ruta):
+        return [{'id': 'principal', 'nombre': os.environ.get('PROYECTO_NOMBRE', 'San Miguel Etapa 2'),
+                 'archivo': ARCHIVO_DATOS, 'layout': LAYOUT_PREDETERMINADO}]
+    with open(ruta, encoding='utf-8') as f:
+        definiciones = json.load(f)
+    return [{'id': str(definicion['id']),
+             'nombre': definicion.get('nombre', str(definicion['id'])),
+             'archivo': definicion['archivo'],
+             'layout': layout_proyecto(definicion.get('layout'))}
+            for definicion in definiciones]
+
+# Carpeta de la caché columnar del Excel ya procesado ('' la desactiva)
+CACHE_DATOS_DIR = os.environ.get('CACHE_DATOS_DIR', '.cache_datos')
+
+# Carpeta de los registros de eventos de venta, uno por proyecto ('' los desactiva)
+EVENTOS_DIR = os.environ.get('EVENTOS_DIR', 'eventos')
+lock_eventos = threading.Lock()
+
+# Caché de resultados; la clave incluye la versión de los datos. Compartida por todos los
+# proyectos y propia de cada worker: el límite en MB acota cuánto crece cada proceso.
+cache_resultados = CacheResultados(
+    tamano_maximo=int(os.environ.get('CACHE_TAMANO', 512)),
+    ttl_segundos=float(os.environ.get('CACHE_TTL_SEGUNDOS', 600)),
+    memoria_maxima=float(os.environ.get('CACHE_MEMORIA_MB', 256)) * 1024 * 1024
+)
+
+# Historial de versiones de cada proyecto ('' lo desactiva)
+HISTORIAL_DIR = os.environ.get('HISTORIAL_DIR', 'historial')
+historial = HistorialProyectos(
+    HISTORIAL_DIR,
+    cache_resultados,
+    cada_completa=int(os.environ.get('HISTORIAL_CADA_COMPLETA', 20)),
+    maximo_cargados=int(os.environ.get('HISTORIAL_MAXIMO_CARGADOS', 4)),
+    maximo_instantaneas=int(os.environ.get('HISTORIAL_MAXIMO_INSTANTANEAS', 500))
+) if HISTORIAL_DIR else None
+
+# Las instantáneas del historial las escribe un hilo por proceso, en el orden de las versiones:
+# guardarlas y podar el historial no se suma al request que cargó o recargó el proyecto
+pid_historial = None
+cola_historial = None
+
+def registrar_en_segundo_plano(datos):
+    """Guardar la instantánea de datos en el hilo del historial
+    
+    Antes de iniciar_historial (en el maestro de gunicorn --preload, que no puede dejar hilos
+    antes del fork) se guarda en el momento: ahí solo pasa al cargar los datos al arrancar.
+    """
+    if historial is None:
+        return
+    if pid_historial != os.getpid():
+        historial.registrar(datos)
+        return
+    cola_historial.put(datos)
+
+def iniciar_historial():
+    """Iniciar el hilo que guarda las instantáneas del historial, uno por proceso"""
+    global pid_historial, cola_historial
+    if historial is None or pid_historial == os.getpid():
+        return
+    cola = queue.Queue()
+    
+    def guardar_instantaneas():
+        while True:
+            datos = cola.get()
+            try:
+                historial.registrar(datos)
+            except Exception:
+                log.exception(f"❌ Error guardando la instantánea {datos.version}")
+            finally:
+                cola.task_done()
+    
+    threading.Thread(target=guardar_instantaneas, daemon=True, name='historial').start()
+    cola_historial, pid_historial = cola, os.getpid()
+
+# Presets que se precalculan en segundo plano para cada versión de datos ('' lo desactiva):
+# los de pisos (todos, altos, bajos) y las orientaciones (norte, oriente, sur, poniente)
+PRECALENTAR_PRESETS = [preset.strip() for preset in
+                       os.environ.get('PRECALENTAR_PRESETS', 'todos,altos,bajos,norte,oriente,sur,poniente').split(',')
+                       if preset.strip()]
+pid_precalentamiento = None
+
+def precalentar_en_segundo_plano(*conjuntos):
+    """Precalentar los presets de esos datos en un hilo, si el precalentamiento ya empezó en este proceso"""
+    if not PRECALENTAR_PRESETS or pid_precalentamiento != os.getpid():
+        return
+    
+    def precalentar_todos():
+        for datos in conjuntos:
+            precalentar(datos, PRECALENTAR_PRESETS)
+    
+    threading.Thread(target=precalentar_todos, daemon=True, name='precalentar').start()
+
+def iniciar_precalentamiento():
+    """Precalentar los proyectos ya cargados y, desde ahora, cada versión nueva; uno por proceso"""
+    global pid_precalentamiento
+    if pid_precalentamiento == os.getpid():
+        return
+    pid_precalentamiento = os.getpid()
+    precalentar_en_segundo_plano(*registro.cargados())
+
+# Registro de proyectos: los datos se cargan al primer uso y se expulsan los menos usados.
+# Los callbacks piden sus datos una vez al empezar, así una recarga a mitad de un
+# request no mezcla datos viejos con nuevos.
+registro = RegistroProyectos(
+    leer_proyectos(PROYECTOS_ARCHIVO),
+    cache_resultados,
+    memoria_maxima=float(os.environ.get('PROYECTOS_MEMORIA_MB', 1024)) * 1024 * 1024,
+    maximo_cargados=int(os.environ.get('PROYECTOS_MAXIMO_CARGADOS', 16)),
+    registrar=registrar_en_segundo_plano,
+    precalentar=precalentar_en_segundo_plano
+)
+lock_recarga = threading.Lock()
+
+# Los procesos del pool de preprocesamiento importan este módulo solo por las funciones de carga
+# (el nombre ya está puesto cuando spawn vuelve a importar el módulo principal)
+EN_PROCESO_HIJO = multiprocessing.current_process().name != 'MainProcess'
+
+# Proyectos que se cargan al iniciar (con gunicorn --preload, compartidos por los workers);
+# por defecto solo el principal
+PROYECTOS_PRECARGA = [] if EN_PROCESO_HIJO else [
+    proyecto_id.strip() for proyecto_id in os.environ.get('PROYECTOS_PRECARGA', registro.principal).split(',')
+    if proyecto_id.strip()
+]
+if PROYECTOS_PRECARGA:
+    log.info("🔄 Cargando datos...")
+for proyecto_id in PROYECTOS_PRECARGA:
+    registro.obtener(proyecto_id)
+
+# Recarga automática cuando cambia el archivo (0 la desactiva)
+INTERVALO_RECARGA = float(os.environ.get('RECARGA_INTERVALO_SEGUNDOS', 30))
+pid_vigilancia = None
+
+def iniciar_vigilancia():
+    """Iniciar el hilo que vigila los archivos de datos, uno por proceso"""
+    global pid_vigilancia
+    if INTERVALO_RECARGA <= 0 or pid_vigilancia == os.getpid():
+        return
+    pid_vigilancia = os.getpid()
+    threading.Thread(target=vigilar_archivos, args=(INTERVALO_RECARGA,), daemon=True, name='vigilar-datos').start()
+
+# Con gunicorn --preload este módulo se importa en el proceso maestro y los hilos no
+# sobreviven al fork: gunicorn.conf.py inicia la vigilancia y el historial en cada worker (post_fork)
+if os.environ.get('DASHBOARD_PRECARGA') != '1' and not EN_PROCESO_HIJO:
+    iniciar_vigilancia()
+    iniciar_historial()
+
+@server.before_request
+def marcar_inicio_request():
+    g.inicio_request = time.perf_counter()
+
+@server.after_request
+def medir_request(respuesta):
+    """Tiempo total de cada _dash-update-component; lo que no es callback es (de)serialización"""
+    inicio = g.get('inicio_request')
+    if inicio is not None and request.path.endswith('/_dash-update-component'):
+        segundos = time.perf_counter() - inicio
+        callback = g.get('callback', 'ninguno')
+        latencias.observar('dashboard_request_segundos', (('callback', callback),), segundos)
+        latencias.observar('dashboard_etapa_segundos', (('callback', callback), ('etapa', 'serializacion')),
+                           max(segundos - g.get('segundos_callback', 0.0), 0.0))
+    return respuesta
+
+@server.route('/metrics')
+def metricas_prometheus():
+    """Histogramas de latencia y contadores de caché y proyectos, en formato de texto de Prometheus
+    
+    Cada worker de gunicorn tiene sus propios valores; la etiqueta proceso los distingue.
+    """
+    proceso = (('proceso', os.getpid()),)
+    etiqueta = f'{{proceso="{os.getpid()}"}}'
+    lineas = latencias.texto(proceso)
+    cache = cache_resultados.estadisticas()
+    proyectos = registro.estadisticas()
+    for nombre, tipo, ayuda, valor in [
+        ('dashboard_cache_aciertos_total', 'counter', 'Aciertos de la caché de resultados', cache['aciertos']),
+        ('dashboard_cache_fallos_total', 'counter', 'Fallos de la caché de resultados', cache['fallos']),
+        ('dashboard_cache_expulsiones_total', 'counter', 'Entradas expulsadas de la caché de resultados', cache['expulsiones']),
+        ('dashboard_cache_entradas', 'gauge', 'Entradas en la caché de resultados', cache['entradas']),
+        ('dashboard_cache_memoria_bytes', 'gauge', 'Bytes estimados de la caché de resultados', cache['memoria_bytes']),
+        ('dashboard_proyectos_cargados', 'gauge', 'Proyectos en memoria', len(proyectos['cargados'])),
+        ('dashboard_proyectos_memoria_bytes', 'gauge', 'Memoria de los proyectos cargados', proyectos['memoria']),
+        ('dashboard_proyectos_cargas_total', 'counter', 'Cargas de proyectos', proyectos['cargas']),
+        ('dashboard_proyectos_expulsiones_total', 'counter', 'Proyectos sacados de memoria', proyectos['expulsiones']),
+    ]:
+        lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}", f"{nombre}{etiqueta} {valor}"]
+    return Response('\n'.join(lineas) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def requiere_admin(vista):
+    """Decorador de las rutas /admin: 403 sin ADMIN_TOKEN configurado o si X-Admin-Token no coincide"""
+    @functools.wraps(vista)
+    def protegida(*args, **kwargs):
+        token = os.environ.get('ADMIN_TOKEN')
+        enviado = request.headers.get('X-Admin-Token', '')
+        # Comparación en tiempo constante: no revela cuántos caracteres coinciden
+        if not token or not hmac.compare_digest(enviado.encode('utf-8'), token.encode('utf-8')):
+            abort(403)
+        return vista(*args, **kwargs)
+    return protegida
+
+@server.route('/admin/recargar', methods=['POST'])
+@requiere_admin
+def admin_recargar():
+    """Recarga manual de un proyecto (?proyecto=id) o de todos los que están en memoria
     
-    escalera_pos = (1, 1)
+    Responde de inmediato y procesa los archivos en segundo plano.
+    """
+    proyecto_id = request.args.get('proyecto')
+    if proyecto_id is not None and proyecto_id not in registro.proyectos:
+        abort(404)
+    proyectos = [proyecto_id] if proyecto_id else [datos.proyecto for datos in registro.cargados()]
     
-    fig = go.Figure()
+    def recargar():
+        for identificador in proyectos:
+            recargar_datos(identificador, forzar=True)
     
-    # Crear cubos para cada departamento
-    for _, depto in df_filtrado.iterrows():
-        tipo = int(depto['TIPO'])
-        if tipo not in posiciones:
-            continue
-            
-        x, y = posiciones[tipo]
-        z = depto['PISO']
-        
-        # Normalizar el estado para asegurar coincidencia exacta
-        estado_normalizado = str(depto['ESTADO']).strip()
-        color = colores_estados.get(estado_normalizado, '#CCCCCC')
-        
-        # Debug: verificar que el estado se esté leyendo correctamente
-        if estado_normalizado not in colores_estados:
-            print(f"⚠️ Estado desconocido: '{estado_normalizado}' - usando color gris por defecto")
-        
-        precio = depto.get('PRECIO', 0)
-        superficie = depto.get('M2', 0)
-        uf_m2 = depto.get('UF/M2', 0)
-        tipologia = depto.get('TIPOLOGIA', 'N/A')
-        
-        # Información de fecha si está disponible
-        fecha_info = ""
-        if 'FECHA' in depto.index and pd.notna(depto['FECHA']):
-            fecha_info = f"<span style='color:#0C0404;'><b>Fecha:</b></span> <b>{depto['FECHA'].strftime('%d/%m/%Y')}</b><br>"
-        
-        # Mapeo de orientaciones
-        orientaciones = {
-            1: 'Poniente',
-            2: 'Poniente-Norte', 
-            3: 'Norte',
-            4: 'Norte-Oriente',
-            5: 'Oriente',
-            6: 'Oriente-Sur',
-            7: 'Sur',
-            8: 'Sur-Poniente'
-        }
-        
-        orientacion = orientaciones.get(tipo, 'N/A')
-        
-        hover_text = f"""<b style='color:#0C0404; font-size:14px;'>🏢 Tipo {tipo} - Piso {z}</b><br>
-        <span style='color:#0C0404;'><b>Estado:</b></span> <b>{estado_normalizado}</b><br>
-        <span style='color:#0C0404;'><b>Precio:</b></span> <b>UF {precio:,.0f}</b><br>
-        <span style='color:#0C0404;'><b>Superficie:</b></span> <b>{superficie} m²</b><br>
-        <span style='color:#0C0404;'><b>UF/m²:</b></span> <b>{uf_m2:.2f}</b><br>
-        <span style='color:#0C0404;'><b>Tipología:</b></span> <b>{tipologia}</b><br>
-        <span style='color:#0C0404;'><b>Orientación:</b></span> <b>{orientacion}</b><br>
-        {fecha_info}"""
-        
-        # Cubo del departamento
-        fig.add_trace(go.Mesh3d(
-            x=[x, x+1, x+1, x, x, x+1, x+1, x],
-            y=[y, y, y+1, y+1, y, y, y+1, y+1],
-            z=[z, z, z, z, z+1, z+1, z+1, z+1],
-            i=[7, 0, 0, 0, 4, 4, 6, 1, 4, 0, 3, 6],
-            j=[3, 4, 1, 2, 5, 6, 5, 2, 0, 1, 6, 3],
-            k=[0, 7, 2, 3, 6, 7, 1, 6, 5, 5, 7, 7],
-            color=color,
-            opacity=1.0,
-            hovertemplate=hover_text + "<extra></extra>",
-            showscale=False
-        ))
-        
-        # Bordes del cubo
-        edges_x = [x, x+1, x+1, x, x, x, x+1, x+1, x+1, x+1, x, x, x, x+1, x+1, x]
-        edges_y = [y, y, y+1, y+1, y, y, y, y, y+1, y+1, y+1, y+1, y, y, y+1, y+1]
-        edges_z = [z, z, z, z, z, z+1, z+1, z+1, z+1, z, z, z+1, z+1, z+1, z+1, z]
-        
-        fig.add_trace(go.Scatter3d(
-            x=edges_x, y=edges_y, z=edges_z,
-            mode='lines',
-            line=dict(color='black', width=1),
-            showlegend=False,
-            hoverinfo='skip'
-        ))
-    
-    # Escaleras (centro del edificio)
-    pisos_filtrados = df_filtrado['PISO'].unique() if len(df_filtrado) > 0 else []
-    for piso in pisos_filtrados:
-        x_esc, y_esc = escalera_pos
-        
-        fig.add_trace(go.Mesh3d(
-            x=[x_esc, x_esc+1, x_esc+1, x_esc, x_esc, x_esc+1, x_esc+1, x_esc],
-            y=[y_esc, y_esc, y_esc+1, y_esc+1, y_esc, y_esc, y_esc+1, y_esc+1],
-            z=[piso, piso, piso, piso, piso+1, piso+1, piso+1, piso+1],
-            i=[7, 0, 0, 0, 4, 4, 6, 1, 4, 0, 3, 6],
-            j=[3, 4, 1, 2, 5, 6, 5, 2, 0, 1, 6, 3],
-            k=[0, 7, 2, 3, 6, 7, 1, 6, 5, 5, 7, 7],
-            color='#E9ECEF',
-            opacity=1.0,
-            hovertemplate=f"<b style='color:#2C3E50;'>🚶‍♂️ ESCALERAS</b><br>Piso {piso}<extra></extra>",
-            showscale=False
-        ))
+    threading.Thread(target=recargar, daemon=True, name='recargar-datos').start()
+    versiones = {identificador: getattr(registro.cargado(identificador), 'version', None) for identificador in proyectos}
+    return jsonify({'estado': 'recargando', 'versiones_actuales': versiones}), 202
+
+@server.route('/admin/eventos', methods=['POST'])
+@requiere_admin
+def admin_eventos():
+    """Registrar eventos de venta de un proyecto (?proyecto=id) y aplicarlos de inmediato
     
-    fig.update_layout(
-        scene=dict(
-            xaxis=dict(showticklabels=False, title='', showgrid=False, range=[0, 3]),
-            yaxis=dict(showticklabels=False, title='', showgrid=False, range=[0, 3]),
-            zaxis=dict(showticklabels=False, title='', showgrid=False, 
-                      range=[1.5, max(df_filtrado['PISO']) + 1] if len(df_filtrado) > 0 else [1.5, 16]),
-            camera=dict(eye=dict(x=1.5, y=1.5, z=1.2)),
-            aspectmode='manual',
-            aspectratio=dict(x=1, y=1, z=3),
-            bgcolor='#F8F9FA'
-        ),
-        showlegend=False,
-        height=600,
-        margin=dict(l=0, r=0, t=0, b=0),
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)'
-    )
+    El cuerpo es un evento o una lista: {"piso", "tipo"} identifican el departamento y
+    "estado", "fecha" y "precio" son opcionales ("fecha": null lo deja sin fecha de venta).
+    Los demás workers los toman del registro al vigilarlo.
+    """
+    proyecto_id = request.args.get('proyecto') or registro.principal
+    if proyecto_id not in registro.proyectos or not EVENTOS_DIR:
+        abort(404)
+    eventos = request.get_json(silent=True)
+    eventos = [eventos] if isinstance(eventos, dict) else eventos
+    if not isinstance(eventos, list) or not eventos or not all(isinstance(evento, dict) for evento in eventos):
+        abort(400)
     
-    return fig
+    # La huella de los datos que se están mostrando, o la del archivo si el proyecto no está en memoria
+    actual = registro.cargado(proyecto_id)
+    huella = actual.huella if actual is not None else leer_archivo(registro.proyectos[proyecto_id]['archivo'])[1]
+    if huella is None:
+        abort(503)
+    registrar_eventos(proyecto_id, eventos, huella)
+    resultado = aplicar_eventos_pendientes(proyecto_id)
+    if resultado is None:
+        return jsonify({'estado': 'registrado', 'eventos': len(eventos)}), 202
+    version, rechazados = resultado
+    return jsonify({'estado': 'aplicado', 'eventos': len(eventos), 'version': version,
+                    'rechazados': rechazados}), 200
 
-# Crear la aplicación Dash
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+@server.route('/admin/historial')
+@requiere_admin
+def admin_historial():
+    """Versiones registradas de un proyecto (?proyecto=id), de la más antigua a la más nueva"""
+    proyecto_id = request.args.get('proyecto') or registro.principal
+    if proyecto_id not in registro.proyectos or historial is None:
+        abort(404)
+    return jsonify([{'momento': momento, 'version': version}
+                    for momento, version, _ in historial.instantaneas(proyecto_id)])
 
-# IMPORTANTE: Para deploy
-server = app.server
+@server.route('/admin/historial/diferencias')
+@requiere_admin
+def admin_historial_diferencias():
+    """Departamentos que cambiaron entre dos fechas (?proyecto=id&desde=AAAA-MM-DD&hasta=AAAA-MM-DD)
+    
+    Sin hasta se compara con la última versión registrada; una fecha anterior al historial
+    cuenta como su primera versión.
+    """
+    proyecto_id = request.args.get('proyecto') or registro.principal
+    if proyecto_id not in registro.proyectos or historial is None:
+        abort(404)
+    desde = momento_de_fecha(request.args.get('desde'))
+    hasta = momento_de_fecha(request.args.get('hasta')) if request.args.get('hasta') else '99999999'
+    if desde is None or hasta is None:
+        abort(400)
+    versiones = [historial.version_en(proyecto_id, desde), historial.version_en(proyecto_id, hasta)]
+    if None in versiones:
+        abort(404)
+    
+    antes, _ = historial.tabla(proyecto_id, versiones[0])
+    despues, _ = historial.tabla(proyecto_id, versiones[1])
+    if antes is None or despues is None:
+        abort(404)
+    diferencias = diferencias_unidades(antes, despues)
+    transiciones = diferencias.groupby(['ESTADO antes', 'ESTADO después'], dropna=False).size() \
+        if 'ESTADO antes' in diferencias.columns else pd.Series(dtype=int)
+    return jsonify({
+        'desde': versiones[0],
+        'hasta': versiones[1],
+        'cambios': diferencias['cambio'].value_counts().to_dict(),
+        'estados': [{'antes': None if pd.isna(antes_estado) else antes_estado,
+                     'despues': None if pd.isna(despues_estado) else despues_estado, 'cantidad': int(cantidad)}
+                    for (antes_estado, despues_estado), cantidad in transiciones.items()],
+        'departamentos': json.loads(diferencias.to_json(orient='records', date_format='iso', force_ascii=False))
+    })
 
-# Cargar datos globalmente
-print("🔄 Cargando datos...")
-df_global = cargar_datos("Datos.xlsx")
+# Preprocesamiento en curso y reporte del último
+lock_preprocesamiento = threading.Lock()
+ultimo_preprocesamiento = None
+
+@server.route('/admin/preprocesar', methods=['GET', 'POST'])
+@requiere_admin
+def admin_preprocesar():
+    """POST: preprocesar en paralelo las planillas de los proyectos (todos, o {"proyectos": [...]}).
+    
+    El pool de procesos corre en segundo plano; GET devuelve si sigue en curso y el último reporte.
+    """
+    global ultimo_preprocesamiento
+    if request.method == 'GET':
+        return jsonify({'en_curso': lock_preprocesamiento.locked(), 'ultimo': ultimo_preprocesamiento})
+    
+    proyectos = (request.get_json(silent=True) or {}).get('proyectos') or list(registro.proyectos)
+    if any(proyecto_id not in registro.proyectos for proyecto_id in proyectos):
+        abort(404)
+    if not lock_preprocesamiento.acquire(blocking=False):
+        return jsonify({'estado': 'en curso'}), 409
+    
+    def preprocesar():
+        global ultimo_preprocesamiento
+        try:
+            ultimo_preprocesamiento = preprocesar_archivos([registro.proyectos[proyecto_id]['archivo']
+                                                            for proyecto_id in proyectos])
+        finally:
+            lock_preprocesamiento.release()
+    
+    threading.Thread(target=preprocesar, daemon=True, name='preprocesar-datos').start()
+    return jsonify({'estado': 'preprocesando', 'proyectos': proyectos}), 202
 
 # Layout de la aplicación
 app.layout = dbc.Container([
     
+    # Estado de filtros compartido por los callbacks
+    dcc.Store(id='estado-filtros'),
+    dcc.Store(id='filtros-ventas'),
+    # Versión de datos de la malla que tiene el navegador (para enviar solo parches)
+    dcc.Store(id='version-grafico'),
+    # Tabla de departamentos para filtrar en el navegador (solo en modo cliente)
+    dcc.Store(id='tabla-unidades'),
+    
     # Header principal con fondo azul
     dbc.Row([
         dbc.Col([
             html.Div([
                 dbc.Row([
                     dbc.Col([
-                        html.H1("🏢 Dashboard San Miguel Etapa 2", 
+                        html.H1(f"🏢 Dashboard {registro.proyectos[registro.principal]['nombre']}", 
+                            id='titulo-proyecto',
                             className="display-4 mb-2",
                             style={'color': 'white', 'fontWeight': 'bold'}),
                         html.P("Pagina web creada y administrada por Banmerchant", 
-                            className="lead", style={'color': '#E8E9EA'})
+                            className="lead", style={'color': '#E8E9EA'}),
+                        # Selector de proyecto (oculto si hay uno solo)
+                        html.Div([
+                            dcc.Dropdown(
+                                id='selector-proyecto',
+                                options=[{'label': proyecto['nombre'], 'value': identificador}
+                                         for identificador, proyecto in registro.proyectos.items()],
+                                value=registro.principal,
+                                clearable=False
+                            )
+                        ], style={'maxWidth': '400px'} if len(registro.proyectos) > 1 else {'display': 'none'}),
+                        # Ver el proyecto como estaba en una fecha (vacío: datos actuales)
+                        html.Div([
+                            html.Label("Ver a la fecha:", className="me-2", style={'color': '#E8E9EA'}),
+                            dcc.DatePickerSingle(
+                                id='fecha-historial',
+                                placeholder='Hoy',
+                                display_format='DD/MM/YYYY',
+                                clearable=True
+                            )
+                        ], className="mt-2", style={} if historial is not None else {'display': 'none'})
                     ], width=10),
                     dbc.Col([
                         html.Img(
@@ -485,13 +2804,8 @@ app.layout = dbc.Container([
                             html.Label("Seleccionar Orientación:", className="fw-bold mb-2"),
                             dcc.Dropdown(
                                 id='filtro-orientacion',
-                                options=[
-                                    {'label': '🧭 Todas las orientaciones', 'value': 'todas'},
-                                    {'label': '⬆️ Norte (N)', 'value': 'norte'},
-                                    {'label': '➡️ Oriente (E)', 'value': 'oriente'},
-                                    {'label': '⬇️ Sur (S)', 'value': 'sur'},
-                                    {'label': '⬅️ Poniente (W)', 'value': 'poniente'}
-                                ],
+                                options=opciones_orientacion(
+                                    registro.proyectos[registro.principal]['layout']['orientaciones_tipos']),
                                 value='todas',
                                 placeholder="Seleccionar orientación",
                                 className="mb-3"
@@ -618,40 +2932,8 @@ app.layout = dbc.Container([
                 dbc.CardBody([
                     html.Div([
                         html.P("Distribución de tipos por orientación:", className="mb-3 fw-bold"),
-                        dbc.Row([
-                            dbc.Col([
-                                html.Div([
-                                    html.H6("⬆️ NORTE", className="text-center mb-2", style={'color': '#007BFF'}),
-                                    html.P("• Tipo 2: Poniente-Norte", className="mb-1"),
-                                    html.P("• Tipo 3: Norte", className="mb-1"),
-                                    html.P("• Tipo 4: Norte-Oriente", className="mb-0")
-                                ], className="border rounded p-3", style={'border-color': '#4a4a7a !important'})
-                            ], width=3),
-                            dbc.Col([
-                                html.Div([
-                                    html.H6("➡️ ORIENTE", className="text-center mb-2", style={'color': '#28A745'}),
-                                    html.P("• Tipo 3: Norte", className="mb-1"),
-                                    html.P("• Tipo 4: Norte-Oriente", className="mb-1"),
-                                    html.P("• Tipo 5: Oriente", className="mb-0")
-                                ], className="border rounded p-3", style={'border-color': '#4a4a7a !important'})
-                            ], width=3),
-                            dbc.Col([
-                                html.Div([
-                                    html.H6("⬇️ SUR", className="text-center mb-2", style={'color': '#FFC107'}),
-                                    html.P("• Tipo 6: Oriente-Sur", className="mb-1"),
-                                    html.P("• Tipo 7: Sur", className="mb-1"),
-                                    html.P("• Tipo 8: Sur-Poniente", className="mb-0")
-                                ], className="border rounded p-3", style={'border-color': '#4a4a7a !important'})
-                            ], width=3),
-                            dbc.Col([
-                                html.Div([
-                                    html.H6("⬅️ PONIENTE", className="text-center mb-2", style={'color': '#DC3545'}),
-                                    html.P("• Tipo 8: Sur-Poniente", className="mb-1"),
-                                    html.P("• Tipo 1: Poniente", className="mb-1"),
-                                    html.P("• Tipo 2: Poniente-Norte", className="mb-0")
-                                ], className="border rounded p-3", style={'border-color': '#4a4a7a !important'})
-                            ], width=3)
-                        ])
+                        dbc.Row(mapa_orientaciones(registro.proyectos[registro.principal]['layout']),
+                                id='mapa-orientaciones')
                     ])
                 ])
             ], className="shadow-sm")
@@ -662,22 +2944,57 @@ app.layout = dbc.Container([
 
 # Callbacks
 
+@app.callback(
+    Output('titulo-proyecto', 'children'),
+    Input('selector-proyecto', 'value')
+)
+@medir_callback
+def actualizar_titulo(proyecto_id):
+    proyecto = registro.proyectos.get(proyecto_id, registro.proyectos[registro.principal])
+    return f"🏢 Dashboard {proyecto['nombre']}"
+
+@app.callback(
+    [Output('filtro-orientacion', 'options'),
+     Output('filtro-orientacion', 'value'),
+     Output('mapa-orientaciones', 'children')],
+    Input('selector-proyecto', 'value')
+)
+@medir_callback
+def actualizar_orientaciones(proyecto_id):
+    # Cada proyecto puede traer sus propias orientaciones en el layout
+    layout = registro.proyectos.get(proyecto_id, registro.proyectos[registro.principal])['layout']
+    return opciones_orientacion(layout['orientaciones_tipos']), 'todas', mapa_orientaciones(layout)
+
+@app.callback(
+    Output('fecha-historial', 'min_date_allowed'),
+    Input('selector-proyecto', 'value')
+)
+@medir_callback
+def limitar_fecha_historial(proyecto_id):
+    # Antes de la primera instantánea no hay historial que mostrar
+    if historial is None:
+        return None
+    return historial.primera_fecha(proyecto_id or registro.principal)
+
 @app.callback(
     [Output('filtro-pisos', 'options'),
      Output('filtro-pisos', 'value'),
      Output('filtro-tipologia', 'options'),
      Output('filtro-tipologia', 'value')],
-    [Input('filtro-pisos', 'id')]
+    [Input('selector-proyecto', 'value')]
 )
-def inicializar_filtros(_):
-    if df_global is not None:
+@medir_callback
+def inicializar_filtros(proyecto_id):
+    datos = registro.obtener(proyecto_id)
+    if datos is not None:
+        df = datos.df
         # Opciones de pisos (del 2 al 15)
-        pisos_disponibles = sorted(df_global['PISO'].unique())
+        pisos_disponibles = sorted(df['PISO'].unique())
         opciones_pisos = [{'label': f'Piso {piso}', 'value': piso} for piso in pisos_disponibles]
         
         # Opciones de tipología
-        if 'TIPOLOGIA' in df_global.columns:
-            tipologias_disponibles = sorted(df_global['TIPOLOGIA'].dropna().unique())
+        if 'TIPOLOGIA' in df.columns:
+            tipologias_disponibles = sorted(df['TIPOLOGIA'].dropna().unique())
             opciones_tipologia = [{'label': f'{tip}', 'value': tip} for tip in tipologias_disponibles]
         else:
             opciones_tipologia = []
@@ -690,10 +3007,13 @@ def inicializar_filtros(_):
     [Input('btn-todos', 'n_clicks'),
      Input('btn-altos', 'n_clicks'),
      Input('btn-bajos', 'n_clicks')],
+    State('selector-proyecto', 'value'),
     prevent_initial_call=True
 )
-def botones_vista_rapida(btn_todos, btn_altos, btn_bajos):
-    if df_global is None:
+@medir_callback
+def botones_vista_rapida(btn_todos, btn_altos, btn_bajos, proyecto_id):
+    datos = registro.obtener(proyecto_id)
+    if datos is None:
         return []
     
     ctx = dash.callback_context
@@ -701,284 +3021,284 @@ def botones_vista_rapida(btn_todos, btn_altos, btn_bajos):
         return dash.no_update
     
     button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    pisos_disponibles = sorted(df_global['PISO'].unique())
-    
-    if button_id == 'btn-todos':
-        return pisos_disponibles
-    elif button_id == 'btn-altos':
-        # Pisos altos: del 9 al 15
-        return [p for p in pisos_disponibles if p >= 9]
-    elif button_id == 'btn-bajos':
-        return [p for p in pisos_disponibles if p <= 8]
+    if button_id in BOTONES_PRESETS:
+        return pisos_preset(datos, BOTONES_PRESETS[button_id])
     
     return dash.no_update
 
-@app.callback(
-    [Output('grafico-3d', 'figure'),
-     Output('metricas-resumen', 'children'),
-     Output('info-filtros', 'children'),
-     Output('tabla-ventas-mensuales', 'children'),
-     Output('tabla-precios-mensuales', 'children')],
+# Estado de filtros compartido: lo calcula el navegador, sin ida y vuelta al servidor.
+# Las tablas mensuales no dependen del filtro de estados, así que tienen su propio store.
+# Los dos llevan el proyecto seleccionado y la fecha, que definen de qué datos salen los resultados.
+app.clientside_callback(
+    """
+    function(pisos, orientacion, estado, tipologias, proyecto, fecha) {
+        return {pisos: pisos || [], orientacion: orientacion, estado: estado, tipologias: tipologias || [],
+                proyecto: proyecto, fecha: fecha || null};
+    }
+    """,
+    Output('estado-filtros', 'data'),
     [Input('filtro-pisos', 'value'),
      Input('filtro-orientacion', 'value'),
      Input('filtro-estados', 'value'),
-     Input('filtro-tipologia', 'value')]
+     Input('filtro-tipologia', 'value'),
+     Input('selector-proyecto', 'value'),
+     Input('fecha-historial', 'date')]
 )
-def actualizar_dashboard(pisos_seleccionados, orientacion_seleccionada, estados_seleccionados, tipologias_seleccionadas):
-    if df_global is None:
-        fig_vacia = go.Figure()
-        fig_vacia.add_annotation(text="❌ No se pudieron cargar los datos", x=0.5, y=0.5)
-        return fig_vacia, html.Div("Error en datos"), "Error", html.Div("Error"), html.Div("Error")
-    
-    # Filtrar datos por pisos
-    if pisos_seleccionados and len(pisos_seleccionados) > 0:
-        df_filtrado = df_global[df_global['PISO'].isin(pisos_seleccionados)]
-    else:
-        df_filtrado = df_global.copy()
-    
-    # Filtrar por orientación
-    orientaciones_tipos = {
-        'norte': [2, 3, 4],      # ARRIBA: Tipos 2, 3, 4
-        'oriente': [3, 4, 5],    # DERECHA: Tipos 3, 4, 5  
-        'sur': [6, 7, 8],        # ABAJO: Tipos 6, 7, 8
-        'poniente': [8, 1, 2]    # IZQUIERDA: Tipos 8, 1, 2
+
+app.clientside_callback(
+    """
+    function(pisos, orientacion, tipologias, proyecto, fecha) {
+        return {pisos: pisos || [], orientacion: orientacion, tipologias: tipologias || [], proyecto: proyecto,
+                fecha: fecha || null};
     }
+    """,
+    Output('filtros-ventas', 'data'),
+    [Input('filtro-pisos', 'value'),
+     Input('filtro-orientacion', 'value'),
+     Input('filtro-tipologia', 'value'),
+     Input('selector-proyecto', 'value'),
+     Input('fecha-historial', 'date')]
+)
+
+def filtros_desde_store(datos, orientaciones_tipos=ORIENTACIONES_TIPOS):
+    """Filtros normalizados a partir del contenido de un store de filtros"""
+    datos = datos or {}
+    return normalizar_filtros(datos.get('pisos'), datos.get('orientacion'), datos.get('estado'), datos.get('tipologias'),
+                              orientaciones_tipos)
+
+def datos_desde_store(datos_store):
+    """Datos del proyecto indicado en un store de filtros (el principal si no indica ninguno)
     
-    if orientacion_seleccionada in orientaciones_tipos:
-        tipos_filtrados = orientaciones_tipos[orientacion_seleccionada]
-        df_filtrado = df_filtrado[df_filtrado['TIPO'].isin(tipos_filtrados)]
-    
-    # Filtrar por estados
-    if estados_seleccionados == 'disponible':
-        df_filtrado = df_filtrado[df_filtrado['ESTADO'] == 'Disponible']
-    elif estados_seleccionados == 'reserva':
-        df_filtrado = df_filtrado[df_filtrado['ESTADO'] == 'Reserva']
-    elif estados_seleccionados == 'promesa':
-        df_filtrado = df_filtrado[df_filtrado['ESTADO'] == 'Promesa']
-    
-    # Filtrar por tipología
-    if tipologias_seleccionadas and len(tipologias_seleccionadas) > 0 and 'TIPOLOGIA' in df_filtrado.columns:
-        df_filtrado = df_filtrado[df_filtrado['TIPOLOGIA'].isin(tipologias_seleccionadas)]
-    
-    # Crear gráfico 3D
-    fig_3d = crear_grafico_3d(df_filtrado)
-    
-    # Para análisis temporal, usar solo datos vendidos (que tienen fecha real, no 1900)
-    if 'FECHA' in df_global.columns:
-        df_vendidos = df_global[df_global['FECHA'].notna()]
-        print(f"Debug: {len(df_vendidos)} ventas con fecha encontradas de {len(df_global)} total")
-    else:
-        df_vendidos = pd.DataFrame()
-        print("Debug: No hay columna FECHA en los datos")
-        
-    # Aplicar los mismos filtros al análisis temporal
-    if not df_vendidos.empty:
-        if pisos_seleccionados and len(pisos_seleccionados) > 0:
-            df_vendidos = df_vendidos[df_vendidos['PISO'].isin(pisos_seleccionados)]
-        
-        if orientacion_seleccionada in orientaciones_tipos:
-            tipos_filtrados = orientaciones_tipos[orientacion_seleccionada]
-            df_vendidos = df_vendidos[df_vendidos['TIPO'].isin(tipos_filtrados)]
-        
-        if tipologias_seleccionadas and len(tipologias_seleccionadas) > 0 and 'TIPOLOGIA' in df_vendidos.columns:
-            df_vendidos = df_vendidos[df_vendidos['TIPOLOGIA'].isin(tipologias_seleccionadas)]
-    
-    # Crear análisis temporal
-    tabla_ventas = crear_tabla_ventas_mensuales(df_vendidos)
-    tabla_precios = crear_tabla_precios_mensuales(df_vendidos)
-    
-    # Calcular métricas totales
-    total_precio = df_filtrado['PRECIO'].sum() if 'PRECIO' in df_filtrado.columns else 0
-    total_m2 = df_filtrado['M2'].sum() if 'M2' in df_filtrado.columns else 0
-    promedio_uf_m2 = df_filtrado['UF/M2'].mean() if 'UF/M2' in df_filtrado.columns and len(df_filtrado) > 0 else 0
-    total_departamentos = len(df_filtrado)
-    
-    # Calcular métricas por estado
-    estados = ['Disponible', 'Reserva', 'Promesa']
-    metricas_por_estado = {}
-    
-    for estado in estados:
-        df_estado = df_filtrado[df_filtrado['ESTADO'] == estado]
-        metricas_por_estado[estado] = {
-            'cantidad': len(df_estado),
-            'precio': df_estado['PRECIO'].sum() if 'PRECIO' in df_estado.columns else 0,
-            'm2': df_estado['M2'].sum() if 'M2' in df_estado.columns else 0,
-            'uf_m2': df_estado['UF/M2'].mean() if 'UF/M2' in df_estado.columns and len(df_estado) > 0 else 0
-        }
+    Con fecha, los datos como estaban ese día según el historial (los de su primera
+    instantánea si la fecha es anterior).
+    """
+    datos_store = datos_store or {}
+    if not datos_store.get('fecha') or historial is None:
+        return registro.obtener(datos_store.get('proyecto'))
+    proyecto = registro.proyectos.get(datos_store.get('proyecto') or registro.principal)
+    momento = momento_de_fecha(datos_store['fecha'])
+    if proyecto is None or momento is None:
+        return None
+    return historial.obtener(proyecto, momento)
+
+def en_cache(datos, componente, filtros, calcular):
+    """Resultado de calcular() memorizado por versión de datos, componente y filtros"""
+    clave = (datos.version, componente) + tuple(filtros)
+    resultado = cache_resultados.obtener(clave)
+    if resultado is None:
+        resultado = calcular()
+        cache_resultados.guardar(clave, resultado)
+    return resultado
+
+@medir_etapa('filtro')
+def mascara_seleccion(indice, filtros):
+    """AND de las máscaras precalculadas de todos los filtros"""
+    pisos, orientacion, estado, tipologias = filtros
+    return (mascara_filtros(indice, pisos, orientacion, tipologias)
+            & mascara_estado(indice, estado))
+
+def mascara_visibles(datos, filtros):
+    """Máscara de departamentos visibles"""
+    return mascara_seleccion(datos.indice, filtros)
+
+def metricas_filtradas(datos, filtros):
+    """Métricas de los departamentos visibles, compartidas por métricas e info de filtros"""
+    return en_cache(datos, 'metricas', filtros,
+                    lambda: calcular_metricas(datos.cubo.take(np.flatnonzero(mascara_seleccion(datos.indice_cubo, filtros)))))
+
+@medir_etapa('filtro')
+def datos_vendidos(datos, filtros):
+    """Celdas vendidas (con fecha real, no 1900) del cubo con los mismos filtros salvo el de estado"""
+    pisos, orientacion, _, tipologias = filtros
+    mascara = mascara_filtros(datos.indice_cubo, pisos, orientacion, tipologias) & datos.indice_cubo['vendidos']
+    # Sin las celdas que quedaron vacías al aplicar eventos de venta
+    return datos.cubo.take(np.flatnonzero(mascara & (datos.cubo['cantidad'].to_numpy() > 0)))
+
+def figura_filtrada(datos, filtros):
+    return en_cache(datos, 'grafico', filtros, lambda: crear_grafico_3d(datos.geometria, mascara_visibles(datos, filtros)))
+
+def actualizacion_filtrada(datos, filtros):
+    return en_cache(datos, 'actualizacion-grafico', filtros,
+                    lambda: actualizacion_grafico_3d(datos.geometria, mascara_visibles(datos, filtros)))
+
+def componente_metricas(datos, filtros):
+    return en_cache(datos, 'componente-metricas', filtros,
+                    lambda: crear_componente_metricas(metricas_filtradas(datos, filtros)))
+
+def componente_info_filtros(datos, filtros):
+    return en_cache(datos, 'info-filtros', filtros,
+                    lambda: crear_info_filtros(filtros, metricas_filtradas(datos, filtros)))
+
+def tabla_ventas_filtrada(datos, filtros):
+    return en_cache(datos, 'tabla-ventas', filtros,
+                    lambda: crear_tabla_ventas_mensuales(datos_vendidos(datos, filtros)))
+
+def tabla_precios_filtrada(datos, filtros):
+    return en_cache(datos, 'tabla-precios', filtros,
+                    lambda: crear_tabla_precios_mensuales(datos_vendidos(datos, filtros)))
+
+def tabla_y_figura_cliente(datos):
+    """Tabla de departamentos y malla completa que el modo cliente envía una sola vez"""
+    filtros = normalizar_filtros(None, 'todas', 'todos', None)
+    tabla = en_cache(datos, 'tabla-unidades', filtros,
+                     lambda: tabla_unidades(datos.df, datos.geometria, datos.layout['orientaciones_tipos']))
+    fig = en_cache(datos, 'grafico', filtros, lambda: crear_grafico_3d(datos.geometria, datos.indice['todos']))
+    return tabla, fig
+
+def pisos_preset(datos, preset):
+    """Pisos del proyecto que incluye un preset de pisos (todos, altos, bajos)"""
+    return [piso for piso in sorted(datos.df['PISO'].unique()) if PRESETS_PISOS[preset](piso)]
+
+def filtros_preset(datos, preset):
+    """Filtros normalizados de un preset: uno de pisos, o una orientación con todos los pisos"""
+    if preset in PRESETS_PISOS:
+        return normalizar_filtros(pisos_preset(datos, preset), 'todas', 'todos', None)
+    return normalizar_filtros(pisos_preset(datos, 'todos'), preset, 'todos', None, datos.layout['orientaciones_tipos'])
+
+def precalentar(datos, presets):
+    """Dejar en la caché el gráfico, las métricas y las tablas mensuales de cada preset
     
-    # Crear componente de métricas
-    metricas_componente = html.Div([
-        # Métricas Totales
-        html.H5("📊 MÉTRICAS TOTALES", className="text-center mb-3", style={'color': '#2C3E50', 'fontWeight': 'bold'}),
-        dbc.Row([
-            dbc.Col([
-                html.Div([
-                    html.H4(f"{total_departamentos}", className="mb-0", style={'color': '#6C757D', 'fontWeight': 'bold'}),
-                    html.Small("Total Departamentos", className="text-muted")
-                ], className="text-center p-2 border rounded")
-            ], width=3),
-            dbc.Col([
-                html.Div([
-                    html.H4(f"UF {total_precio:,.0f}", className="mb-0", style={'color': '#007BFF', 'fontWeight': 'bold'}),
-                    html.Small("Total Precio", className="text-muted")
-                ], className="text-center p-2 border rounded")
-            ], width=3),
-            dbc.Col([
-                html.Div([
-                    html.H4(f"{total_m2:,.1f} m²", className="mb-0", style={'color': '#FF6B6B', 'fontWeight': 'bold'}),
-                    html.Small("Total Superficie", className="text-muted")
-                ], className="text-center p-2 border rounded")
-            ], width=3),
-            dbc.Col([
-                html.Div([
-                    html.H4(f"{promedio_uf_m2:.2f}", className="mb-0", style={'color': '#9C27B0', 'fontWeight': 'bold'}),
-                    html.Small("Promedio UF/m²", className="text-muted")
-                ], className="text-center p-2 border rounded")
-            ], width=3)
-        ], className="mb-4"),
-        
-        # Separador
-        html.Hr(),
+    Se detiene si entretanto llega otra versión de los datos del proyecto.
+    """
+    contexto_medicion.callback = 'precalentar'
+    inicio = time.perf_counter()
+    presets = [preset for preset in presets
+               if preset in PRESETS_PISOS or preset in datos.layout['orientaciones_tipos']]
+    if MODO_CLIENTE:
+        tabla_y_figura_cliente(datos)
+    for preset in presets:
+        if registro.cargado(datos.proyecto) is not datos:
+            log.debug("Precalentamiento de %s interrumpido: hay una versión más nueva", datos.version)
+            return
+        filtros = filtros_preset(datos, preset)
+        if not MODO_CLIENTE:
+            # Completo para quien llega con otra versión del gráfico, parche para el resto
+            figura_filtrada(datos, filtros)
+            actualizacion_filtrada(datos, filtros)
+            componente_metricas(datos, filtros)
+            componente_info_filtros(datos, filtros)
+        tabla_ventas_filtrada(datos, filtros)
+        tabla_precios_filtrada(datos, filtros)
+    log.info(f"🔥 Presets precalentados para {datos.nombre} ({datos.version}): {', '.join(presets)} "
+             f"en {time.perf_counter() - inicio:.2f} s")
+
+def figura_sin_datos():
+    fig_vacia = go.Figure()
+    fig_vacia.add_annotation(text="❌ No se pudieron cargar los datos", x=0.5, y=0.5)
+    return fig_vacia
+
+if MODO_CLIENTE:
+    # El navegador recibe una vez la tabla de departamentos y la malla completa;
+    # después filtra, recolorea y calcula las métricas sin llamar al servidor.
+    @app.callback(
+        [Output('tabla-unidades', 'data'),
+         Output('grafico-3d', 'figure')],
+        [Input('selector-proyecto', 'value'),
+         Input('fecha-historial', 'date')]
+    )
+    @medir_callback
+    def cargar_tabla_unidades(proyecto_id, fecha):
+        datos = datos_desde_store({'proyecto': proyecto_id, 'fecha': fecha})
+        if datos is None:
+            return None, figura_sin_datos()
         
-        # Métricas por Estado
-        html.H5("📈 MÉTRICAS POR ESTADO", className="text-center mb-3", style={'color': '#2C3E50', 'fontWeight': 'bold'}),
+        return tabla_y_figura_cliente(datos)
+    
+    app.clientside_callback(
+        ClientsideFunction(namespace='cliente', function_name='filtrar_grafico'),
+        Output('grafico-3d', 'figure', allow_duplicate=True),
+        [Input('estado-filtros', 'data'),
+         Input('tabla-unidades', 'data')],
+        State('grafico-3d', 'figure'),
+        prevent_initial_call=True
+    )
+    
+    app.clientside_callback(
+        ClientsideFunction(namespace='cliente', function_name='metricas_e_info'),
+        [Output('metricas-resumen', 'children'),
+         Output('info-filtros', 'children')],
+        [Input('estado-filtros', 'data'),
+         Input('tabla-unidades', 'data')]
+    )
+else:
+    @app.callback(
+        [Output('grafico-3d', 'figure'),
+         Output('version-grafico', 'data')],
+        Input('estado-filtros', 'data'),
+        State('version-grafico', 'data')
+    )
+    @medir_callback
+    def actualizar_grafico(estado_filtros, version_grafico):
+        datos = datos_desde_store(estado_filtros)
+        if datos is None:
+            return figura_sin_datos(), None
         
-        # DISPONIBLES
-        html.H6("🟢 DISPONIBLES", className="mb-2", style={'color': '#28A745', 'fontWeight': 'bold'}),
-        dbc.Row([
-            dbc.Col([
-                html.Div([
-                    html.H6(f"{metricas_por_estado['Disponible']['cantidad']}", className="mb-0", style={'color': '#28A745'}),
-                    html.Small("Cantidad", className="text-muted")
-                ], className="text-center p-1")
-            ], width=3),
-            dbc.Col([
-                html.Div([
-                    html.H6(f"UF {metricas_por_estado['Disponible']['precio']:,.0f}", className="mb-0", style={'color': '#28A745'}),
-                    html.Small("Precio Total", className="text-muted")
-                ], className="text-center p-1")
-            ], width=3),
-            dbc.Col([
-                html.Div([
-                    html.H6(f"{metricas_por_estado['Disponible']['m2']:,.1f} m²", className="mb-0", style={'color': '#28A745'}),
-                    html.Small("Superficie", className="text-muted")
-                ], className="text-center p-1")
-            ], width=3),
-            dbc.Col([
-                html.Div([
-                    html.H6(f"{metricas_por_estado['Disponible']['uf_m2']:.2f}", className="mb-0", style={'color': '#28A745'}),
-                    html.Small("Prom. UF/m²", className="text-muted")
-                ], className="text-center p-1")
-            ], width=3)
-        ], className="mb-2"),
+        filtros = filtros_desde_store(estado_filtros, datos.layout['orientaciones_tipos'])
         
-        # RESERVAS
-        html.H6("🟡 RESERVAS", className="mb-2", style={'color': '#FFC107', 'fontWeight': 'bold'}),
-        dbc.Row([
-            dbc.Col([
-                html.Div([
-                    html.H6(f"{metricas_por_estado['Reserva']['cantidad']}", className="mb-0", style={'color': '#FFC107'}),
-                    html.Small("Cantidad", className="text-muted")
-                ], className="text-center p-1")
-            ], width=3),
-            dbc.Col([
-                html.Div([
-                    html.H6(f"UF {metricas_por_estado['Reserva']['precio']:,.0f}", className="mb-0", style={'color': '#FFC107'}),
-                    html.Small("Precio Total", className="text-muted")
-                ], className="text-center p-1")
-            ], width=3),
-            dbc.Col([
-                html.Div([
-                    html.H6(f"{metricas_por_estado['Reserva']['m2']:,.1f} m²", className="mb-0", style={'color': '#FFC107'}),
-                    html.Small("Superficie", className="text-muted")
-                ], className="text-center p-1")
-            ], width=3),
-            dbc.Col([
-                html.Div([
-                    html.H6(f"{metricas_por_estado['Reserva']['uf_m2']:.2f}", className="mb-0", style={'color': '#FFC107'}),
-                    html.Small("Prom. UF/m²", className="text-muted")
-                ], className="text-center p-1")
-            ], width=3)
-        ], className="mb-2"),
+        # El navegador ya tiene la malla de esta versión de datos: enviar solo caras y colores
+        version = f"{datos.version}-g{FORMATO_GRAFICO}"
+        if version_grafico == version:
+            return parche_grafico_3d(actualizacion_filtrada(datos, filtros)), dash.no_update
         
-        # PROMESAS
-        html.H6("🔴 PROMESAS", className="mb-2", style={'color': '#DC3545', 'fontWeight': 'bold'}),
-        dbc.Row([
-            dbc.Col([
-                html.Div([
-                    html.H6(f"{metricas_por_estado['Promesa']['cantidad']}", className="mb-0", style={'color': '#DC3545'}),
-                    html.Small("Cantidad", className="text-muted")
-                ], className="text-center p-1")
-            ], width=3),
-            dbc.Col([
-                html.Div([
-                    html.H6(f"UF {metricas_por_estado['Promesa']['precio']:,.0f}", className="mb-0", style={'color': '#DC3545'}),
-                    html.Small("Precio Total", className="text-muted")
-                ], className="text-center p-1")
-            ], width=3),
-            dbc.Col([
-                html.Div([
-                    html.H6(f"{metricas_por_estado['Promesa']['m2']:,.1f} m²", className="mb-0", style={'color': '#DC3545'}),
-                    html.Small("Superficie", className="text-muted")
-                ], className="text-center p-1")
-            ], width=3),
-            dbc.Col([
-                html.Div([
-                    html.H6(f"{metricas_por_estado['Promesa']['uf_m2']:.2f}", className="mb-0", style={'color': '#DC3545'}),
-                    html.Small("Prom. UF/m²", className="text-muted")
-                ], className="text-center p-1")
-            ], width=3)
-        ])
-    ])
-    
-    # Información de filtros mejorada
-    total_disponibles = metricas_por_estado['Disponible']['cantidad']
-    total_reservas = metricas_por_estado['Reserva']['cantidad']
-    total_promesas = metricas_por_estado['Promesa']['cantidad']
-    
-    # Crear texto descriptivo de filtros
-    filtros_texto = []
-    
-    if pisos_seleccionados and len(pisos_seleccionados) > 0:
-        pisos_texto = ", ".join([f"Piso {p}" for p in sorted(pisos_seleccionados)])
-        filtros_texto.append(f"Pisos: {pisos_texto}")
-    else:
-        filtros_texto.append("Pisos: Todos")
-    
-    orientacion_texto = {
-        'todas': 'Todas las orientaciones',
-        'norte': '⬆️ Norte únicamente',
-        'oriente': '➡️ Oriente únicamente',
-        'sur': '⬇️ Sur únicamente',
-        'poniente': '⬅️ Poniente únicamente'
-    }
-    filtros_texto.append(f"Orientación: {orientacion_texto.get(orientacion_seleccionada, 'Todas')}")
+        return figura_filtrada(datos, filtros), version
     
-    estado_texto = {
-        'todos': 'Todos los estados',
-        'disponible': '🟢 Solo Disponibles',
-        'reserva': '🟡 Solo Reservas',
-        'promesa': '🔴 Solo Promesas'
-    }
-    filtros_texto.append(f"Estados: {estado_texto.get(estados_seleccionados, 'Todos')}")
+    @app.callback(
+        Output('metricas-resumen', 'children'),
+        Input('estado-filtros', 'data')
+    )
+    @medir_callback
+    def actualizar_metricas(estado_filtros):
+        datos = datos_desde_store(estado_filtros)
+        if datos is None:
+            return html.Div("Error en datos")
+        
+        filtros = filtros_desde_store(estado_filtros, datos.layout['orientaciones_tipos'])
+        return componente_metricas(datos, filtros)
     
-    if tipologias_seleccionadas and len(tipologias_seleccionadas) > 0:
-        tip_texto = ", ".join(tipologias_seleccionadas)
-        filtros_texto.append(f"Tipologías: {tip_texto}")
+    @app.callback(
+        Output('info-filtros', 'children'),
+        Input('estado-filtros', 'data')
+    )
+    @medir_callback
+    def actualizar_info_filtros(estado_filtros):
+        datos = datos_desde_store(estado_filtros)
+        if datos is None:
+            return "Error"
+        
+        filtros = filtros_desde_store(estado_filtros, datos.layout['orientaciones_tipos'])
+        return componente_info_filtros(datos, filtros)
+
+@app.callback(
+    Output('tabla-ventas-mensuales', 'children'),
+    Input('filtros-ventas', 'data')
+)
+@medir_callback
+def actualizar_tabla_ventas(filtros_ventas):
+    datos = datos_desde_store(filtros_ventas)
+    if datos is None:
+        return html.Div("Error")
     
-    info_text = html.Div([
-        html.P([
-            "📊 ", html.Strong("Filtros aplicados: "), " | ".join(filtros_texto)
-        ], className="mb-1"),
-        html.P([
-            html.Strong(f"Total: {total_departamentos} departamentos | "),
-            html.Span(f"🟢 {total_disponibles} Disponibles", className="me-3"),
-            html.Span(f"🟡 {total_reservas} Reservas", className="me-3"),
-            html.Span(f"🔴 {total_promesas} Promesas")
-        ], className="mb-0")
-    ])
+    filtros = filtros_desde_store(filtros_ventas, datos.layout['orientaciones_tipos'])
+    return tabla_ventas_filtrada(datos, filtros)
+
+@app.callback(
+    Output('tabla-precios-mensuales', 'children'),
+    Input('filtros-ventas', 'data')
+)
+@medir_callback
+def actualizar_tabla_precios(filtros_ventas):
+    datos = datos_desde_store(filtros_ventas)
+    if datos is None:
+        return html.Div("Error")
     
-    return fig_3d, metricas_componente, info_text, tabla_ventas, tabla_precios
+    filtros = filtros_desde_store(filtros_ventas, datos.layout['orientaciones_tipos'])
+    return tabla_precios_filtrada(datos, filtros)
+
+# El precalentamiento va al final, cuando ya existen todas las funciones que usa;
+# con gunicorn --preload lo inicia cada worker (post_fork), igual que la vigilancia
+if os.environ.get('DASHBOARD_PRECARGA') != '1' and not EN_PROCESO_HIJO:
+    iniciar_precalentamiento()
+
 
 if __name__ == "__main__":
     app.run(debug=True)
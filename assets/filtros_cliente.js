@@ -0,0 +1,294 @@
+// Modo cliente (MODO_CLIENTE=1): filtrado, recoloreo del gráfico 3D y métricas en el navegador.
+// Replica normalizar_filtros, mascara_filtros, mascara_estado, calcular_metricas,
+// crear_componente_metricas y crear_info_filtros de app.py sobre la tabla del store 'tabla-unidades'.
+
+(function() {
+    var COLORES_TOTALES = ['#6C757D', '#007BFF', '#FF6B6B', '#9C27B0'];
+    var ESTADOS_METRICAS = [
+        {estado: 'Disponible', titulo: '🟢 DISPONIBLES', color: '#28A745'},
+        {estado: 'Reserva', titulo: '🟡 RESERVAS', color: '#FFC107'},
+        {estado: 'Promesa', titulo: '🔴 PROMESAS', color: '#DC3545'}
+    ];
+    var ORIENTACION_TEXTO = {
+        'todas': 'Todas las orientaciones',
+        'norte': '⬆️ Norte únicamente',
+        'oriente': '➡️ Oriente únicamente',
+        'sur': '⬇️ Sur únicamente',
+        'poniente': '⬅️ Poniente únicamente'
+    };
+    var ESTADO_TEXTO = {
+        'todos': 'Todos los estados',
+        'disponible': '🟢 Solo Disponibles',
+        'reserva': '🟡 Solo Reservas',
+        'promesa': '🔴 Solo Promesas'
+    };
+
+    function unicosOrdenados(valores, numericos) {
+        var unicos = Array.from(new Set(valores));
+        return numericos ? unicos.sort(function(a, b) { return a - b; }) : unicos.sort();
+    }
+
+    // Misma forma canónica que normalizar_filtros
+    function normalizarFiltros(datos, tabla) {
+        datos = datos || {};
+        return {
+            pisos: unicosOrdenados((datos.pisos || []).map(Number), true),
+            orientacion: datos.orientacion in tabla.orientaciones_tipos ? datos.orientacion : 'todas',
+            estado: datos.estado in tabla.estados_filtro ? datos.estado : 'todos',
+            tipologias: unicosOrdenados(datos.tipologias || [], false)
+        };
+    }
+
+    // AND de los filtros, igual que mascara_filtros & mascara_estado
+    function mascaraVisibles(tabla, filtros) {
+        var n = tabla.piso.length;
+        var pisos = new Set(filtros.pisos);
+        var tipos = filtros.orientacion in tabla.orientaciones_tipos ?
+            new Set(tabla.orientaciones_tipos[filtros.orientacion]) : null;
+        var tipologias = filtros.tipologias.length > 0 && tabla.tipologia ?
+            new Set(filtros.tipologias.map(function(t) { return tabla.tipologias.indexOf(t); })) : null;
+        var estado = filtros.estado in tabla.estados_filtro ?
+            tabla.estados.indexOf(tabla.estados_filtro[filtros.estado]) : null;
+
+        var visibles = new Uint8Array(n);
+        for (var f = 0; f < n; f++) {
+            visibles[f] = (pisos.size === 0 || pisos.has(tabla.piso[f])) &&
+                (tipos === null || tipos.has(tabla.tipo[f])) &&
+                (tipologias === null || tipologias.has(tabla.tipologia[f])) &&
+                (estado === null || tabla.estado[f] === estado) ? 1 : 0;
+        }
+        return visibles;
+    }
+
+    // Caras y colores, caras de escaleras, aristas y rango de pisos, igual que actualizacion_grafico_3d
+    function actualizacionGrafico(tabla, visibles) {
+        var cubos = [];
+        var pisosVisibles = new Set();
+        var aristas = {x: [], y: [], z: []};
+        var nPuntos = tabla.aristas_x.length;
+
+        for (var f = 0; f < visibles.length; f++) {
+            if (!visibles[f]) {
+                continue;
+            }
+            pisosVisibles.add(tabla.piso[f]);
+            if (tabla.cubo[f] < 0) {
+                continue;
+            }
+            cubos.push(tabla.cubo[f]);
+            for (var p = 0; p < nPuntos; p++) {
+                // El último punto de cada recorrido es null y corta la línea
+                var corte = tabla.aristas_x[p] === null;
+                aristas.x.push(corte ? null : tabla.x0[f] + tabla.aristas_x[p]);
+                aristas.y.push(corte ? null : tabla.y0[f] + tabla.aristas_y[p]);
+                aristas.z.push(corte ? null : tabla.piso[f] + tabla.aristas_z[p]);
+            }
+        }
+        var escaleras = [];
+        tabla.pisos_escalera.forEach(function(piso, e) {
+            if (pisosVisibles.has(piso)) {
+                escaleras.push(e);
+            }
+        });
+
+        // Caras de los cubos indicados, como caras_cubos
+        function caras(indices) {
+            var resultado = {i: [], j: [], k: []};
+            var nVertices = 8;
+            indices.forEach(function(cubo) {
+                for (var c = 0; c < tabla.cubo_i.length; c++) {
+                    resultado.i.push(cubo * nVertices + tabla.cubo_i[c]);
+                    resultado.j.push(cubo * nVertices + tabla.cubo_j[c]);
+                    resultado.k.push(cubo * nVertices + tabla.cubo_k[c]);
+                }
+            });
+            return resultado;
+        }
+        var departamentos = caras(cubos);
+        var facecolor = [];
+        cubos.forEach(function(cubo) {
+            for (var c = 0; c < tabla.cubo_i.length; c++) {
+                facecolor.push(tabla.colores[cubo]);
+            }
+        });
+
+        var pisoMaximo = Math.max.apply(null, Array.from(pisosVisibles));
+        return {
+            i: departamentos.i, j: departamentos.j, k: departamentos.k, facecolor: facecolor,
+            escaleras: caras(escaleras), aristas: aristas,
+            rango_z: pisosVisibles.size > 0 ? [1.5, pisoMaximo + 1] : [1.5, 16]
+        };
+    }
+
+    // Suma compensada (Neumaier): evita que el orden de la suma cambie el último decimal mostrado
+    function Suma() {
+        this.total = 0;
+        this.compensacion = 0;
+        this.n = 0;
+    }
+    Suma.prototype.agregar = function(x) {
+        var t = this.total + x;
+        this.compensacion += Math.abs(this.total) >= Math.abs(x) ? (this.total - t) + x : (x - t) + this.total;
+        this.total = t;
+        this.n += 1;
+    };
+    Suma.prototype.valor = function() {
+        return this.total + this.compensacion;
+    };
+
+    function resumen(tabla, visibles, estado) {
+        var cantidad = 0, precio = new Suma(), m2 = new Suma(), ufM2 = new Suma();
+        for (var f = 0; f < visibles.length; f++) {
+            if (!visibles[f] || (estado !== null && tabla.estado[f] !== estado)) {
+                continue;
+            }
+            cantidad += 1;
+            if (tabla.precio && tabla.precio[f] !== null) { precio.agregar(tabla.precio[f]); }
+            if (tabla.m2 && tabla.m2[f] !== null) { m2.agregar(tabla.m2[f]); }
+            if (tabla.uf_m2 && tabla.uf_m2[f] !== null) { ufM2.agregar(tabla.uf_m2[f]); }
+        }
+        var promedioUfM2 = cantidad === 0 || !tabla.uf_m2 ? 0 : (ufM2.n > 0 ? ufM2.valor() / ufM2.n : NaN);
+        return {cantidad: cantidad, precio: precio.valor(), m2: m2.valor(), uf_m2: promedioUfM2};
+    }
+
+    // Igual que calcular_metricas
+    function calcularMetricas(tabla, visibles) {
+        var totales = resumen(tabla, visibles, null);
+        var porEstado = {};
+        ESTADOS_METRICAS.forEach(function(e) {
+            porEstado[e.estado] = resumen(tabla, visibles, tabla.estados.indexOf(e.estado));
+        });
+        return {totales: totales, por_estado: porEstado};
+    }
+
+    // toFixed redondea los empates exactos (x.x5) hacia arriba; Python los redondea al par
+    function redondear(x, decimales) {
+        var extra = 20;
+        var largo = x.toFixed(decimales + extra);
+        if (!/^50*$/.test(largo.slice(-extra))) {
+            return x.toFixed(decimales);
+        }
+        var truncado = largo.slice(0, largo.length - extra - (decimales === 0 ? 1 : 0));
+        var ultimo = Number(truncado[truncado.length - 1]);
+        return ultimo % 2 === 0 ? truncado : x.toFixed(decimales);
+    }
+
+    // Formato de números como en Python: f"{x:,.nf}" (con comas) o f"{x:.nf}"
+    function numero(x, decimales, comas) {
+        if (isNaN(x)) {
+            return 'nan';
+        }
+        var partes = redondear(x, decimales).split('.');
+        if (comas) {
+            partes[0] = partes[0].replace(/\B(?=(\d{3})+(?!\d))/g, ',');
+        }
+        return partes.join('.');
+    }
+
+    function html(tipo, children, props) {
+        return {namespace: 'dash_html_components', type: tipo, props: Object.assign({children: children}, props || {})};
+    }
+
+    function dbc(tipo, children, props) {
+        return {namespace: 'dash_bootstrap_components', type: tipo, props: Object.assign({children: children}, props || {})};
+    }
+
+    function celda(titulo, texto, color, total) {
+        return dbc('Col', [
+            html('Div', [
+                html(total ? 'H4' : 'H6', texto, {
+                    className: 'mb-0', style: total ? {color: color, fontWeight: 'bold'} : {color: color}
+                }),
+                html('Small', titulo, {className: 'text-muted'})
+            ], {className: total ? 'text-center p-2 border rounded' : 'text-center p-1'})
+        ], {width: 3});
+    }
+
+    function textos(m) {
+        return [
+            String(m.cantidad),
+            'UF ' + numero(m.precio, 0, true),
+            numero(m.m2, 1, true) + ' m²',
+            numero(m.uf_m2, 2, false)
+        ];
+    }
+
+    // Igual que crear_componente_metricas
+    function componenteMetricas(metricas) {
+        var estiloTitulo = {color: '#2C3E50', fontWeight: 'bold'};
+        var t = textos(metricas.totales);
+        var hijos = [
+            html('H5', '📊 MÉTRICAS TOTALES', {className: 'text-center mb-3', style: estiloTitulo}),
+            dbc('Row', ['Total Departamentos', 'Total Precio', 'Total Superficie', 'Promedio UF/m²'].map(function(titulo, c) {
+                return celda(titulo, t[c], COLORES_TOTALES[c], true);
+            }), {className: 'mb-4'}),
+            html('Hr', null),
+            html('H5', '📈 MÉTRICAS POR ESTADO', {className: 'text-center mb-3', style: estiloTitulo})
+        ];
+        ESTADOS_METRICAS.forEach(function(e, n) {
+            var te = textos(metricas.por_estado[e.estado]);
+            hijos.push(html('H6', e.titulo, {className: 'mb-2', style: {color: e.color, fontWeight: 'bold'}}));
+            hijos.push(dbc('Row', ['Cantidad', 'Precio Total', 'Superficie', 'Prom. UF/m²'].map(function(titulo, c) {
+                return celda(titulo, te[c], e.color, false);
+            }), n < ESTADOS_METRICAS.length - 1 ? {className: 'mb-2'} : {}));
+        });
+        return html('Div', hijos);
+    }
+
+    // Igual que crear_info_filtros
+    function infoFiltros(filtros, metricas) {
+        var partes = [];
+        partes.push(filtros.pisos.length > 0 ?
+            'Pisos: ' + filtros.pisos.map(function(p) { return 'Piso ' + p; }).join(', ') : 'Pisos: Todos');
+        // Las orientaciones propias del layout del proyecto, como estilo_orientacion
+        partes.push('Orientación: ' + (ORIENTACION_TEXTO[filtros.orientacion] ||
+            '🧭 ' + filtros.orientacion.charAt(0).toUpperCase() + filtros.orientacion.slice(1).toLowerCase() + ' únicamente'));
+        partes.push('Estados: ' + (ESTADO_TEXTO[filtros.estado] || 'Todos'));
+        if (filtros.tipologias.length > 0) {
+            partes.push('Tipologías: ' + filtros.tipologias.join(', '));
+        }
+        var e = metricas.por_estado;
+        return html('Div', [
+            html('P', ['📊 ', html('Strong', 'Filtros aplicados: '), partes.join(' | ')], {className: 'mb-1'}),
+            html('P', [
+                html('Strong', 'Total: ' + metricas.totales.cantidad + ' departamentos | '),
+                html('Span', '🟢 ' + e.Disponible.cantidad + ' Disponibles', {className: 'me-3'}),
+                html('Span', '🟡 ' + e.Reserva.cantidad + ' Reservas', {className: 'me-3'}),
+                html('Span', '🔴 ' + e.Promesa.cantidad + ' Promesas')
+            ], {className: 'mb-0'})
+        ]);
+    }
+
+    var cliente = {
+        filtrar_grafico: function(estadoFiltros, tabla, figura) {
+            if (!tabla || !figura || !figura.data || figura.data.length < 3) {
+                return window.dash_clientside.no_update;
+            }
+            var filtros = normalizarFiltros(estadoFiltros, tabla);
+            var act = actualizacionGrafico(tabla, mascaraVisibles(tabla, filtros));
+
+            // Vértices y textos de hover no cambian: solo caras, colores y aristas
+            var malla = Object.assign({}, figura.data[0], {i: act.i, j: act.j, k: act.k, facecolor: act.facecolor});
+            var bordes = Object.assign({}, figura.data[1], {x: act.aristas.x, y: act.aristas.y, z: act.aristas.z});
+            var escaleras = Object.assign({}, figura.data[2], {i: act.escaleras.i, j: act.escaleras.j, k: act.escaleras.k});
+            var escena = Object.assign({}, figura.layout.scene, {
+                zaxis: Object.assign({}, figura.layout.scene.zaxis, {range: act.rango_z})
+            });
+            return Object.assign({}, figura, {
+                data: [malla, bordes, escaleras].concat(figura.data.slice(3)),
+                layout: Object.assign({}, figura.layout, {scene: escena})
+            });
+        },
+
+        metricas_e_info: function(estadoFiltros, tabla) {
+            if (!tabla) {
+                return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+            }
+            var filtros = normalizarFiltros(estadoFiltros, tabla);
+            var metricas = calcularMetricas(tabla, mascaraVisibles(tabla, filtros));
+            return [componenteMetricas(metricas), infoFiltros(filtros, metricas)];
+        }
+    };
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {cliente: cliente});
+})();
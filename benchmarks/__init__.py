@@ -0,0 +1,4 @@
+"""Benchmarks del dashboard: generador de datos sintéticos y mediciones de tiempo, memoria y tamaño
+
+Uso: python -m benchmarks [--tamaños 300,3000] [--comparar resultado.json]
+"""
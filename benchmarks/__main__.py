@@ -0,0 +1,203 @@
+"""Medir carga, gráfico 3D, tablas mensuales y callbacks con datos sintéticos de varios tamaños
+
+Uso: python -m benchmarks [--tamaños u300,u3k] [--repeticiones N] [--comparar resultado.json]
+Cada corrida queda en benchmarks/resultados/ (ignorada por git) para compararla con las siguientes;
+--salida la guarda en otro lugar, por ejemplo para conservar una referencia.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from plotly.utils import PlotlyJSONEncoder
+
+from benchmarks.cliente_dash import callbacks_servidor, cuerpo_callback, stores_filtros, version_grafico
+from benchmarks.generador import escribir_portafolio
+
+# Tamaño -> (pisos, departamentos por piso, edificios)
+TAMAÑOS = {
+    'u300': (15, 10, 2),
+    'u3k': (25, 12, 10),
+    'u30k': (40, 15, 50),
+    'u100k': (50, 20, 100),
+}
+CARPETA = os.path.dirname(os.path.abspath(__file__))
+DATOS_DIR = os.path.join(CARPETA, 'datos')
+RESULTADOS_DIR = os.path.join(CARPETA, 'resultados')
+# Variación de tiempo (sobre el mínimo) que se informa como regresión al comparar
+UMBRAL_REGRESION = 0.2
+
+def medir(funcion, repeticiones, antes=None):
+    """Tiempo mínimo y mediana de funcion(), y pico de memoria de una corrida aparte con tracemalloc
+    
+    La corrida de memoria va primero y sirve también de calentamiento (imports, validadores de plotly).
+    """
+    if antes:
+        antes()
+    tracemalloc.start()
+    try:
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    tiempos = []
+    for _ in range(repeticiones):
+        if antes:
+            antes()
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return resultado, {
+        'segundos_min': min(tiempos),
+        'segundos_mediana': statistics.median(tiempos),
+        'repeticiones': repeticiones,
+        'memoria_pico_bytes': pico
+    }
+
+def tamano_json(valor):
+    return len(json.dumps(valor, cls=PlotlyJSONEncoder).encode('utf-8'))
+
+def medir_proyecto(app, proyecto_id, repeticiones):
+    """Mediciones de un proyecto generado: {nombre: {segundos_min, segundos_mediana, memoria_pico_bytes, ...}}"""
+    proyecto = app.registro.proyectos[proyecto_id]
+    mediciones = {}
+
+    df, mediciones['cargar_datos'] = medir(lambda: app.cargar_datos(proyecto['archivo']), repeticiones)
+    datos, mediciones['conjunto_datos'] = medir(
+        lambda: app.ConjuntoDatos(df, proyecto, 'benchmark'), repeticiones)
+
+    visibles = datos.indice['todos']
+    fig, mediciones['crear_grafico_3d'] = medir(
+        lambda: app.crear_grafico_3d(datos.geometria, visibles), repeticiones)
+    mediciones['crear_grafico_3d']['bytes'] = tamano_json(fig)
+
+    filtros = app.normalizar_filtros(None, 'todas', 'todos', None)
+    vendidos = app.datos_vendidos(datos, filtros)
+    for nombre, crear in [('tabla_ventas_mensuales', app.crear_tabla_ventas_mensuales),
+                          ('tabla_precios_mensuales', app.crear_tabla_precios_mensuales)]:
+        tabla, mediciones[nombre] = medir(lambda: crear(vendidos), repeticiones)
+        mediciones[nombre]['bytes'] = tamano_json(tabla)
+
+    # Todos los callbacks del servidor para un cambio de filtros (lo que era actualizar_dashboard),
+    # por HTTP y sin caché de resultados: vista completa y luego parche al pasar a pisos altos
+    cliente = app.server.test_client()
+    callbacks = callbacks_servidor(cliente.get('/_dash-dependencies').get_json())
+    pisos = sorted(int(piso) for piso in df['PISO'].unique())
+
+    def actualizar(valores):
+        total, version = 0, None
+        for clave, dependencia in callbacks:
+            respuesta = cliente.post('/_dash-update-component', json=cuerpo_callback(clave, dependencia, valores))
+            if respuesta.status_code != 200:
+                raise RuntimeError(f"{clave}: HTTP {respuesta.status_code}")
+            total += len(respuesta.data)
+            version = version_grafico(respuesta.get_json()) or version
+        return total, version
+
+    todos = stores_filtros(proyecto_id, pisos)
+    (bytes_completo, version), mediciones['actualizar_dashboard'] = medir(
+        lambda: actualizar(todos), repeticiones, antes=app.cache_resultados.limpiar)
+    mediciones['actualizar_dashboard']['bytes'] = bytes_completo
+
+    altos = dict(stores_filtros(proyecto_id, [piso for piso in pisos if piso >= 9]),
+                 **{'version-grafico.data': version})
+    (bytes_parche, _), mediciones['actualizar_dashboard_parche'] = medir(
+        lambda: actualizar(altos), repeticiones, antes=app.cache_resultados.limpiar)
+    mediciones['actualizar_dashboard_parche']['bytes'] = bytes_parche
+    return len(df), mediciones
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=CARPETA, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def comparar(anterior, actual, umbral=UMBRAL_REGRESION):
+    """Líneas de comparación por tamaño y medición, y cuántas empeoraron más que el umbral"""
+    lineas, regresiones = [], 0
+    for tamaño, resultado in actual['tamaños'].items():
+        base = anterior['tamaños'].get(tamaño)
+        if base is None:
+            continue
+        for nombre, medicion in resultado['mediciones'].items():
+            medicion_base = base['mediciones'].get(nombre)
+            if medicion_base is None or not medicion_base['segundos_min']:
+                continue
+            razon = medicion['segundos_min'] / medicion_base['segundos_min']
+            marca = ''
+            if razon > 1 + umbral:
+                marca = '  ⚠️ regresión'
+                regresiones += 1
+            lineas.append(f"{tamaño:>6} {nombre:<28} {medicion_base['segundos_min'] * 1000:>10.1f} ms "
+                          f"→ {medicion['segundos_min'] * 1000:>10.1f} ms  x{razon:.2f}{marca}")
+    return lineas, regresiones
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del dashboard con datos sintéticos")
+    parser.add_argument('--tamaños', default=','.join(TAMAÑOS), help=f"Tamaños a medir ({', '.join(TAMAÑOS)})")
+    parser.add_argument('--repeticiones', type=int, default=3, help="Repeticiones por medición")
+    parser.add_argument('--meses-ventas', type=int, default=24, help="Meses de historial de ventas")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla del generador")
+    parser.add_argument('--comparar', help="Resultado anterior (JSON) con el que comparar")
+    parser.add_argument('--umbral', type=float, default=UMBRAL_REGRESION, help="Regresión tolerada (0.2 = 20%%)")
+    parser.add_argument('--salida', help="Archivo del resultado (por defecto, benchmarks/resultados/<fecha>_<commit>.json)")
+    argumentos = parser.parse_args()
+
+    tamaños = {tamaño: TAMAÑOS[tamaño] for tamaño in argumentos.tamaños.split(',') if tamaño}
+    # Una carpeta por parámetros del generador: las planillas ya escritas se reutilizan
+    directorio = os.path.join(DATOS_DIR, f"m{argumentos.meses_ventas}_s{argumentos.semilla}")
+    print(f"Datos sintéticos en {directorio}...")
+    ruta_proyectos = escribir_portafolio(directorio, tamaños, argumentos.meses_ventas, argumentos.semilla,
+                                         reutilizar=True)
+
+    # El dashboard sin cachés en disco, historial, eventos, precalentamiento ni hilos: solo el cálculo
+    os.environ.update({'PROYECTOS_ARCHIVO': ruta_proyectos, 'PROYECTOS_PRECARGA': '', 'CACHE_DATOS_DIR': '',
+                       'HISTORIAL_DIR': '', 'EVENTOS_DIR': '', 'RECARGA_INTERVALO_SEGUNDOS': '0',
+                       'PRECALENTAR_PRESETS': ''})
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    app = importlib.import_module('app')
+
+    resultado = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit_actual(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'repeticiones': argumentos.repeticiones,
+        'tamaños': {}
+    }
+    for tamaño, dimensiones in tamaños.items():
+        unidades, mediciones = medir_proyecto(app, tamaño, argumentos.repeticiones)
+        resultado['tamaños'][tamaño] = {'dimensiones': dimensiones, 'departamentos': unidades,
+                                        'mediciones': mediciones}
+        print(f"\n{tamaño}: {unidades} departamentos ({dimensiones[0]} pisos x {dimensiones[1]} x {dimensiones[2]} edificios)")
+        for nombre, medicion in mediciones.items():
+            tamano = f"{medicion['bytes'] / 1024:>9.1f} KB" if 'bytes' in medicion else ''
+            print(f"  {nombre:<28} {medicion['segundos_min'] * 1000:>10.1f} ms (mediana "
+                  f"{medicion['segundos_mediana'] * 1000:.1f}) {medicion['memoria_pico_bytes'] / 2**20:>8.1f} MB {tamano}")
+
+    salida = argumentos.salida or os.path.join(
+        RESULTADOS_DIR, f"{datetime.now():%Y%m%dT%H%M%S}_{resultado['commit'] or 'sin-commit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\n📄 Resultado guardado en {salida}")
+
+    if argumentos.comparar:
+        with open(argumentos.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)
+        lineas, regresiones = comparar(anterior, resultado, argumentos.umbral)
+        print(f"\nComparación con {argumentos.comparar} ({anterior.get('commit')}):")
+        print('\n'.join(lineas))
+        return 1 if regresiones else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""Prueba de carga: usuarios simulados en paralelo contra _dash-update-component
+
+Uso: python -m benchmarks.carga [--url http://localhost:8050] [--usuarios 8] [--duracion 30]
+Sin --url se usa app.server dentro del mismo proceso (un cliente de pruebas de Flask por usuario).
+Cada usuario carga la página y después repite acciones al azar: presets (todos, altos, bajos) y
+combinaciones de pisos, orientación, estado y tipología, como lo haría el navegador.
+"""
+import argparse
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from benchmarks.cliente_dash import (STORES_FILTROS, callbacks_servidor, cuerpo_callback, nombre_callback,
+                                     stores_filtros, valor_respuesta, version_grafico)
+
+ORIENTACIONES = ('todas', 'norte', 'oriente', 'sur', 'poniente')
+ESTADOS = ('todos', 'disponible', 'reserva', 'promesa')
+PRESETS = ('btn-todos', 'btn-altos', 'btn-bajos')
+PERCENTILES = (50, 95, 99)
+
+class ClienteLocal:
+    """app.server en este mismo proceso"""
+
+    def __init__(self, servidor):
+        self.cliente = servidor.test_client()
+
+    def get(self, ruta):
+        respuesta = self.cliente.get(ruta)
+        return respuesta.status_code, respuesta.data
+
+    def post(self, ruta, cuerpo):
+        respuesta = self.cliente.post(ruta, json=cuerpo)
+        return respuesta.status_code, respuesta.data
+
+class ClienteHttp:
+    """Servidor en un puerto local, con una conexión keep-alive por usuario"""
+
+    def __init__(self, url):
+        partes = urlsplit(url)
+        self.prefijo = partes.path.rstrip('/')
+        self.conexion = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=120)
+
+    def pedir(self, metodo, ruta, cuerpo=None, cabeceras=None):
+        self.conexion.request(metodo, self.prefijo + ruta, body=cuerpo, headers=cabeceras or {})
+        respuesta = self.conexion.getresponse()
+        return respuesta.status, respuesta.read()
+
+    def get(self, ruta):
+        return self.pedir('GET', ruta)
+
+    def post(self, ruta, cuerpo):
+        return self.pedir('POST', ruta, json.dumps(cuerpo), {'Content-Type': 'application/json'})
+
+class Resultados:
+    """Latencias y errores por callback, compartidos por todos los usuarios"""
+
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.bytes = defaultdict(int)
+        self.errores = defaultdict(int)
+        self.acciones = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, nombre, segundos, tamano, error):
+        with self._lock:
+            self.latencias[nombre].append(segundos)
+            self.bytes[nombre] += tamano
+            if error:
+                self.errores[nombre] += 1
+
+    def accion(self):
+        with self._lock:
+            self.acciones += 1
+
+    def reporte(self, duracion):
+        """{callback: {requests, errores, por_segundo, kb_promedio, p50_ms, p95_ms, p99_ms}} y totales"""
+        def resumen(latencias, errores, tamano):
+            percentiles = np.percentile(latencias, PERCENTILES) * 1000 if latencias else [None] * len(PERCENTILES)
+            return dict({'requests': len(latencias), 'errores': errores, 'por_segundo': len(latencias) / duracion,
+                         'kb_promedio': tamano / 1024 / max(len(latencias), 1)},
+                        **{f"p{p}_ms": valor for p, valor in zip(PERCENTILES, percentiles)})
+        with self._lock:
+            callbacks = {nombre: resumen(latencias, self.errores[nombre], self.bytes[nombre])
+                         for nombre, latencias in sorted(self.latencias.items())}
+            todas = [segundos for latencias in self.latencias.values() for segundos in latencias]
+            total = resumen(todas, sum(self.errores.values()), sum(self.bytes.values()))
+            return {'duracion_segundos': duracion, 'acciones': self.acciones,
+                    'acciones_por_segundo': self.acciones / duracion, 'total': total, 'callbacks': callbacks}
+
+class Usuario:
+    """Un navegador simulado: sus filtros, su versión del gráfico y una conexión propia"""
+
+    def __init__(self, cliente, dependencias, resultados, proyecto, semilla):
+        self.cliente = cliente
+        self.dependencias = dependencias
+        self.resultados = resultados
+        self.proyecto = proyecto
+        self.azar = random.Random(semilla)
+        self.version = None
+        self.clics = defaultdict(int)
+        self.pisos = []
+        self.tipologias = []
+
+    def llamar(self, disparadores, valores):
+        """Todos los callbacks del servidor disparados; {clave: respuesta JSON}"""
+        respuestas = {}
+        valores = dict(valores, **{'version-grafico.data': self.version, 'selector-proyecto.value': self.proyecto})
+        for clave, dependencia in callbacks_servidor(self.dependencias, disparadores):
+            cuerpo = cuerpo_callback(clave, dependencia, valores, disparadores)
+            inicio = time.perf_counter()
+            try:
+                estado, datos = self.cliente.post('/_dash-update-component', cuerpo)
+            except (OSError, http.client.HTTPException):
+                estado, datos = None, b''
+            segundos = time.perf_counter() - inicio
+            # 204: el callback respondió no_update
+            error = estado not in (200, 204)
+            self.resultados.registrar(nombre_callback(clave), segundos, len(datos), error)
+            if estado == 200:
+                respuestas[clave] = json.loads(datos)
+                self.version = version_grafico(respuestas[clave]) or self.version
+        return respuestas
+
+    def cargar_pagina(self):
+        for respuesta in self.llamar(('selector-proyecto.value',), {}).values():
+            opciones = valor_respuesta(respuesta, 'filtro-pisos', 'options')
+            if opciones is not None:
+                self.pisos = [opcion['value'] for opcion in opciones]
+                tipologias = valor_respuesta(respuesta, 'filtro-tipologia', 'options') or []
+                self.tipologias = [opcion['value'] for opcion in tipologias]
+        self.filtrar(self.pisos, 'todas', 'todos', [])
+
+    def filtrar(self, pisos, orientacion, estado, tipologias):
+        self.llamar(STORES_FILTROS, stores_filtros(self.proyecto, pisos, orientacion, estado, tipologias))
+
+    def accion(self):
+        """Una acción al azar: un preset o una combinación de filtros"""
+        orientacion = self.azar.choice(ORIENTACIONES)
+        estado = self.azar.choice(ESTADOS)
+        if self.azar.random() < 0.3:
+            boton = self.azar.choice(PRESETS)
+            self.clics[boton] += 1
+            disparador = f"{boton}.n_clicks"
+            pisos = self.pisos
+            for respuesta in self.llamar((disparador,), {disparador: self.clics[boton]}).values():
+                pisos = valor_respuesta(respuesta, 'filtro-pisos', 'value') or []
+            self.filtrar(pisos, orientacion, estado, [])
+        else:
+            pisos = self.azar.sample(self.pisos, self.azar.randint(1, len(self.pisos))) if self.pisos else []
+            tipologias = ([self.azar.choice(self.tipologias)]
+                          if self.tipologias and self.azar.random() < 0.3 else [])
+            self.filtrar(sorted(pisos), orientacion, estado, tipologias)
+        self.resultados.accion()
+
+def ejecutar(nuevo_cliente, usuarios, duracion, proyecto=None, pausa=0.0, semilla=0):
+    """Correr los usuarios durante duracion segundos; devuelve el reporte"""
+    dependencias = json.loads(nuevo_cliente().get('/_dash-dependencies')[1])
+    resultados = Resultados()
+    fin = time.monotonic() + duracion
+
+    def simular(numero):
+        usuario = Usuario(nuevo_cliente(), dependencias, resultados, proyecto, semilla + numero)
+        usuario.cargar_pagina()
+        while time.monotonic() < fin:
+            usuario.accion()
+            if pausa:
+                time.sleep(usuario.azar.uniform(0, 2 * pausa))
+
+    inicio = time.monotonic()
+    hilos = [threading.Thread(target=simular, args=(numero,), daemon=True, name=f"usuario-{numero}")
+             for numero in range(usuarios)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return resultados.reporte(time.monotonic() - inicio)
+
+def imprimir(reporte):
+    print(f"\n{reporte['acciones']} acciones en {reporte['duracion_segundos']:.1f} s "
+          f"({reporte['acciones_por_segundo']:.1f} acciones/s)")
+    print(f"{'callback':<42} {'req':>6} {'req/s':>7} {'err':>4} {'KB':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for nombre, fila in list(reporte['callbacks'].items()) + [('total', reporte['total'])]:
+        if not fila['requests']:
+            continue
+        print(f"{nombre:<42} {fila['requests']:>6} {fila['por_segundo']:>7.1f} {fila['errores']:>4} "
+              f"{fila['kb_promedio']:>8.1f} {fila['p50_ms']:>8.1f} {fila['p95_ms']:>8.1f} {fila['p99_ms']:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del dashboard con usuarios simulados")
+    parser.add_argument('--url', help="Servidor ya levantado (por defecto, app.server en este proceso)")
+    parser.add_argument('--usuarios', type=int, default=8, help="Usuarios simultáneos")
+    parser.add_argument('--duracion', type=float, default=30, help="Segundos de prueba")
+    parser.add_argument('--pausa', type=float, default=0.0, help="Pausa media entre acciones de un usuario (s)")
+    parser.add_argument('--proyecto', help="Proyecto a usar (por defecto, el principal)")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla de las acciones")
+    parser.add_argument('--json', help="Guardar el reporte en este archivo JSON")
+    argumentos = parser.parse_args()
+
+    if argumentos.url:
+        def nuevo_cliente():
+            return ClienteHttp(argumentos.url)
+    else:
+        import app
+
+        def nuevo_cliente():
+            return ClienteLocal(app.server)
+
+    reporte = ejecutar(nuevo_cliente, argumentos.usuarios, argumentos.duracion, argumentos.proyecto,
+                       argumentos.pausa, argumentos.semilla)
+    reporte['configuracion'] = vars(argumentos)
+    imprimir(reporte)
+    if argumentos.json:
+        with open(argumentos.json, 'w', encoding='utf-8') as f:
+            json.dump(reporte, f, ensure_ascii=False, indent=2)
+    return 1 if reporte['total']['errores'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""Cuerpos de _dash-update-component armados desde _dash-dependencies, como los enviaría el navegador"""
+
+# Stores de filtros que arman los callbacks de cliente a partir de los controles
+STORES_FILTROS = ('estado-filtros.data', 'filtros-ventas.data')
+
+def stores_filtros(proyecto, pisos, orientacion='todas', estado='todos', tipologias=None, fecha=None):
+    """Contenido de estado-filtros y filtros-ventas para una selección de filtros"""
+    comunes = {'pisos': list(pisos), 'orientacion': orientacion, 'tipologias': list(tipologias or []),
+               'proyecto': proyecto, 'fecha': fecha}
+    return {'estado-filtros.data': dict(comunes, estado=estado), 'filtros-ventas.data': comunes}
+
+def salidas(clave):
+    """Salidas de un callback a partir de su clave ("a.b" o "..a.b...c.d.."), como {id, property}"""
+    multiple = clave.startswith('..')
+    partes = clave[2:-2].split('...') if multiple else [clave]
+    lista = []
+    for parte in partes:
+        identificador, propiedad = parte.split('@')[0].rsplit('.', 1)
+        lista.append({'id': identificador, 'property': propiedad})
+    return lista if multiple else lista[0]
+
+def nombre_callback(clave):
+    """Nombre corto para informes: los id de sus salidas"""
+    lista = salidas(clave)
+    return '+'.join(dict.fromkeys(s['id'] for s in (lista if isinstance(lista, list) else [lista])))
+
+def callbacks_servidor(dependencias, disparadores=STORES_FILTROS):
+    """(clave, dependencia) de los callbacks del servidor con alguna entrada entre los disparadores"""
+    callbacks = []
+    for dependencia in dependencias:
+        entradas = {f"{entrada['id']}.{entrada['property']}" for entrada in dependencia['inputs']}
+        if not dependencia.get('clientside_function') and entradas & set(disparadores):
+            callbacks.append((dependencia['output'], dependencia))
+    return callbacks
+
+def cuerpo_callback(clave, dependencia, valores, cambiados=STORES_FILTROS):
+    """Cuerpo JSON del request; valores: {"id.propiedad": valor} para entradas y estado"""
+    def con_valor(lista):
+        return [dict(item, value=valores.get(f"{item['id']}.{item['property']}")) for item in lista]
+    entradas = con_valor(dependencia['inputs'])
+    return {
+        'output': clave,
+        'outputs': salidas(clave),
+        'inputs': entradas,
+        'state': con_valor(dependencia['state']),
+        'changedPropIds': [f"{entrada['id']}.{entrada['property']}" for entrada in entradas
+                           if f"{entrada['id']}.{entrada['property']}" in cambiados]
+    }
+
+def valor_respuesta(respuesta, identificador, propiedad):
+    """Valor que devolvió un callback para id.propiedad (None si la respuesta no lo trae)"""
+    return ((respuesta or {}).get('response', {}).get(identificador) or {}).get(propiedad)
+
+def version_grafico(respuesta):
+    """version-grafico que devolvió actualizar_grafico (None si la respuesta no la trae)"""
+    return valor_respuesta(respuesta, 'version-grafico', 'data')
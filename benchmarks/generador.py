@@ -0,0 +1,118 @@
+"""Datos sintéticos con el esquema de Datos.xlsx, para medir con edificios de cualquier tamaño"""
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+# Tipologías con su superficie típica (m2)
+TIPOLOGIAS_M2 = {'1D+1B': 36.1, '2D+1B': 46.0, '2D+2B M': 54.9, '2D+2B P': 61.4}
+# Proporción de departamentos por estado; los vendidos (Promesa) tienen fecha
+PROPORCION_ESTADOS = {'Disponible': 0.45, 'Reserva': 0.05, 'Promesa': 0.5}
+# Fin fijo del historial de ventas, para que los datos no cambien con el día en que se generan
+FIN_VENTAS = pd.Timestamp('2025-06-30')
+FECHA_SIN_VENTA = pd.Timestamp('1900-01-01')
+
+def generar_layout(unidades_por_piso, edificios=1):
+    """Layout de torres lado a lado: cada una con una fila norte y una sur de departamentos
+    
+    Los tipos se numeran de corrido entre torres (1..unidades_por_piso en la primera, etc.).
+    La escalera del layout es una sola, en el centro de la primera torre.
+    """
+    ancho = math.ceil(unidades_por_piso / 2)
+    posiciones, orientaciones = {}, {}
+    orientaciones_tipos = {'norte': [], 'oriente': [], 'sur': [], 'poniente': []}
+    for edificio in range(edificios):
+        for unidad in range(unidades_por_piso):
+            tipo = edificio * unidades_por_piso + unidad + 1
+            columna, norte = unidad % ancho, unidad < ancho
+            posiciones[tipo] = (edificio * (ancho + 1) + columna, 2 if norte else 0)
+            lado = 'Norte' if norte else 'Sur'
+            orientaciones_tipos['norte' if norte else 'sur'].append(tipo)
+            if columna == 0:
+                orientaciones_tipos['poniente'].append(tipo)
+                lado = f"{lado}-Poniente" if not norte else f"Poniente-{lado}"
+            elif columna == ancho - 1:
+                orientaciones_tipos['oriente'].append(tipo)
+                lado = f"{lado}-Oriente" if norte else f"Oriente-{lado}"
+            orientaciones[tipo] = lado
+    return {
+        'posiciones': posiciones,
+        'escalera': ((ancho - 1) / 2, 1),
+        'orientaciones': orientaciones,
+        'orientaciones_tipos': orientaciones_tipos
+    }
+
+def generar_datos(pisos, unidades_por_piso, edificios=1, meses_ventas=24, semilla=0, piso_inicial=2):
+    """Tabla de departamentos (PISO, TIPO, NUMERO, TIPOLOGIA, ESTADO, PRECIO, M2, UF/M2, FECHA)
+    
+    Los vendidos tienen una fecha repartida en los últimos meses_ventas meses; el resto lleva
+    la fecha 01.01.1900 (sin venta), igual que la planilla real. Misma semilla, mismos datos.
+    """
+    generador = np.random.default_rng(semilla)
+    n = pisos * unidades_por_piso * edificios
+    piso = np.repeat(np.arange(piso_inicial, piso_inicial + pisos), unidades_por_piso * edificios)
+    tipo = np.tile(np.arange(1, unidades_por_piso * edificios + 1), pisos)
+    unidad = (tipo - 1) % unidades_por_piso + 1
+    
+    tipologias = np.array(list(TIPOLOGIAS_M2))
+    # La tipología depende del tipo (misma planta en todos los pisos)
+    tipologia = tipologias[(unidad * 7) % len(tipologias)]
+    m2 = np.round(np.array([TIPOLOGIAS_M2[t] for t in tipologias])[(unidad * 7) % len(tipologias)]
+                  + generador.normal(0, 0.8, n), 2)
+    uf_m2 = np.round(62 + 0.35 * (piso - piso_inicial) + generador.normal(0, 2.5, n), 2)
+    precio = np.round(m2 * uf_m2, 4)
+    
+    estados = np.array(list(PROPORCION_ESTADOS))
+    estado = generador.choice(estados, size=n, p=list(PROPORCION_ESTADOS.values()))
+    vendidos = estado == 'Promesa'
+    inicio_ventas = FIN_VENTAS - pd.DateOffset(months=meses_ventas)
+    dias = generador.integers(0, max((FIN_VENTAS - inicio_ventas).days, 1), n)
+    fecha = np.where(vendidos, (inicio_ventas + pd.to_timedelta(dias, unit='D')).to_numpy(),
+                     np.datetime64(FECHA_SIN_VENTA))
+    
+    return pd.DataFrame({
+        'TIPO': tipo,
+        'PISO': piso,
+        'NUMERO': piso * 100 + unidad,
+        'TIPOLOGIA': tipologia,
+        'ESTADO': estado,
+        'PRECIO': precio,
+        'M2': m2,
+        'UF/M2': uf_m2,
+        'FECHA': pd.to_datetime(fecha)
+    })
+
+def escribir_proyecto(directorio, identificador, pisos, unidades_por_piso, edificios=1, meses_ventas=24, semilla=0,
+                      reutilizar=False):
+    """Guardar la planilla generada; devuelve la definición del proyecto para proyectos.json
+    
+    Con reutilizar, una planilla que ya existe no se vuelve a escribir (mismos parámetros, mismos datos).
+    """
+    os.makedirs(directorio, exist_ok=True)
+    archivo = os.path.join(directorio, f"{identificador}_{pisos}x{unidades_por_piso}x{edificios}.xlsx")
+    if not (reutilizar and os.path.exists(archivo)):
+        generar_datos(pisos, unidades_por_piso, edificios, meses_ventas, semilla).to_excel(archivo, index=False)
+    layout = generar_layout(unidades_por_piso, edificios)
+    return {
+        'id': identificador,
+        'nombre': f"Sintético {identificador}",
+        'archivo': archivo,
+        'layout': {
+            'posiciones': {str(tipo): list(posicion) for tipo, posicion in layout['posiciones'].items()},
+            'escalera': list(layout['escalera']),
+            'orientaciones': {str(tipo): nombre for tipo, nombre in layout['orientaciones'].items()},
+            'orientaciones_tipos': layout['orientaciones_tipos']
+        }
+    }
+
+def escribir_portafolio(directorio, tamaños, meses_ventas=24, semilla=0, reutilizar=False):
+    """Un proyecto por tamaño {id: (pisos, unidades_por_piso, edificios)} y su proyectos.json"""
+    proyectos = [escribir_proyecto(directorio, identificador, *dimensiones, meses_ventas=meses_ventas, semilla=semilla,
+                                   reutilizar=reutilizar)
+                 for identificador, dimensiones in tamaños.items()]
+    ruta = os.path.join(directorio, 'proyectos.json')
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(proyectos, f, ensure_ascii=False)
+    return ruta
@@ -0,0 +1,25 @@
+# Configuración de gunicorn (se lee sola desde el directorio de trabajo: web: gunicorn app:server)
+import gc
+import os
+
+# Cargar los datos una sola vez en el proceso maestro: los workers nacen con el dataset,
+# la geometría y el índice ya armados y comparten esas páginas de memoria (copy-on-write)
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+if preload_app:
+    os.environ['DASHBOARD_PRECARGA'] = '1'
+
+def pre_fork(server, worker):
+    # Sacar del GC los objetos ya creados: si el GC los recorre en un worker, toca sus
+    # cabeceras y el sistema copia esas páginas, perdiendo lo compartido
+    gc.freeze()
+
+def post_fork(server, worker):
+    # Los hilos del maestro no pasan al worker: cada worker vigila el archivo de datos,
+    # guarda las instantáneas del historial y precalienta en segundo plano los presets
+    # de los proyectos ya cargados
+    if preload_app:
+        import app
+        app.iniciar_vigilancia()
+        app.iniciar_historial()
+        app.iniciar_precalentamiento()
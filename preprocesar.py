@@ -0,0 +1,31 @@
+"""Preprocesar en paralelo las planillas de los proyectos y guardarlas en la caché columnar
+
+Uso: python preprocesar.py [archivo.xlsx ...] [--procesos N] [--json]
+Sin archivos se procesan los de todos los proyectos (proyectos.json o ARCHIVO_DATOS).
+"""
+import argparse
+import json
+import os
+import sys
+
+# Solo se usan las funciones de carga: sin precargar proyectos ni vigilar archivos
+os.environ['PROYECTOS_PRECARGA'] = ''
+os.environ['RECARGA_INTERVALO_SEGUNDOS'] = '0'
+
+import app
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocesar planillas en paralelo a la caché columnar")
+    parser.add_argument('archivos', nargs='*', help="Planillas a procesar (por defecto, las de todos los proyectos)")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos del pool (por defecto, uno por núcleo)")
+    parser.add_argument('--json', action='store_true', help="Imprimir el reporte completo como JSON")
+    argumentos = parser.parse_args()
+    
+    archivos = argumentos.archivos or [proyecto['archivo'] for proyecto in app.registro.proyectos.values()]
+    reporte = app.preprocesar_archivos(archivos, argumentos.procesos)
+    if argumentos.json:
+        print(json.dumps(reporte, ensure_ascii=False, indent=2))
+    return 1 if reporte['errores'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
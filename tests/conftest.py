@@ -0,0 +1,24 @@
+"""Configuración de las pruebas: app se importa sin cachés en disco, historial, eventos ni hilos"""
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+os.environ.update({'ARCHIVO_DATOS': os.path.join(RAIZ, 'Datos.xlsx'),
+                   'PROYECTOS_ARCHIVO': os.path.join(RAIZ, 'proyectos.json'),
+                   'PROYECTOS_PRECARGA': '', 'CACHE_DATOS_DIR': '', 'HISTORIAL_DIR': '', 'EVENTOS_DIR': '',
+                   'RECARGA_INTERVALO_SEGUNDOS': '0', 'PRECALENTAR_PRESETS': ''})
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+@pytest.fixture
+def proyecto():
+    import app
+    return app.registro.proyectos[app.registro.principal]
+
+@pytest.fixture
+def datos(proyecto):
+    """ConjuntoDatos del proyecto principal (Datos.xlsx), recién construido"""
+    import app
+    return app.ConjuntoDatos(app.cargar_datos(proyecto['archivo']), proyecto, 'a' * 40)
@@ -0,0 +1,75 @@
+import numpy as np
+import plotly.graph_objects as go
+import pytest
+from dash import html
+
+import app
+
+@pytest.fixture
+def reloj(monkeypatch):
+    """Reemplaza time.monotonic por un reloj que se adelanta a mano"""
+    ahora = [1000.0]
+    monkeypatch.setattr(app.time, 'monotonic', lambda: ahora[0])
+    return ahora
+
+def test_expulsa_la_menos_usada(reloj):
+    cache = app.CacheResultados(tamano_maximo=2, ttl_segundos=60)
+    cache.guardar('a', 1)
+    cache.guardar('b', 2)
+    # Usar 'a' la deja como la más reciente: al llenarse sale 'b'
+    assert cache.obtener('a') == 1
+    cache.guardar('c', 3)
+    assert cache.obtener('b') is None
+    assert cache.obtener('a') == 1 and cache.obtener('c') == 3
+    assert cache.estadisticas() == {'entradas': 2, 'memoria_bytes': 0, 'aciertos': 3, 'fallos': 1, 'expulsiones': 1}
+
+def test_guardar_de_nuevo_renueva(reloj):
+    cache = app.CacheResultados(tamano_maximo=2, ttl_segundos=60)
+    cache.guardar('a', 1)
+    cache.guardar('b', 2)
+    cache.guardar('a', 10)
+    cache.guardar('c', 3)
+    assert cache.obtener('a') == 10 and cache.obtener('b') is None
+
+def test_expira_despues_del_ttl(reloj):
+    cache = app.CacheResultados(tamano_maximo=4, ttl_segundos=60)
+    cache.guardar('a', 1)
+    reloj[0] += 60
+    assert cache.obtener('a') == 1
+    # Un acierto no renueva el plazo: cuenta desde que se guardó
+    reloj[0] += 0.5
+    assert cache.obtener('a') is None
+    assert cache.estadisticas() == {'entradas': 0, 'memoria_bytes': 0, 'aciertos': 1, 'fallos': 1, 'expulsiones': 1}
+
+def test_descartar_version(reloj):
+    cache = app.CacheResultados()
+    cache.guardar(('v1', 'grafico'), 1)
+    cache.guardar(('v2', 'grafico'), 2)
+    cache.descartar_version('v1')
+    assert cache.obtener(('v1', 'grafico')) is None and cache.obtener(('v2', 'grafico')) == 2
+
+def test_limite_de_memoria(reloj):
+    cache = app.CacheResultados(tamano_maximo=10, ttl_segundos=60, memoria_maxima=2000)
+    cache.guardar('a', np.zeros(100))
+    cache.guardar('b', np.zeros(100))
+    cache.obtener('a')
+    # 'c' no cabe con las otras dos: sale la menos usada
+    cache.guardar('c', np.zeros(100))
+    assert cache.obtener('b') is None and cache.obtener('a') is not None
+    assert cache.estadisticas()['memoria_bytes'] == 1600
+    # Reemplazar una clave descuenta el valor anterior; lo que no cabe ni solo no se guarda
+    cache.guardar('a', np.zeros(10))
+    cache.guardar('d', np.zeros(1000))
+    assert cache.obtener('d') is None
+    assert cache.estadisticas()['memoria_bytes'] == 880
+    cache.descartar_version('c')
+    cache.limpiar()
+    assert cache.estadisticas()['memoria_bytes'] == 0
+
+def test_memoria_resultado():
+    colores = np.array(['#FF0000', '#00FF00'], dtype=object)
+    figura = go.Figure(go.Mesh3d(x=np.zeros(100), y=np.zeros(100), z=np.zeros(100), facecolor=colores))
+    assert app.memoria_resultado(figura) >= 3 * 800 + colores.nbytes
+    componente = html.Div([html.P('x' * 1000), html.Span('y' * 500)])
+    assert app.memoria_resultado(componente) == 1500
+    assert app.memoria_resultado({'a': [np.zeros(4), 'abc'], 'b': 1.5}) == 35
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+import app
+
+def test_convertir_decimal_miles_y_coma():
+    serie = pd.Series(['3 497,68', '12 345 678', '61,5', 4321.5, '1.5', None, 'abc'], dtype=object)
+    valores, rechazados = app.convertir_decimal(serie, app.ESQUEMA_COLUMNAS['PRECIO'])
+    esperados = [3497.68, 12345678.0, 61.5, 4321.5, 1.5, np.nan, np.nan]
+    np.testing.assert_allclose(valores.to_numpy(), esperados)
+    assert rechazados.tolist() == [False, False, False, False, False, False, True]
+
+def test_convertir_decimal_columna_numerica():
+    serie = pd.Series([1, 2, np.nan])
+    valores, rechazados = app.convertir_decimal(serie, app.ESQUEMA_COLUMNAS['M2'])
+    assert valores.dtype == float and not rechazados.any()
+
+def test_convertir_entero_rechaza_decimales_y_textos():
+    serie = pd.Series([2, '3', 4.0, 4.5, 'x', None], dtype=object)
+    valores, rechazados = app.convertir_entero(serie, app.ESQUEMA_COLUMNAS['PISO'])
+    np.testing.assert_array_equal(valores.to_numpy(dtype=float), [2, 3, 4, np.nan, np.nan, np.nan])
+    assert rechazados.tolist() == [False, False, False, True, True, False]
+
+def test_leer_excel_esquema(tmp_path):
+    archivo = tmp_path / 'datos.xlsx'
+    pd.DataFrame({' TIPO ': [1, 2], 'PISO': [3, 'tres'], 'ESTADO': [' Promesa ', 'Disponible'],
+                  'PRECIO': ['3 497,68', 2539.3], 'OTRA': ['se', 'ignora']}).to_excel(archivo, index=False)
+    df, rechazos = app.leer_excel_esquema(archivo)
+    assert list(df.columns) == ['TIPO', 'PISO', 'ESTADO', 'PRECIO']
+    assert df['ESTADO'].tolist() == ['Promesa', 'Disponible']
+    np.testing.assert_allclose(df['PRECIO'], [3497.68, 2539.3])
+    assert rechazos == {'PISO': {'cantidad': 1, 'ejemplos': ['tres']}}
+
+def test_leer_excel_esquema_faltan_obligatorias(tmp_path):
+    archivo = tmp_path / 'datos.xlsx'
+    pd.DataFrame({'TIPO': [1], 'PRECIO': [1000]}).to_excel(archivo, index=False)
+    assert app.leer_excel_esquema(archivo) == (None, ['PISO', 'ESTADO'])
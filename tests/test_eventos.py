@@ -0,0 +1,87 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from plotly.utils import PlotlyJSONEncoder
+
+import app
+
+FILTROS = [((), 'todas', 'todos', ()), ((2, 3), 'todas', 'todos', ()), ((), 'norte', 'Promesa', ()),
+           ((), 'todas', 'disponible', ()), ((), 'oriente', 'todos', ('2D+2B P',))]
+
+def metricas(datos, filtros):
+    """Métricas como {(grupo, ..., medida): valor}: el cubo incremental suma en otro orden"""
+    def aplanar(valor, prefijo=()):
+        if isinstance(valor, dict):
+            return {clave: final for llave, hijo in valor.items()
+                    for clave, final in aplanar(hijo, prefijo + (llave,)).items()}
+        return {prefijo: valor}
+    return aplanar(app.calcular_metricas(
+        datos.cubo.take(np.flatnonzero(app.mascara_seleccion(datos.indice_cubo, filtros)))))
+
+def como_json(componente):
+    return json.dumps(componente, cls=PlotlyJSONEncoder)
+
+def unidad(datos, fila):
+    return {'piso': int(datos.df['PISO'].iloc[fila]), 'tipo': int(datos.df['TIPO'].iloc[fila])}
+
+@pytest.fixture
+def eventos(datos):
+    vendidas = np.flatnonzero(datos.df['FECHA'].notna())
+    disponibles = np.flatnonzero(datos.df['ESTADO'] == 'Disponible')
+    return [
+        # Venta con fecha y precio en texto (miles con espacio, coma decimal)
+        dict(unidad(datos, disponibles[0]), estado='Promesa', fecha='15.03.2031', precio='5 000,5'),
+        dict(unidad(datos, disponibles[1]), estado='Reserva', fecha=45292),
+        # Un estado que no existía y una venta que se anula
+        dict(unidad(datos, vendidas[0]), estado='Vendido Nuevo', fecha=None),
+        dict(unidad(datos, vendidas[1]), precio=4321.5),
+        # El último valor de cada campo gana
+        dict(unidad(datos, vendidas[1]), estado='Disponible', fecha=None),
+        dict(unidad(datos, disponibles[0]), precio='6 100'),
+    ]
+
+def test_aplicar_eventos_igual_a_reconstruir(datos, proyecto, eventos):
+    nuevo, rechazados = app.aplicar_eventos(datos, eventos)
+    assert rechazados == []
+    completo = app.ConjuntoDatos(nuevo.df.copy(), proyecto, datos.huella)
+    
+    for filtros in FILTROS:
+        assert metricas(nuevo, filtros) == pytest.approx(metricas(completo, filtros), nan_ok=True)
+        for crear in (app.crear_tabla_ventas_mensuales, app.crear_tabla_precios_mensuales):
+            assert (como_json(crear(app.datos_vendidos(nuevo, filtros)))
+                    == como_json(crear(app.datos_vendidos(completo, filtros))))
+        np.testing.assert_array_equal(app.mascara_visibles(nuevo, filtros), app.mascara_visibles(completo, filtros))
+    assert metricas(nuevo, FILTROS[0]) != metricas(datos, FILTROS[0])
+    np.testing.assert_array_equal(nuevo.geometria['colores'], completo.geometria['colores'])
+    np.testing.assert_array_equal(nuevo.geometria['hover'], completo.geometria['hover'])
+
+def test_aplicar_eventos_no_modifica_el_original(datos, eventos):
+    antes = datos.df.copy()
+    cubo = datos.cubo.copy()
+    app.aplicar_eventos(datos, eventos)
+    pd.testing.assert_frame_equal(datos.df, antes)
+    pd.testing.assert_frame_equal(datos.cubo, cubo)
+
+def test_aplicar_eventos_rechazados(datos):
+    eventos = [{'piso': 99, 'tipo': 1, 'estado': 'Promesa'}, {'tipo': 3},
+               dict(unidad(datos, 0), precio='abc'), dict(unidad(datos, 0), fecha='no es fecha')]
+    nuevo, rechazados = app.aplicar_eventos(datos, eventos)
+    assert nuevo is datos
+    assert [rechazado['motivo'] for rechazado in rechazados] == [
+        'departamento desconocido', 'falta piso o tipo', 'precio inválido', 'fecha inválida']
+
+def test_solo_eventos_del_mismo_archivo(tmp_path, monkeypatch, datos):
+    monkeypatch.setattr(app, 'EVENTOS_DIR', str(tmp_path))
+    disponibles = np.flatnonzero(datos.df['ESTADO'] == 'Disponible')
+    app.registrar_eventos(datos.proyecto, [dict(unidad(datos, disponibles[0]), estado='Promesa')], 'b' * 40)
+    app.registrar_eventos(datos.proyecto, [dict(unidad(datos, disponibles[1]), estado='Reserva')], datos.huella)
+    # Línea de un registro anterior a las huellas: se sigue aplicando
+    with open(app.archivo_eventos(datos.proyecto), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(dict(unidad(datos, disponibles[2]), estado='Promesa')) + '\n')
+    
+    nuevo, rechazados = app.actualizar_con_eventos(datos)
+    assert rechazados == []
+    assert nuevo.df['ESTADO'].iloc[disponibles[:3]].tolist() == ['Disponible', 'Reserva', 'Promesa']
+    assert nuevo.eventos_leidos == (tmp_path / f"{datos.proyecto}.jsonl").stat().st_size
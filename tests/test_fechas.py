@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+import app
+
+def test_parsear_fechas_seriales_excel():
+    fechas, clases = app.parsear_fechas(pd.Series([45000, 45000.5, '45292', 1], dtype=object))
+    assert fechas.tolist() == [pd.Timestamp('2023-03-15'), pd.Timestamp('2023-03-15 12:00'),
+                               pd.Timestamp('2024-01-01'), pd.NaT]
+    # El serial 1 es el 01-01-1900: centinela, no una fecha real
+    assert clases == {'serial excel': 4, 'sin fecha (1900)': 1}
+
+def test_parsear_fechas_centinela_1900():
+    for valores in ([pd.Timestamp('1900-01-01'), pd.Timestamp('2024-05-02')], ['01.01.1900', '02.05.2024']):
+        fechas, clases = app.parsear_fechas(pd.Series(valores, dtype=object))
+        assert pd.isna(fechas.iloc[0]) and fechas.iloc[1] == pd.Timestamp('2024-05-02')
+        assert clases['sin fecha (1900)'] == 1
+    # Ya como datetime64
+    fechas, _ = app.parsear_fechas(pd.Series(pd.to_datetime(['1900-01-01', '2024-05-02'])))
+    assert pd.isna(fechas.iloc[0])
+
+def test_parsear_fechas_formatos_mezclados():
+    valores = pd.Series(['15.03.2024', '2024-03-16', '17/03/2024', '18.03.2024 10:30', 45370,
+                         pd.Timestamp('2024-03-20'), '15.03.2024', 'no es fecha', None, ''], dtype=object)
+    fechas, clases = app.parsear_fechas(valores)
+    esperadas = ['2024-03-15', '2024-03-16', '2024-03-17', '2024-03-18', '2024-03-19', '2024-03-20',
+                 '2024-03-15', None, None, None]
+    assert fechas.tolist() == [pd.NaT if fecha is None else pd.Timestamp(fecha) for fecha in esperadas]
+    assert fechas.index.equals(valores.index)
+    # El texto vacío cuenta como inválido; None no se clasifica
+    assert clases['inválida'] == 2
+
+def test_parsear_fechas_todo_vacio():
+    fechas, clases = app.parsear_fechas(pd.Series([np.nan, None, np.nan], dtype=object))
+    assert pd.api.types.is_datetime64_any_dtype(fechas)
+    assert fechas.isna().all() and len(fechas) == 3
+    assert clases == {}
@@ -0,0 +1,98 @@
+import copy
+import threading
+
+import numpy as np
+import pandas as pd
+
+import app
+
+def versiones(datos, cantidad):
+    """datos y cantidad versiones siguientes, cada una con unos pocos departamentos vendidos o liberados"""
+    azar = np.random.default_rng(0)
+    lista = [datos]
+    for numero in range(cantidad):
+        filas = azar.choice(len(datos.df), 3, replace=False)
+        eventos = [{'piso': int(datos.df['PISO'].iloc[fila]), 'tipo': int(datos.df['TIPO'].iloc[fila]),
+                    'estado': ('Promesa', 'Reserva', 'Disponible')[numero % 3],
+                    'fecha': f'{numero + 1:02d}.02.2030', 'precio': 4000 + numero} for fila in filas]
+        siguiente, rechazados = app.aplicar_eventos(lista[-1], eventos)
+        assert rechazados == []
+        siguiente = copy.copy(siguiente)
+        siguiente.version = f"v{numero + 1}"
+        lista.append(siguiente)
+    lista[0] = copy.copy(datos)
+    lista[0].version = 'v0'
+    return lista
+
+def assert_misma_tabla(reconstruida, df):
+    """Reconstruida del historial igual a df (los tipos compactos pueden variar)"""
+    pd.testing.assert_frame_equal(reconstruida, app.tabla_historial(df), check_dtype=False, check_categorical=False)
+
+def test_instantaneas_reconstruyen_cada_version(tmp_path, datos):
+    historial = app.HistorialProyectos(str(tmp_path), app.CacheResultados(), cada_completa=3)
+    lista = versiones(datos, 7)
+    for version in lista:
+        assert historial.registrar(version)
+    assert not historial.registrar(lista[-1])
+    
+    registradas = historial.instantaneas(datos.proyecto)
+    assert [version for _, version, _ in registradas] == [datos.version for datos in lista]
+    for posicion, version in enumerate(lista):
+        df, profundidad = historial.tabla(datos.proyecto, version.version)
+        assert profundidad == posicion % 3
+        assert_misma_tabla(df, version.df)
+    # Los deltas guardan solo los departamentos que cambiaron
+    _, filas, _ = app.leer_instantanea(registradas[1][2])
+    assert len(filas) == 3
+
+def test_instantaneas_desde_otro_proceso(tmp_path, datos):
+    """Sin la última versión en memoria, el delta se calcula contra la reconstruida del disco"""
+    lista = versiones(datos, 2)
+    app.HistorialProyectos(str(tmp_path), app.CacheResultados()).registrar(lista[0])
+    historial = app.HistorialProyectos(str(tmp_path), app.CacheResultados())
+    historial.registrar(lista[1])
+    historial.registrar(lista[2])
+    for version in lista:
+        df, _ = historial.tabla(datos.proyecto, version.version)
+        assert_misma_tabla(df, version.df)
+
+def test_poda_conserva_las_ultimas(tmp_path, datos):
+    historial = app.HistorialProyectos(str(tmp_path), app.CacheResultados(), cada_completa=4, maximo_instantaneas=3)
+    lista = versiones(datos, 5)
+    for version in lista:
+        historial.registrar(version)
+    
+    registradas = historial.instantaneas(datos.proyecto)
+    assert [version for _, version, _ in registradas] == ['v3', 'v4', 'v5']
+    # La más antigua que queda se reescribió completa
+    assert app.leer_instantanea(registradas[0][2])[0]['base'] is None
+    for version in lista[3:]:
+        df, _ = historial.tabla(datos.proyecto, version.version)
+        assert_misma_tabla(df, version.df)
+    # Una fecha anterior a la primera instantánea muestra la primera
+    assert historial.version_en(datos.proyecto, '19000101T000000000000') == 'v3'
+
+def test_instantaneas_en_segundo_plano(tmp_path, monkeypatch, datos):
+    """registrar_en_segundo_plano no escribe en el hilo que llama: lo hace el hilo del historial, en orden"""
+    historial = app.HistorialProyectos(str(tmp_path), app.CacheResultados())
+    hilos = []
+    registrar = historial.registrar
+    
+    def registrar_anotando(datos):
+        hilos.append(threading.current_thread().name)
+        return registrar(datos)
+    
+    monkeypatch.setattr(historial, 'registrar', registrar_anotando)
+    monkeypatch.setattr(app, 'historial', historial)
+    monkeypatch.setattr(app, 'pid_historial', None)
+    monkeypatch.setattr(app, 'cola_historial', None)
+    lista = versiones(datos, 3)
+    
+    # Sin iniciar el hilo (maestro de gunicorn --preload) se guarda en el momento
+    app.registrar_en_segundo_plano(lista[0])
+    app.iniciar_historial()
+    for version in lista[1:]:
+        app.registrar_en_segundo_plano(version)
+    app.cola_historial.join()
+    assert hilos == [threading.current_thread().name] + ['historial'] * 3
+    assert [version for _, version, _ in historial.instantaneas(datos.proyecto)] == ['v0', 'v1', 'v2', 'v3']